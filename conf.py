@@ -10,12 +10,43 @@ PLUGIN_VERSION_INT = 20800
 
 # vector layer
 FEATURES_PER_BLOCK = 50   # max number of features in a data block
+GRID_SPLIT_CACHE_SIZE = 64 * 1024 * 1024   # max size of cached triangulation of polygons on grids in bytes. 0 to disable
+LAYER_STORE_SIZE = 32 * 1024 * 1024        # max size of features and geometries kept per layer in preview to rebuild the layer quickly in bytes. 0 to disable
+
+# DEM warp cache
+WARP_CACHE_MEM_SIZE = 64 * 1024 * 1024      # max size of memory cache in bytes. 0 to disable
+WARP_CACHE_DISK_SIZE = 512 * 1024 * 1024    # max size of disk cache in bytes. 0 to disable
+
+# DEM provider
+DEM_USE_OVERVIEWS = True     # If True, DEM data are read from an overview level of source raster that suits grid resolution
+DEM_PYRAMID_MIN_SIZE = 4096  # min width or height of a source raster without overviews for which downsampled levels are cached. 0 to disable
+DEM_WARP_THREADS = 0         # number of threads gdal.Warp uses to reproject DEM data. If 0, gdal.ReprojectImage is used
+DEM_WARP_MEMORY = 64         # memory limit of gdal.Warp in MB
+
+# texture cache
+TEXTURE_CACHE_MEM_SIZE = 256 * 1024 * 1024   # max size of memory cache in bytes. 0 to disable
+TEXTURE_CACHE_DISK_SIZE = 256 * 1024 * 1024  # max size of disk cache in bytes. 0 to disable
+
+# GSI elevation tile plugin
+GSI_TILE_STORE_MEM_SIZE = 64 * 1024 * 1024  # max size of decoded tiles kept in memory in bytes. 0 to disable
+GSI_TILE_STORE_SIZE = 512 * 1024 * 1024     # max size of tile store on disk in bytes. 0 to disable
+GSI_TILE_CONNECTIONS = 4                    # max number of concurrent tile requests
+
+# preview
+EXTENT_UPDATE_DELAY = 500    # delay in milliseconds before preview follows a change of map canvas extent
 
 # multi-threading
 RUN_CNTLR_IN_BKGND = True    # If True, controller runs in a worker thread
+BUILD_WORKERS = 4            # max number of worker threads to build DEM blocks. If 0, blocks are built in the calling thread
+RENDER_WORKERS = 2           # max number of map images (textures) rendered concurrently
+ARTIFACT_WORKERS = 2         # max number of worker threads that encode build artifacts for preview
 
 # processing export
 P_OPEN_DIRECTORY = True
+P_EXPORT_JOBS = 1            # default number of coverage features exported concurrently by "Export as Web Page" algorithm
+
+# build tracing
+TRACE_BUILD = False          # If True, spans and counters of build steps are recorded from plugin load (see utils/trace.py)
 
 # debug
 DEBUG_MODE = 1
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import itertools
+import threading
+import weakref
+
+from qgis.PyQt.QtCore import QBuffer, QByteArray, QIODevice
+from qgis.PyQt.QtGui import QImage
+
+SCHEME = "q3d"
+
+_stores = weakref.WeakValueDictionary()    # store id -> ArtifactStore
+_storeIds = itertools.count(1)
+
+
+def findArtifactStore(storeId):
+    """returns the artifact store with the id, or None"""
+    return _stores.get(storeId)
+
+
+def parseUrlPath(path):
+    """returns a tuple of store id and artifact id in the path of an artifact URL. ValueError is raised if the path is invalid."""
+    storeId, id = path.split("/")
+    return int(storeId), int(id)
+
+
+def toByteArray(data):
+    """converts an artifact (QByteArray, bytes or QImage) to a QByteArray. Images are encoded in PNG."""
+    if isinstance(data, QImage):
+        ba = QByteArray()
+        buf = QBuffer(ba)
+        buf.open(QIODevice.OpenModeFlag.WriteOnly)
+        data.save(buf, "PNG")
+        buf.close()
+        return ba
+
+    if isinstance(data, QByteArray):
+        return data
+
+    return QByteArray(bytes(data))
+
+
+class ArtifactStore:
+
+    """build outputs (grids, textures and feature blocks) that a preview page fetches by URL
+    (q3d:<store id>/<id>) instead of receiving them in JSON. Each page has its own store.
+    An artifact can be deferred, i.e. produced by a function when it is requested.
+    Each artifact is served once.
+
+    Artifacts are registered with an owner (JS layer id). When a layer is rebuilt, artifacts of
+    the previous build that have not been requested yet are discarded, so deferred work is never done."""
+
+    def __init__(self):
+        self._items = {}        # id -> (data or producer, mime type, deferred, owner)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self.id = next(_storeIds)
+        _stores[self.id] = self
+
+        self.served = self.discarded = 0
+
+    def put(self, data, mimeType="application/octet-stream", owner=None):
+        """data: QByteArray, bytes or QImage. returns URL of the artifact"""
+        return self._put(data, mimeType, False, owner)
+
+    def putDeferred(self, producer, mimeType="application/octet-stream", owner=None):
+        """producer: a function that returns data of the artifact. It is called in a worker thread
+           when the artifact is requested. returns URL of the artifact"""
+        return self._put(producer, mimeType, True, owner)
+
+    def _put(self, data, mimeType, deferred, owner):
+        with self._lock:
+            id = next(self._ids)
+            self._items[id] = (data, mimeType, deferred, owner)
+        return "{}:{}/{}".format(SCHEME, self.id, id)
+
+    def take(self, id):
+        """removes an artifact and returns a tuple of data (or producer), mime type and whether it is deferred.
+           None is returned if there is no such artifact."""
+        with self._lock:
+            item = self._items.pop(id, None)
+            if item is None:
+                return None
+
+            self.served += 1
+            return item[:3]
+
+    def discard(self, owner=None):
+        """discards artifacts of an owner that have not been requested. If owner is None, all artifacts are discarded."""
+        with self._lock:
+            if owner is None:
+                ids = list(self._items)
+            else:
+                ids = [id for id, item in self._items.items() if item[3] == owner]
+
+            for id in ids:
+                del self._items[id]
+            self.discarded += len(ids)
+
+    def clear(self):
+        self.discard()
+
+    def count(self):
+        return len(self._items)
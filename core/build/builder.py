@@ -7,10 +7,12 @@ from qgis.core import Qgis, QgsApplication
 
 from ..const import LayerType
 from .datamanager import ImageManager
+from .layerbuilderbase import createWorkerPool
+from .layerstore import LayerStore
 from .dem.builder import DEMLayerBuilder
 from .vector.builder import VectorLayerBuilder
 from .pointcloud.builder import PointCloudLayerBuilder
-from ...utils import int_color
+from ...utils import int_color, trace
 
 
 LayerBuilderFactory = {
@@ -24,15 +26,36 @@ LayerBuilderFactory = {
 
 class ThreeJSBuilder:
 
+    BUILD_BLOCKS = False    # whether layer builders build blocks in build()
+
     def __init__(self, settings, progress=None, log=None):
         self.settings = settings
         self.progress = progress or dummyProgress
         self.log = log or dummyLogMessage
         self.imageManager = ImageManager(settings)
+        self.layerStores = {}       # layer id -> LayerStore. used in preview
 
+        self._executor = None
         self._canceled = False
 
+    @property
+    def executor(self):
+        """executor to build blocks in worker threads, created on first use. None if BUILD_WORKERS is 0"""
+        if self._executor is None:
+            self._executor = createWorkerPool()
+        return self._executor
+
+    def close(self):
+        """shuts down worker threads. Blocks that have been submitted are still built"""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
     def buildScene(self, build_layers=True, cancelSignal=None):
+        with trace.span("scene"):
+            return self._buildScene(build_layers, cancelSignal)
+
+    def _buildScene(self, build_layers=True, cancelSignal=None):
         self.progress(5, "Building scene...")
         be = self.settings.baseExtent()
         mapTo3d = self.settings.mapTo3d()
@@ -85,28 +108,59 @@ class ThreeJSBuilder:
 
         layers = []
         layer_list = [layer for layer in self.settings.layers() if layer.visible]
+        builders = [self.layerBuilder(layer) for layer in layer_list]
+
+        if self.executor and self.BUILD_BLOCKS:
+            # start building DEM blocks first, so that DEM data are read in worker threads while other layers are being built
+            self.progress(10, "Reading DEM data...")
+            for builder in builders:
+                if self.canceled:
+                    break
+
+                if isinstance(builder, DEMLayerBuilder):
+                    builder.prepareBlocks(cancelSignal)
+
         total = len(layer_list)
-        for i, layer in enumerate(layer_list):
+        for i, (layer, builder) in enumerate(zip(layer_list, builders)):
             self.progress(int(i / total * 80) + 10, "Building {} layer...".format(layer.name))
 
             if self.canceled:
                 break
 
-            obj = self.buildLayer(layer, cancelSignal)
+            with trace.span("layer", name=layer.name):
+                obj = builder.build(self.BUILD_BLOCKS, cancelSignal)
             if obj:
                 layers.append(obj)
 
+        if self.canceled:
+            # blocks of DEM layers that have not been built
+            for builder in builders:
+                if isinstance(builder, DEMLayerBuilder) and builder.blockQueue:
+                    builder.blockQueue.cancel()
+
         if cancelSignal:
             cancelSignal.disconnect(self.cancel)
 
         return layers
 
     def buildLayer(self, layer, cancelSignal=None):
+        return self.layerBuilder(layer).build(self.BUILD_BLOCKS, cancelSignal)
+
+    def layerBuilder(self, layer):
         builder = LayerBuilderFactory.get(layer.type, VectorLayerBuilder)(self.settings, layer, self.imageManager)
-        return builder.build(cancelSignal=cancelSignal)
+        builder.executor = self.executor
+
+        if self.settings.isPreview:
+            store = self.layerStores.get(layer.layerId)
+            if store is None:
+                store = self.layerStores[layer.layerId] = LayerStore()
+            store.watch(layer.mapLayer)
+            builder.store = store
+
+        return builder
 
     def layerBuilders(self, layer):
-        builder = LayerBuilderFactory.get(layer.type, VectorLayerBuilder)(self.settings, layer, self.imageManager)
+        builder = self.layerBuilder(layer)
         yield builder
 
         for builder in builder.subBuilders():
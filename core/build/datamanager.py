@@ -4,13 +4,18 @@
 # begin: 2014-01-16
 
 import os
+import threading
+from concurrent.futures import Future
 
 from qgis.PyQt.QtCore import Qt, QSize, QUrl
-from qgis.PyQt.QtGui import QColor, QImage, QPainter
-from qgis.core import QgsMapLayer
+from qgis.PyQt.QtGui import QColor, QImage
+from qgis.core import QgsMapSettings
 
+from .renderqueue import MapRenderQueue
 from ... import utils
-from ...utils import logMessage
+from ...mapextent import MapExtent
+from ...texturecache import textureCache
+from ...utils import logMessage, trace
 
 
 class DataManager:
@@ -18,17 +23,52 @@ class DataManager:
 
     def __init__(self):
         self._list = []
+        self._indices = {}      # canonical key -> index in the list
+        self._lock = threading.Lock()     # blocks can be built in worker threads
+
+        self.lookups = self.hits = 0
 
     def count(self):
         return len(self._list)
 
     def _index(self, data):
-        if data in self._list:
-            return self._list.index(data)
+        key = self.canonicalKey(data)
+        with self._lock:
+            self.lookups += 1
+
+            index = self._indices.get(key)
+            if index is not None:
+                self.hits += 1
+                return index
+
+            index = len(self._list)
+            self._list.append(data)
+            self._indices[key] = index
+            return index
+
+    @classmethod
+    def canonicalKey(cls, data):
+        """returns a hashable key of an item. Items that have the same key are regarded as the same item."""
+        if isinstance(data, (tuple, list)):
+            return tuple(cls.canonicalKey(v) for v in data)
+
+        if isinstance(data, MapExtent):
+            c = data.center()
+            return (MapExtent, c.x(), c.y(), data.width(), data.height(), data.rotation())
+
+        if isinstance(data, dict):
+            return (dict,) + tuple(sorted((k, cls.canonicalKey(v)) for k, v in data.items()))
 
-        index = len(self._list)
-        self._list.append(data)
-        return index
+        return data
+
+    def stats(self):
+        return {"lookups": self.lookups,
+                "hits": self.hits,
+                "unique": len(self._list)}
+
+    def statsString(self):
+        s = self.stats()
+        return "{} lookup(s), {} hit(s), {} unique item(s)".format(s["lookups"], s["hits"], s["unique"])
 
 
 class ImageManager(DataManager):
@@ -42,6 +82,10 @@ class ImageManager(DataManager):
         self.exportSettings = exportSettings
         self._renderer = None
 
+        # map images are rendered concurrently in the render queue of export settings if it is set
+        self.renderQueue = exportSettings.renderQueue or MapRenderQueue()
+        self._renders = {}      # index -> Future of image started with prepareImage()
+
     def mapImageIndex(self, width, height, extent, transp_background, format):
         img = (self.IMG_MAP, (None, width, height, extent, transp_background), format)
         return self._index(img)
@@ -55,19 +99,12 @@ class ImageManager(DataManager):
         return self._index(img)
 
     def renderedImage(self, layerids, width, height, extent, transp_background=False):
-        # render layers with QgsMapRendererCustomPainterJob
-        from qgis.core import QgsMapRendererCustomPainterJob
-        antialias = True
-        settings = self.exportSettings.mapSettings
-
-        # store old map settings
-        old_outputSize = settings.outputSize()
-        old_extent = settings.extent()
-        old_rotation = settings.rotation()
-        old_layers = settings.layers()
-        old_backgroundColor = settings.backgroundColor()
-
-        # map settings
+        return self.renderQueue.result(self.startRender(layerids, width, height, extent, transp_background))
+
+    def startRender(self, layerids, width, height, extent, transp_background=False):
+        """starts rendering a map image in the render queue, and returns a Future of the image"""
+        # map settings. a copy is modified so that the map settings of export settings are kept unchanged
+        settings = QgsMapSettings(self.exportSettings.mapSettings)
         settings.setOutputSize(QSize(width, height))
         settings.setExtent(extent.unrotatedRect())
         settings.setRotation(extent.rotation())
@@ -78,36 +115,42 @@ class ImageManager(DataManager):
         if transp_background:
             settings.setBackgroundColor(QColor(Qt.GlobalColor.transparent))
 
-        has_pluginlayer = False
-        for layer in settings.layers():
-            if layer and layer.type() == QgsMapLayer.PluginLayer:
-                has_pluginlayer = True
-                break
-
-        # create an image
-        image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
-        painter = QPainter()
-        painter.begin(image)
-        if antialias:
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-
-        # rendering
-        job = QgsMapRendererCustomPainterJob(settings, painter)
-        if has_pluginlayer:
-            job.renderSynchronously()   # use this method so that TileLayerPlugin layer is rendered correctly
-        else:
-            job.start()
-            job.waitForFinished()
-        painter.end()
+        layers = [layer for layer in settings.layers() if layer]
 
-        # restore map settings
-        settings.setOutputSize(old_outputSize)
-        settings.setExtent(old_extent)
-        settings.setRotation(old_rotation)
-        settings.setLayers(old_layers)
-        settings.setBackgroundColor(old_backgroundColor)
+        # rendered images are reused while the layers and map settings are unchanged
+        cache = textureCache()
+        key, persistent = cache.key(settings)
+        image = cache.get(key, disk=persistent)
+        if image is not None:
+            future = Future()
+            future.set_result(image)
+            return future
 
-        return image
+        revisions = cache.revisions(layers)
+        cache.watch(layers)
+
+        span = trace.span("texture.render", "texture", pixels=width * height, layers=len(layers)).begin()
+
+        def finished(future):
+            span.end()
+            if not future.cancelled() and future.exception() is None:
+                cache.putImage(key, future.result(), layers, revisions, disk=persistent)
+
+        future = self.renderQueue.start(settings)
+        future.add_done_callback(finished)
+        return future
+
+    def prepareImage(self, index):
+        """starts rendering the image of the index, so that images are rendered concurrently.
+           image() returns the image when it is ready. returns a Future of the image, or None for an image file"""
+        imageType, args, fmt = self._list[index]
+        if imageType == self.IMG_FILE:
+            return None
+
+        future = self._renders.get(index)
+        if future is None or future.cancelled():
+            future = self._renders[index] = self.startRender(*args)
+        return future
 
     def image(self, index):
         imageType, args, fmt = self._list[index]
@@ -120,7 +163,10 @@ class ImageManager(DataManager):
                 logMessage("Image file not found: {0}".format(image_path), warning=True)
 
         else:   # IMG_MAP or IMG_LAYER
-            image = self.renderedImage(*args)
+            future = self._renders.pop(index, None)
+            if future is None or future.cancelled():
+                future = self.startRender(*args)
+            image = self.renderQueue.result(future)
 
             if fmt == "JPEG":
                 return utils.jpegCompressedImage(image)
@@ -185,6 +231,8 @@ class MaterialManager(DataManager):
 
         self.imageManager = imageManager
         self.basicMaterialType = basicType
+        self.artifactStore = None       # if set, images are sent to the preview via the artifact store
+        self.artifactOwner = None
 
     def _indexCol(self, type, color, opacity=1, doubleSide=False, opts=None):
         if color[0:2] != "0x":
@@ -230,6 +278,17 @@ class MaterialManager(DataManager):
         mtl = (self.SPRITE_IMAGE, None, opacity, False, (path_url, transp_background))
         return self._index(mtl)
 
+    def prepareImage(self, index):
+        """starts rendering the image of a map or layer image material. returns a Future of the image, or None"""
+        mt, color, opacity, doubleSide, opts = self._list[index]
+        if mt == self.MAP_IMAGE:
+            return self.imageManager.prepareImage(self.imageManager.mapImageIndex(*opts[0]))
+
+        if mt == self.LAYER_IMAGE:
+            return self.imageManager.prepareImage(self.imageManager.layerImageIndex(*opts[0]))
+
+        return None
+
     def build(self, index, filepath=None, url=None, base64=False):
 
         mt, color, opacity, doubleSide, opts = self._list[index]
@@ -264,6 +323,10 @@ class MaterialManager(DataManager):
             if url is None:
                 if base64:
                     m["image"] = {"base64": self.imageManager.dataUri(imgIndex)}
+                elif self.artifactStore is not None:
+                    # image is rendered in this thread, and encoded in PNG when the page requests it
+                    image = self.imageManager.image(imgIndex)
+                    m["image"] = {"url": self.artifactStore.putDeferred(lambda: image, "image/png", self.artifactOwner)}
                 else:
                     m["image"] = {"object": self.imageManager.image(imgIndex)}
             else:
@@ -309,9 +372,10 @@ class MaterialManager(DataManager):
 
         return m
 
-    def buildAll(self, pathRoot=None, urlRoot=None, base64=False):
+    def buildAll(self, pathRoot=None, urlRoot=None, base64=False, start=0):
+        """build materials. start: index of first material to build"""
         mList = []
-        for i, item in enumerate(self._list):
+        for i, item in enumerate(self._list[start:], start):
             mt, color, opacity, doubleSide, opts = item
             filepath = url = None
 
@@ -338,9 +402,10 @@ class ModelManager(DataManager):
     def modelIndex(self, path):
         return self._index(path)
 
-    def build(self, export=True, base64=False):
+    def build(self, export=True, base64=False, start=0):
+        """build models. start: index of first model to build"""
         a = []
-        for path_url in self._list:
+        for path_url in self._list[start:]:
             if path_url.startswith("http:") or path_url.startswith("https:"):
                 a.append({"url": path_url})
             elif base64:
@@ -6,10 +6,11 @@
 from qgis.PyQt.QtCore import QSize
 from qgis.core import QgsPoint, QgsProject
 
-from .grid_builder import DEMGridBuilder
+from .grid_builder import DEMGridBuilder, buildDecorations
 from .material_builder import DEMMaterialBuilder
 from .property_reader import DEMPropertyReader
-from ..layerbuilderbase import LayerBuilderBase
+from ..layerbuilderbase import BlockBuildQueue, LayerBuilderBase
+from ..layerstore import LayerChange
 from ...const import DEMMtlType
 from ...geometry import dissolvePolygonsWithinExtent
 from ...mapextent import MapExtent
@@ -23,14 +24,27 @@ class DEMLayerBuilder(LayerBuilderBase):
 
         self.provider = settings.demProviderByLayerId(layer.layerId)
         self.mtlBuilder = DEMMaterialBuilder(settings, layer, imageManager, pathRoot, urlRoot)
-        self.grdBuilder = DEMGridBuilder(self.settings, self.mtlBuilder.materialManager, self.layer, self.provider, self.pathRoot, self.urlRoot)
+        self.blockQueue = None
 
     def build(self, build_blocks=False, cancelSignal=None):
         if self.provider is None:
             return None
 
         if self.layer.opt.onlyMaterial:
-            return None     # do not send "layer" data
+            if self.layer.opt.changes & LayerChange.GEOMETRY:
+                return None     # do not send "layer" data
+
+            # update layer properties only. blocks in the view are kept
+            d = {
+                "type": "layer",
+                "id": self.layer.jsLayerId,
+                "properties": self.layerProperties()
+            }
+
+            if self.layer.opt.changes & LayerChange.STYLE:
+                # materials of sides, edges and wireframe
+                d["decorations"] = buildDecorations(self.mtlBuilder.materialManager, self.properties, self.isLOD())
+            return d
 
         d = {
             "type": "layer",
@@ -43,13 +57,22 @@ class DEMLayerBuilder(LayerBuilderBase):
         if build_blocks:
             self._startBuildBlocks(cancelSignal)
 
-            for builder in self.subBuilders():
+            if self.blockQueue is None:
+                self.prepareBlocks()
+
+            for obj in self.blockQueue.results():
                 if self.canceled:
+                    self.blockQueue.cancel()
                     break
-                data.append(builder.build())
+                data.append(obj)
 
+            self.blockQueue = None
             self._endBuildBlocks(cancelSignal)
 
+            # datasets opened in worker threads are not used any more
+            if hasattr(self.provider, "close"):
+                self.provider.close()
+
         d["data"] = data
 
         if self.canceled:
@@ -60,26 +83,62 @@ class DEMLayerBuilder(LayerBuilderBase):
 
         return d
 
+    def prepareBlocks(self, cancelSignal=None):
+        """start building blocks. If executor is set, grid blocks are built in worker threads.
+           Textures of materials are rendered concurrently, and each block is emitted when it is ready."""
+        self.blockQueue = BlockBuildQueue(self.executor)
+        self._startBuildBlocks(cancelSignal)
+        try:
+            for builder in self.subBuilders():
+                if self.canceled:
+                    self.blockQueue.cancel()
+                    break
+                self.blockQueue.add(builder)
+        finally:
+            self._endBuildBlocks(cancelSignal)
+
     def layerProperties(self):
         p = LayerBuilderBase.layerProperties(self)
         p["type"] = "dem"
         p["clipped"] = self.properties.get("checkBox_Clip", False)
         p["mtlNames"] = [mtl.get("name", "") for mtl in self.properties.get("materials", [])]
         p["mtlIdx"] = self.layer.mtlIndex(self.properties.get("mtlId"))
+
+        if self.isLOD():
+            p["lod"] = {"levels": self.properties.get("spinBox_LODLevels", 3)}
         return p
 
-    def subBuilders(self):
+    def blockExtent(self):
+        """returns extent of center block"""
         be = self.settings.baseExtent()
 
-        materials = self.properties.get("materials", [])
-        mtlCount = len(materials)
-        currentMtlId = self.properties.get("mtlId")
-
         if self.mtlBuilder.currentMtlType() in (DEMMtlType.LAYER, DEMMtlType.MAPCANVAS):
             # calculate extent with the same aspect ratio as current material texture image
             tex_size = DEMPropertyReader.textureSize(self.mtlBuilder.currentMtlProperties(), be, self.settings)
             be = MapExtent(be.center(), be.width(), be.width() * tex_size.height() / tex_size.width(), be.rotation())
 
+        return be
+
+    def isLOD(self):
+        """returns True if tiles are exported as a quadtree pyramid. The viewer loads tiles of the pyramid
+           by distance from camera, so tile files are required (i.e. web export in non-local mode)."""
+        p = self.properties
+        return bool(p.get("checkBox_Tiles") and p.get("checkBox_LOD") and self.pathRoot is not None)
+
+    def subBuilders(self):
+        if self.layer.opt.onlyMaterial and not (self.layer.opt.changes & LayerChange.MATERIAL):
+            return
+
+        if self.isLOD():
+            yield from self.lodSubBuilders()
+            return
+
+        be = self.blockExtent()
+
+        materials = self.properties.get("materials", [])
+        mtlCount = len(materials)
+        currentMtlId = self.properties.get("mtlId")
+
         planeWidth, planeHeight = (be.width(), be.height())
 
         center = be.center()
@@ -122,12 +181,14 @@ class DEMLayerBuilder(LayerBuilderBase):
                                  max(1, base_grid_seg.height() // roughness))
 
             # set up material builder for first/current material
+            # a new builder for each material, since materials may be built concurrently
+            mtlBuilder = self.mtlBuilder.clone()
             if self.layer.opt.allMaterials and len(materials):
                 id = materials[0].get("id")
-                self.mtlBuilder.setup(blockIndex, extent, id, useNow=bool(id == currentMtlId))
+                mtlBuilder.setup(blockIndex, extent, id, useNow=bool(id == currentMtlId))
             else:
-                self.mtlBuilder.setup(blockIndex, extent, useNow=True)
-            yield self.mtlBuilder
+                mtlBuilder.setup(blockIndex, extent, useNow=True)
+            yield mtlBuilder
 
             # set up grid builder
             if not self.layer.opt.onlyMaterial:
@@ -135,7 +196,8 @@ class DEMLayerBuilder(LayerBuilderBase):
                 if is_center:
                     grdBuilder = centerBlk
                 else:
-                    grdBuilder = self.grdBuilder
+                    # a new builder for each block, since blocks may be built concurrently
+                    grdBuilder = DEMGridBuilder(self.settings, self.mtlBuilder.materialManager, self.layer, self.provider, self.pathRoot, self.urlRoot)
                     if sx * sx <= 1 and sy * sy <= 1:
                         neighbors = [(sx, sy, centerBlk, 1)]
 
@@ -152,5 +214,50 @@ class DEMLayerBuilder(LayerBuilderBase):
             if self.layer.opt.allMaterials:
                 for i in range(1, mtlCount):
                     id = materials[i].get("id")
-                    self.mtlBuilder.setup(blockIndex, extent, id, useNow=bool(id == currentMtlId))
-                    yield self.mtlBuilder
+                    mtlBuilder = self.mtlBuilder.clone()
+                    mtlBuilder.setup(blockIndex, extent, id, useNow=bool(id == currentMtlId))
+                    yield mtlBuilder
+
+    def lodSubBuilders(self):
+        """yields builders of a quadtree tile pyramid. Level 0 tile covers the area of all tiles
+           (size x size base extents), and each tile of level n is divided into 4 tiles of level n + 1.
+           Every tile has the same grid size as the base extent."""
+        be = self.blockExtent()
+
+        materials = self.properties.get("materials", [])
+        currentMtlId = self.properties.get("mtlId")
+        if self.layer.opt.allMaterials and len(materials):
+            mtlIds = [mtl.get("id") for mtl in materials]
+        else:
+            mtlIds = [None]
+
+        center = be.center()
+        rotation = be.rotation()
+        grid_seg = self.settings.demGridSegments(self.layer.layerId)
+
+        size = self.properties.get("spinBox_Size", 1)
+        levels = self.properties.get("spinBox_LODLevels", 3)
+        width, height = (be.width() * size, be.height() * size)
+
+        blockIndex = 0
+        for level in range(levels):
+            n = 2 ** level
+            tw, th = (width / n, height / n)
+
+            for ty in range(n):
+                for tx in range(n):
+                    offsetX = (tx + 0.5) * tw - width / 2
+                    offsetY = height / 2 - (ty + 0.5) * th
+                    extent = MapExtent(QgsPoint(center.x() + offsetX, center.y() + offsetY), tw, th).rotate(rotation, center)
+
+                    for id in mtlIds:
+                        mtlBuilder = self.mtlBuilder.clone()
+                        mtlBuilder.setup(blockIndex, extent, id, useNow=(id is None or id == currentMtlId))
+                        yield mtlBuilder
+
+                    grdBuilder = DEMGridBuilder(self.settings, self.mtlBuilder.materialManager, self.layer, self.provider, self.pathRoot, self.urlRoot)
+                    grdBuilder.setup(blockIndex, grid_seg, extent, tw, th, offsetX=offsetX, offsetY=offsetY,
+                                     tile=[level, tx, ty])
+                    yield grdBuilder
+
+                    blockIndex += 1
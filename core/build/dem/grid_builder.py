@@ -2,8 +2,9 @@
 # (C) 2014 Minoru Akagi
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import base64
 import json
-import struct
+import numpy
 from qgis.PyQt.QtCore import QByteArray
 from qgis.core import QgsGeometry
 
@@ -13,6 +14,29 @@ from ....conf import DEBUG_MODE, DEF_SETS
 from ....utils import hex_color, logMessage, parseFloat
 
 
+def buildDecorations(mtlManager, properties, tile=False):
+    """returns a dict that has materials of sides, edges and wireframe of DEM blocks"""
+    opacity = DEMPropertyReader.opacity(properties)
+    d = {}
+
+    # sides and bottom
+    if properties.get("checkBox_Sides") and not tile:
+        mi = mtlManager.getMeshMaterialIndex(hex_color(properties.get("colorButton_Side", DEF_SETS.SIDE_COLOR), prefix="0x"), opacity)
+        d["sides"] = {"mtl": mtlManager.build(mi)}
+
+    # edges
+    if properties.get("checkBox_Frame") and not properties.get("checkBox_Clip") and not tile:
+        mi = mtlManager.getLineIndex(hex_color(properties.get("colorButton_Edge", DEF_SETS.EDGE_COLOR), prefix="0x"), opacity)
+        d["edges"] = {"mtl": mtlManager.build(mi)}
+
+    # wireframe
+    if properties.get("checkBox_Wireframe"):
+        mi = mtlManager.getLineIndex(hex_color(properties.get("colorButton_Wireframe", DEF_SETS.WIREFRAME_COLOR), prefix="0x"), opacity)
+        d["wireframe"] = {"mtl": mtlManager.build(mi)}
+
+    return d
+
+
 class DEMGridBuilder:
 
     def __init__(self, settings, mtlManager, layer, provider, pathRoot=None, urlRoot=None):
@@ -24,11 +48,13 @@ class DEMGridBuilder:
         self.properties = layer.properties
 
         self.provider = provider
+        self.threadSafe = getattr(provider, "threadSafe", False)    # can be built in a worker thread
 
         self.pathRoot = pathRoot
         self.urlRoot = urlRoot
 
-    def setup(self, blockIndex, grid_seg, extent, planeWidth, planeHeight, offsetX=0, offsetY=0, roughness=1, edgeRoughness=1, clip_geometry=None, neighbors=None):
+    def setup(self, blockIndex, grid_seg, extent, planeWidth, planeHeight, offsetX=0, offsetY=0, roughness=1, edgeRoughness=1, clip_geometry=None, neighbors=None, tile=None):
+        """tile: [level, x, y] of a quadtree LOD tile, or None"""
         self.blockIndex = blockIndex
         self.grid_seg = grid_seg
         self.extent = extent
@@ -40,9 +66,14 @@ class DEMGridBuilder:
         self.edgeRoughness = edgeRoughness
         self.clip_geometry = clip_geometry
         self.neighbors = neighbors or []
+        self.tile = tile
 
         self.edges = None
 
+    def dependencies(self):
+        """returns grid builders whose edges this block refers to"""
+        return [n[2] for n in self.neighbors]
+
     def build(self):
         mapTo3d = self.settings.mapTo3d()
 
@@ -55,6 +86,9 @@ class DEMGridBuilder:
              "zScale": mapTo3d.zScale
              }
 
+        if self.tile:
+            b["tile"] = self.tile
+
         # geometry
         if self.clip_geometry:
             geom = self.clipped(self.clip_geometry)
@@ -69,47 +103,37 @@ class DEMGridBuilder:
                 b["geom"] = {"url": self.urlRoot + tail}
         else:
             grid_width, grid_height = (self.grid_seg.width() + 1, self.grid_seg.height() + 1)
-
-            if self.edgeRoughness == 1 and len(self.neighbors) == 0:
-                ba = self.provider.read(grid_width, grid_height, self.extent)
-            else:
-                grid_values = list(self.provider.readValues(grid_width, grid_height, self.extent))
-                self.processEdges(grid_values, self.edgeRoughness)
-                ba = struct.pack("{0}f".format(grid_width * grid_height), *grid_values)
-
             g = {"width": grid_width,
                  "height": grid_height}
 
-            if self.settings.jsonSerializable:
-                g["array"] = list(struct.unpack("f" * grid_width * grid_height, ba))
-            elif self.settings.isPreview:
-                g["binary"] = QByteArray(ba)
+            if self.settings.isPreview or self.settings.localMode or self.pathRoot is None:
+                grid_values = numpy.asarray(self.provider.readValues(grid_width, grid_height, self.extent), dtype=numpy.float32)
+                self.processGrid(grid_values.reshape((grid_height, grid_width)))
+
+                if self.settings.jsonSerializable:
+                    # little-endian Float32 array encoded in base64
+                    g["base64"] = base64.b64encode(grid_values.astype("<f4", copy=False).tobytes()).decode("ascii")
+                elif self.settings.binaryTransport:
+                    # the page fetches grid values by URL
+                    g["url"] = self.settings.artifactStore.put(grid_values.tobytes(), owner=self.layer.jsLayerId)
+                else:
+                    g["binary"] = QByteArray(grid_values.tobytes())
             else:
-                # write grid values to an binary file
+                # write grid values to a binary file through a memory map, so that the grid is not held in memory
                 tail = "{0}.bin".format(self.blockIndex)
-                with open(self.pathRoot + tail, "wb") as f:
-                    f.write(ba)
+                grid_values = numpy.memmap(self.pathRoot + tail, dtype="<f4", mode="w+", shape=(grid_height, grid_width))
+                self.provider.readInto(grid_values, self.extent)
+                self.processGrid(grid_values)
+                grid_values.flush()
+                del grid_values
                 g["url"] = self.urlRoot + tail
 
             b["grid"] = g
 
-        opacity = DEMPropertyReader.opacity(self.properties)
-
-        # sides and bottom
-        if self.properties.get("checkBox_Sides"):
-            mi = self.mtlManager.getMeshMaterialIndex(hex_color(self.properties.get("colorButton_Side", DEF_SETS.SIDE_COLOR), prefix="0x"), opacity)
-            b["sides"] = {"mtl": self.mtlManager.build(mi),
-                          "bottom": parseFloat(self.properties.get("lineEdit_Bottom"), DEF_SETS.Z_BOTTOM)}
-
-        # edges
-        if self.properties.get("checkBox_Frame") and not self.properties.get("checkBox_Clip"):
-            mi = self.mtlManager.getLineIndex(hex_color(self.properties.get("colorButton_Edge", DEF_SETS.EDGE_COLOR), prefix="0x"), opacity)
-            b["edges"] = {"mtl": self.mtlManager.build(mi)}
-
-        # wireframe
-        if self.properties.get("checkBox_Wireframe"):
-            mi = self.mtlManager.getLineIndex(hex_color(self.properties.get("colorButton_Wireframe", DEF_SETS.WIREFRAME_COLOR), prefix="0x"), opacity)
-            b["wireframe"] = {"mtl": self.mtlManager.build(mi)}
+        # sides and bottom, edges and wireframe (sides and edges are not for LOD tiles, which overlap tiles of other levels)
+        b.update(buildDecorations(self.mtlManager, self.properties, self.tile))
+        if "sides" in b:
+            b["sides"]["bottom"] = parseFloat(self.properties.get("lineEdit_Bottom"), DEF_SETS.Z_BOTTOM)
 
         return b
 
@@ -136,14 +160,19 @@ class DEMGridBuilder:
         d["polygons"] = polygons
         return d
 
-    def processEdges(self, grid_values, roughness):
+    def processGrid(self, grid):
+        """grid: 2D NumPy array of grid values, which is modified in place"""
+        if self.edgeRoughness != 1 or len(self.neighbors):
+            self.processEdges(grid, self.edgeRoughness)
+
+    def processEdges(self, grid, roughness):
+        """grid: 2D NumPy array of grid values (a view, which is modified in place)"""
 
         if self.offsetX == 0 and self.offsetY == 0:
-            self.processEdgesCenter(grid_values, roughness)
+            self.processEdgesCenter(grid, roughness)
             return
 
-        grid_width, grid_height = (self.grid_seg.width() + 1,
-                                   self.grid_seg.height() + 1)
+        grid_width = self.grid_seg.width() + 1
 
         for sx, sy, neighbor, roughness in self.neighbors:
             if self.roughness <= roughness:
@@ -154,103 +183,60 @@ class DEMGridBuilder:
 
             if (sx, sy) == (0, -1):
                 # top edge
-                for x in range(grid_width):
-                    grid_values[x] = neighbor.edges[0][x]
+                grid[0, :] = neighbor.edges[0][:grid_width]
 
             elif (sx, sy) == (0, 1):
                 # bottom edge
-                offset = grid_width * (grid_height - 1)
-                for x in range(grid_width):
-                    grid_values[offset + x] = neighbor.edges[3][x]
+                grid[-1, :] = neighbor.edges[3][:grid_width]
 
             elif (sx, sy) == (-1, 0):
                 # right edge
-                offset = grid_width - 1
-                for y in range(grid_height):
-                    grid_values[offset + grid_width * y] = neighbor.edges[1][y]
+                grid[:, -1] = neighbor.edges[1][:grid.shape[0]]
 
             elif (sx, sy) == (1, 0):
                 # left edge
-                for y in range(grid_height):
-                    grid_values[grid_width * y] = neighbor.edges[2][y]
+                grid[:, 0] = neighbor.edges[2][:grid.shape[0]]
 
             elif (sx, sy) == (-1, -1):
                 # top-right corner
-                grid_values[grid_width - 1] = neighbor.edges[0][0]
+                grid[0, -1] = neighbor.edges[0][0]
 
             elif (sx, sy) == (1, -1):
                 # top-left corner
-                grid_values[0] = neighbor.edges[0][grid_width - 1]
+                grid[0, 0] = neighbor.edges[0][grid_width - 1]
 
             elif (sx, sy) == (-1, 1):
                 # bottom-right corner
-                grid_values[grid_width * grid_height - 1] = neighbor.edges[3][0]
+                grid[-1, -1] = neighbor.edges[3][0]
 
             elif (sx, sy) == (1, 1):
                 # bottom-left corner
-                grid_values[grid_width * (grid_height - 1)] = neighbor.edges[3][grid_width - 1]
+                grid[-1, 0] = neighbor.edges[3][grid_width - 1]
 
             else:
                 logMessage("Edge processing: invalid sx and sy ({}, {})".format(sx, sy), warning=True)
 
-    def processEdgesCenter(self, grid_values, roughness):
-
-        grid_width, grid_height = (self.grid_seg.width() + 1,
-                                   self.grid_seg.height() + 1)
-        rg_grid_width, rg_grid_height = (self.grid_seg.width() // roughness + 1,
-                                         self.grid_seg.height() // roughness + 1)
-        ii = range(roughness)[1:]
-
-        iy0 = grid_width * (grid_height - 1)
-        e_top = [grid_values[0]]
-        e_bottom = [grid_values[iy0]]
-
-        for x0 in range(rg_grid_width - 1):
-            # top edge
-            ix0 = x0 * roughness
-            z0 = grid_values[ix0]
-            z1 = grid_values[ix0 + roughness]
-            s = (z1 - z0) / roughness
-            for i in ii:
-                grid_values[ix0 + i] = z0 + s * i
-
-            e_top.append(z1)
-
-            # bottom edge
-            z0 = grid_values[iy0 + ix0]
-            z1 = grid_values[iy0 + ix0 + roughness]
-            s = (z1 - z0) / roughness
-            for i in ii:
-                grid_values[iy0 + ix0 + i] = z0 + s * i
-
-            e_bottom.append(z1)
-
-        e_left = [grid_values[0]]
-        e_right = [grid_values[grid_width - 1]]
-
-        rw = roughness * grid_width
-        for y0 in range(rg_grid_height - 1):
-            # left edge
-            iy0 = y0 * rw
-            z0 = grid_values[iy0]
-            z1 = grid_values[iy0 + rw]
-            s = (z1 - z0) / roughness
-            for i in ii:
-                grid_values[iy0 + i * grid_width] = z0 + s * i
-
-            e_left.append(z1)
-
-            # right edge
-            iy0 += grid_width - 1
-            z0 = grid_values[iy0]
-            z1 = grid_values[iy0 + rw]
-            s = (z1 - z0) / roughness
-            for i in ii:
-                grid_values[iy0 + i * grid_width] = z0 + s * i
-
-            e_right.append(z1)
-
-        self.edges = [e_bottom, e_left, e_right, e_top]
+    def processEdgesCenter(self, grid, roughness):
+        """roughen edges of the center block so that they fit to the edges of surrounding blocks.
+        grid: 2D NumPy array of grid values (a view, which is modified in place)"""
+
+        # indices of grid points that are shared with the rough edges of surrounding blocks
+        kx = numpy.arange(self.grid_seg.width() // roughness + 1) * roughness
+        ky = numpy.arange(self.grid_seg.height() // roughness + 1) * roughness
+
+        # linear interpolation between the shared points
+        xs = numpy.arange(kx[-1] + 1)
+        ys = numpy.arange(ky[-1] + 1)
+        for row in (0, -1):
+            grid[row, xs] = numpy.interp(xs, kx, grid[row, kx])
+
+        for col in (0, -1):
+            grid[ys, col] = numpy.interp(ys, ky, grid[ky, col])
+
+        self.edges = [grid[-1, kx].copy(),      # bottom
+                      grid[ky, 0].copy(),       # left
+                      grid[ky, -1].copy(),      # right
+                      grid[0, kx].copy()]       # top
 
     def getValue(self, x, y):
 
@@ -2,6 +2,8 @@
 # (C) 2014 Minoru Akagi
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import copy
+
 from .property_reader import DEMPropertyReader
 from ..datamanager import MaterialManager
 from ...const import DEMMtlType
@@ -10,9 +12,14 @@ from ....utils import hex_color
 
 class DEMMaterialBuilder:
 
+    threadSafe = False      # texture images are rendered from the calling thread. See prepare()
+
     def __init__(self, settings, layer, imageManager, pathRoot, urlRoot):
         self.settings = settings
         self.materialManager = MaterialManager(imageManager, settings.materialType())
+        if settings.isPreview and settings.binaryTransport:
+            self.materialManager.artifactStore = settings.artifactStore
+            self.materialManager.artifactOwner = layer.jsLayerId
 
         self.layer = layer
 
@@ -21,6 +28,13 @@ class DEMMaterialBuilder:
 
         self.mtlId = None
 
+    def clone(self):
+        """returns a new builder that shares the material manager"""
+        return copy.copy(self)
+
+    def dependencies(self):
+        return []
+
     def setup(self, blockIndex, extent, mtlId=None, asBlock=True, useNow=True):
         self.blockIndex = blockIndex
         self.extent = extent
@@ -28,7 +42,34 @@ class DEMMaterialBuilder:
         self.asBlock = asBlock
         self.useNow = useNow
 
+    def prepare(self):
+        """starts rendering the texture image. Textures of blocks are rendered concurrently, and build()
+           waits for the image. returns a Future of the image, or None if the material has no texture"""
+        return self.materialManager.prepareImage(self.materialIndex()[0])
+
     def build(self):
+        mi, mtlIndex, fmt = self.materialIndex()
+
+        # build material
+        ext = fmt.lower().replace("jpeg", "jpg")
+        suffix = "{}{}.{}".format(self.blockIndex, "_{}".format(mtlIndex) if mtlIndex else "", ext)
+        filepath = None if self.pathRoot is None else (self.pathRoot + suffix)
+        url = None if self.urlRoot is None else (self.urlRoot + suffix)
+
+        d = self.materialManager.build(mi, filepath, url, self.settings.jsonSerializable)
+        d["mtlIndex"] = mtlIndex
+        d["useNow"] = self.useNow
+        if self.asBlock:
+            return {
+                "type": "block",
+                "layer": self.layer.jsLayerId,
+                "block": self.blockIndex,
+                "materials": [d]
+            }
+        return d
+
+    def materialIndex(self):
+        """returns a tuple of material index in the material manager, index in the layer materials and image format"""
         # properties
         mtlId = self.mtlId or self.layer.properties.get("mtlId")
         m = self.layer.material(mtlId)
@@ -71,23 +112,7 @@ class DEMMaterialBuilder:
             else:
                 mi = self.materialManager.getMeshBasicMaterialIndex(color, opacity, True)
 
-        # build material
-        ext = fmt.lower().replace("jpeg", "jpg")
-        suffix = "{}{}.{}".format(self.blockIndex, "_{}".format(mtlIndex) if mtlIndex else "", ext)
-        filepath = None if self.pathRoot is None else (self.pathRoot + suffix)
-        url = None if self.urlRoot is None else (self.urlRoot + suffix)
-
-        d = self.materialManager.build(mi, filepath, url, self.settings.jsonSerializable)
-        d["mtlIndex"] = mtlIndex
-        d["useNow"] = self.useNow
-        if self.asBlock:
-            return {
-                "type": "block",
-                "layer": self.layer.jsLayerId,
-                "block": self.blockIndex,
-                "materials": [d]
-            }
-        return d
+        return mi, mtlIndex, fmt
 
     def currentMtl(self):
         mtlId = self.mtlId or self.layer.properties.get("mtlId")
@@ -3,8 +3,102 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 # begin: 2014-01-16
 
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from qgis.core import QgsApplication
 
+from ...conf import BUILD_WORKERS
+from ...utils import trace
+
+
+def createWorkerPool():
+    """returns an executor to build blocks in worker threads, or None if BUILD_WORKERS is 0"""
+    if BUILD_WORKERS > 0:
+        return ThreadPoolExecutor(BUILD_WORKERS, thread_name_prefix="Qgis2threejs")
+    return None
+
+
+class BlockBuildQueue:
+
+    """builds blocks and returns the results in the order in which their builders were added.
+
+    Builders whose threadSafe attribute is True are built in worker threads of the executor, and
+    each of them starts after the builders returned by its dependencies() method have finished.
+    Other builders are built in the calling thread. A builder that has prepare() method (e.g. a DEM
+    material builder that starts rendering its texture) is prepared when it is added, and is built when
+    the Future returned by prepare() is done. Other builders are built when they are added."""
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self.pending = deque()
+        self.futures = {}
+
+    def add(self, builder):
+        if self.executor and getattr(builder, "threadSafe", False):
+            deps = [self.futures[b] for b in builder.dependencies() if b in self.futures]
+            f = self.futures[builder] = self.executor.submit(_buildAfter, builder, deps)
+            self.pending.append(f)
+        elif hasattr(builder, "prepare"):
+            self.pending.append(_Prepared(builder, builder.prepare()))
+        else:
+            self.pending.append(buildTraced(builder))
+
+    def ready(self):
+        """yields results that are ready, without waiting for worker threads and textures"""
+        while self.pending and not (isinstance(self.pending[0], (Future, _Prepared)) and not self.pending[0].done()):
+            yield self._popResult()
+
+    def results(self):
+        """yields all remaining results. waits for worker threads to finish"""
+        while self.pending:
+            yield self._popResult()
+
+    def cancel(self):
+        for p in self.pending:
+            if isinstance(p, (Future, _Prepared)):
+                p.cancel()
+
+        self.pending.clear()
+        self.futures.clear()
+
+    def _popResult(self):
+        p = self.pending.popleft()
+        return p.result() if isinstance(p, (Future, _Prepared)) else p
+
+
+class _Prepared:
+
+    """a builder that has been prepared. It is built in the calling thread when the result is taken"""
+
+    def __init__(self, builder, future):
+        self.builder = builder
+        self.future = future
+
+    def done(self):
+        return self.future is None or self.future.done()
+
+    def cancel(self):
+        if self.future:
+            self.future.cancel()
+
+    def result(self):
+        return buildTraced(self.builder)
+
+
+def _buildAfter(builder, deps):
+    for f in deps:
+        f.result()
+    return buildTraced(builder)
+
+
+def buildTraced(builder):
+    """builds a builder in a span named after its class"""
+    with trace.span(type(builder).__name__, "builder") as s:
+        obj = builder.build()
+        if isinstance(obj, dict) and "featureCount" in obj:
+            s.set(features=obj["featureCount"])
+    return obj
+
 
 class LayerBuilderBase:
 
@@ -19,6 +113,9 @@ class LayerBuilderBase:
         self.progress = progress or dummyProgress
         self.log = log or dummyLogMessage
 
+        self.executor = None    # executor to build blocks in worker threads. See createWorkerPool()
+        self.store = None       # LayerStore to reuse intermediate products of previous build in preview
+
         self._canceled = False
 
     def build(self):
@@ -45,6 +142,10 @@ class LayerBuilderBase:
         if cancelSignal:
             cancelSignal.disconnect(self.cancel)
 
+    def dependsOnExtent(self):
+        """returns True if objects of the layer need to be rebuilt when base extent is moved"""
+        return True
+
     def layerProperties(self):
         return {
             "name": self.layer.name,
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import json
+import threading
+import numpy
+
+from qgis.PyQt.QtCore import Qt
+
+from ..const import DEMMtlType, LayerType, PropertyID as PID
+from ...conf import DEF_SETS, LAYER_STORE_SIZE
+
+
+class LayerChange:
+
+    """kinds of layer property changes"""
+
+    NONE = 0
+    STYLE = 1           # layer level properties only (e.g. visibility, label style)
+    MATERIAL = 2
+    LABEL = 4
+    ATTRIBUTE = 8
+    GEOMETRY = 16
+    ALL = 31
+
+
+_STYLE_KEYS = {"checkBox_Clickable", "checkBox_Visible"}
+
+# colors of sides, edges and wireframe. their materials are sent with layer properties
+_DEM_STYLE_KEYS = _STYLE_KEYS | {"colorButton_Side", "colorButton_Edge", "colorButton_Wireframe"}
+
+_VECTOR_STYLE_KEYS = _STYLE_KEYS | {"comboBox_FontFamily", "slider_FontSize", "colorButton_Label",
+                                    "checkBox_Outline", "colorButton_OtlColor",
+                                    "groupBox_Background", "colorButton_BgColor",
+                                    "groupBox_Conn", "colorButton_ConnColor", "checkBox_Underline"}
+
+# secondary color is not included since it determines whether overlay polygons have borders
+_VECTOR_MATERIAL_KEYS = {PID.PID_NAME_DICT[PID.C], PID.PID_NAME_DICT[PID.OP], PID.PID_NAME_DICT[PID.PATH]}
+
+_VECTOR_LABEL_KEYS = {"checkBox_Label", PID.PID_NAME_DICT[PID.LBLH], PID.PID_NAME_DICT[PID.LBLTXT]}
+
+
+def changeKind(layerType, key):
+    """returns the kind of change (LayerChange) that a change of the layer property affects"""
+    if layerType == LayerType.DEM:
+        if key in _DEM_STYLE_KEYS:
+            return LayerChange.STYLE
+        if key in ("mtlId", "materials"):
+            # texture size of current material also determines grid extent. see classifyChanges()
+            return LayerChange.MATERIAL
+        return LayerChange.GEOMETRY
+
+    if layerType in (LayerType.POINT, LayerType.LINESTRING, LayerType.POLYGON):
+        if key in _VECTOR_STYLE_KEYS:
+            return LayerChange.STYLE
+        if key in _VECTOR_MATERIAL_KEYS or key.startswith("mtlWidget"):
+            return LayerChange.MATERIAL
+        if key in _VECTOR_LABEL_KEYS:
+            return LayerChange.LABEL
+        if key == "checkBox_ExportAttrs":
+            return LayerChange.ATTRIBUTE
+        return LayerChange.GEOMETRY
+
+    return LayerChange.ALL
+
+
+def classifyChanges(layerType, oldProperties, newProperties):
+    """returns kinds of changes between two sets of layer properties as LayerChange flags"""
+    changes = LayerChange.NONE
+    for key in set(oldProperties) | set(newProperties):
+        if oldProperties.get(key) != newProperties.get(key):
+            changes |= changeKind(layerType, key)
+
+    if changes & LayerChange.MATERIAL:
+        if layerType == LayerType.DEM:
+            if demGridExtentKey(oldProperties) != demGridExtentKey(newProperties):
+                changes |= LayerChange.GEOMETRY
+
+        elif newProperties.get("comboBox_ObjectType") == "3D Model":
+            # model file path has been changed
+            changes |= LayerChange.GEOMETRY
+
+    return changes
+
+
+def demGridExtentKey(properties):
+    """returns texture size of current material of a DEM layer, which determines the aspect ratio of grid extent
+       (see DEMLayerBuilder.blockExtent()), or None if the extent does not depend on the material"""
+    mtlId = properties.get("mtlId")
+    mtl = next((m for m in properties.get("materials", []) if m.get("id") == mtlId), {})
+    if mtl.get("type", DEMMtlType.MAPCANVAS) in (DEMMtlType.MAPCANVAS, DEMMtlType.LAYER):
+        return mtl.get("properties", {}).get("comboBox_TextureSize", DEF_SETS.TEXTURE_SIZE)
+    return None
+
+
+def propertiesSignature(layerType, properties, kind=LayerChange.GEOMETRY):
+    """returns a string that changes when any property of the kind changes"""
+    p = {k: v for k, v in properties.items() if changeKind(layerType, k) & kind}
+    if layerType == LayerType.DEM and kind & LayerChange.GEOMETRY:
+        p["gridExtent"] = demGridExtentKey(properties)
+    return json.dumps(p, sort_keys=True, default=str)
+
+
+def sceneSignature(settings):
+    """returns a string that changes when the scene settings that affect all layers change"""
+    return "\n".join([repr(settings.baseExtent()),
+                      settings.crs.authid() if settings.crs else "",
+                      json.dumps(settings.sceneProperties(), sort_keys=True, default=str)])
+
+
+class LayerStore:
+
+    """intermediate products of a layer build, reused by following builds of the layer in preview.
+    Each product is stored with a key, and is discarded when a different key is given."""
+
+    def __init__(self):
+        self._products = {}
+        self._lock = threading.Lock()
+        self._mapLayer = None
+
+        self.dataModified = False       # whether data of the layer have changed since features were read last time
+
+    def get(self, name, key):
+        """returns the product stored with the key, or None"""
+        with self._lock:
+            k, product = self._products.get(name, (None, None))
+            return product if k == key else None
+
+    def put(self, name, key, product):
+        with self._lock:
+            self._products[name] = (key, product)
+
+    def product(self, name, key, factory=dict):
+        """returns the product stored with the key. If there is no such product, a new product is created with factory and stored."""
+        with self._lock:
+            k, product = self._products.get(name, (None, None))
+            if k != key or product is None:
+                product = factory()
+                self._products[name] = (key, product)
+            return product
+
+    def available(self, name):
+        """returns size in bytes that a product can use. Other products share LAYER_STORE_SIZE with it."""
+        with self._lock:
+            used = sum(getattr(product, "size", 0) for n, (k, product) in self._products.items() if n != name)
+        return LAYER_STORE_SIZE - used
+
+    def clear(self, *args):
+        with self._lock:
+            self._products.clear()
+
+    def dataChanged(self):
+        self.dataModified = True
+        self.clear()
+
+    def watch(self, mapLayer):
+        """discard all products when data of the map layer change"""
+        if mapLayer is None or mapLayer is self._mapLayer:
+            return
+
+        # the slot is called directly because layers can be built in a worker thread without event loop
+        mapLayer.dataChanged.connect(self.dataChanged, Qt.ConnectionType.DirectConnection)
+        self._mapLayer = mapLayer
+        self.clear()
+
+
+class FeatureStore:
+
+    """collects features that are read from a layer. They are not stored if their total size exceeds the limit."""
+
+    def __init__(self, maxSize):
+        self.features = []
+        self.size = 0
+        self.maxSize = maxSize
+        self.overflow = (maxSize <= 0)
+
+    def add(self, feature, geometry):
+        if self.overflow:
+            return
+
+        g = geometry.constGet()
+        self.size += 256 + 32 * len(feature.attributes()) + 48 * (g.nCoordinates() if g else 0)     # both feature and geometry have vertices
+        if self.size > self.maxSize:
+            self.features = []
+            self.size = 0
+            self.overflow = True
+            return
+
+        self.features.append((feature, geometry))
+
+
+class GeometryStore:
+
+    """built geometries of features (feature id -> geometry). They are not stored beyond the size limit."""
+
+    def __init__(self, maxSize):
+        self.geometries = {}
+        self.size = 0
+        self.maxSize = maxSize
+
+    def get(self, fid):
+        return self.geometries.get(fid)
+
+    def add(self, fid, geometry):
+        size = objectSize(geometry)
+        if self.size + size > self.maxSize:
+            return
+
+        self.geometries[fid] = geometry
+        self.size += size
+
+
+def objectSize(obj):
+    """returns rough memory size of a built geometry (dicts and lists of numbers) in bytes"""
+    if isinstance(obj, dict):
+        return 64 + sum(objectSize(v) for v in obj.values())
+
+    if isinstance(obj, (list, tuple)):
+        if obj and isinstance(obj[0], (dict, list, tuple, numpy.ndarray)):
+            return 64 + sum(objectSize(v) for v in obj)
+        return 64 + 32 * len(obj)
+
+    if isinstance(obj, numpy.ndarray):
+        return 64 + obj.nbytes
+
+    return 32
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+
+from qgis.PyQt.QtGui import QImage, QPainter
+from qgis.core import QgsMapLayer, QgsMapRendererCustomPainterJob, QgsMapRendererParallelJob, QgsMapSettings
+
+from ...conf import RENDER_WORKERS
+
+
+class MapRenderQueue:
+
+    """renders map images with QgsMapRendererParallelJob, up to maxJobs images at a time.
+
+    Jobs are started in the thread that calls start(), since layer renderers are prepared in the thread,
+    and they are collected when they emit finished signal. The signal is delivered while the thread
+    processes events or waits for a result with result()."""
+
+    def __init__(self, maxJobs=RENDER_WORKERS):
+        self.maxJobs = max(1, maxJobs)
+        self.running = {}           # job -> future
+        self.queued = deque()       # (map settings, future)
+        self._finished = []         # finished jobs. deleted later, not in their signal handler
+
+    def start(self, settings):
+        """settings: QgsMapSettings
+           returns a Future of the image. It can be canceled until rendering starts"""
+        future = Future()
+        self.queued.append((settings, future))
+        self._startJobs()
+        return future
+
+    def result(self, future):
+        """waits for a Future returned by start() and returns the image"""
+        while not future.done():
+            if self.running:
+                # the oldest job emits finished signal in this call
+                next(iter(self.running)).waitForFinished()
+            else:
+                self._startJobs()
+
+        self._finished.clear()
+        return future.result()
+
+    def cancel(self):
+        """cancels queued jobs. Running jobs are finished"""
+        for _, future in self.queued:
+            future.cancel()
+        self.queued.clear()
+
+    def _startJobs(self):
+        while self.queued and len(self.running) < self.maxJobs:
+            settings, future = self.queued.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            if any(layer and layer.type() == QgsMapLayer.PluginLayer for layer in settings.layers()):
+                try:
+                    future.set_result(renderSynchronously(settings))
+                except Exception as e:
+                    future.set_exception(e)
+                continue
+
+            # render layers in parallel
+            settings.setFlag(QgsMapSettings.Antialiasing, True)
+            job = QgsMapRendererParallelJob(settings)
+            job.finished.connect(partial(self._jobFinished, job))
+            self.running[job] = future
+            job.start()
+
+    def _jobFinished(self, job):
+        future = self.running.pop(job, None)
+        if future is None:
+            return
+
+        self._finished.append(job)
+        future.set_result(job.renderedImage())
+        self._startJobs()
+
+
+def renderSynchronously(settings):
+    """renders a map image with QgsMapRendererCustomPainterJob in the calling thread"""
+    size = settings.outputSize()
+    image = QImage(size.width(), size.height(), QImage.Format.Format_ARGB32_Premultiplied)
+    painter = QPainter()
+    painter.begin(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+    # use this method so that TileLayerPlugin layer is rendered correctly
+    job = QgsMapRendererCustomPainterJob(settings, painter)
+    job.renderSynchronously()
+    painter.end()
+    return image
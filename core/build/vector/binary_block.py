@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Binary feature block format (.q3db)
+
+A file consists of:
+    magic "Q3DB" (4 bytes)
+    format version (uint32)
+    header length in bytes (uint32)
+    header - block object in UTF-8 JSON, padded with spaces to a multiple of 4 bytes
+    Float32 section
+    Uint32 section
+All numbers are little-endian.
+
+In the header, flat numeric arrays (vertices, indices, etc.) are replaced with
+{"@f32": [offset, length]} or {"@u32": [offset, length]} that refer to elements
+of a section, and attribute values of features are moved into a columnar side
+table "attrs" (one list per field).
+
+Coordinates in the geometry of each feature, including nested per-vertex lists
+such as point and line coordinates, are flattened into a run of elements in the
+Float32 section. "coords" in the header refers to the offset table of the runs,
+a pair of offset and length per feature in the Uint32 section. A coordinate
+array is replaced with {"@coords": [start, shape]}, where start is relative to
+the run of the feature and shape describes the nesting of the array:
+    n                       - a flat array of n numbers
+    [shape, ...]            - an array of arrays with the shapes
+    {"n": n, "each": shape} - n arrays with the same shape
+
+Q3D.Utils.decodeBinaryBlock() restores the block object.
+"""
+
+import itertools
+import json
+import struct
+import numpy
+
+MAGIC = b"Q3DB"
+VERSION = 2
+MIN_ARRAY_LENGTH = 16       # shorter arrays are left in the header, and shorter coordinate arrays are decoded into plain arrays in JS
+UINT32_MAX = 0xFFFFFFFF
+
+
+def encode(block, default=None):
+    """returns a block object encoded in the binary block format as bytes.
+       default: function passed to json.dumps() for objects that can't be serialized"""
+    return BinaryBlockEncoder().encode(block, default)
+
+
+def decode(data):
+    """returns a block object decoded from bytes in the binary block format.
+       Numeric arrays are restored as lists. Same as Q3D.Utils.decodeBinaryBlock()"""
+    if data[:4] != MAGIC:
+        raise ValueError("Not a binary block")
+
+    version, headerLength = struct.unpack_from("<II", data, 4)
+    if version != VERSION:
+        raise ValueError("Unsupported binary block version: {}".format(version))
+
+    block = json.loads(data[12:12 + headerLength].decode("utf-8"))
+
+    offset = 12 + headerLength
+    sections = block.pop("sections")
+    f32 = numpy.frombuffer(data, dtype="<f4", count=sections["f32"], offset=offset)
+    u32 = numpy.frombuffer(data, dtype="<u4", count=sections["u32"], offset=offset + 4 * sections["f32"])
+
+    def unflatten(shape, pos):
+        """returns a tuple of a nested list of coordinates from pos and the next position"""
+        if isinstance(shape, int):
+            return f32[pos:pos + shape].tolist(), pos + shape
+
+        a = []
+        for s in ([shape["each"]] * shape["n"] if isinstance(shape, dict) else shape):
+            v, pos = unflatten(s, pos)
+            a.append(v)
+        return a, pos
+
+    def resolve(obj, base=0):
+        """base: offset of coordinate run of current feature"""
+        if isinstance(obj, list):
+            return [resolve(v, base) for v in obj]
+
+        if isinstance(obj, dict):
+            ref = obj.get("@f32")
+            if ref is not None:
+                return f32[ref[0]:ref[0] + ref[1]].tolist()
+
+            ref = obj.get("@u32")
+            if ref is not None:
+                return u32[ref[0]:ref[0] + ref[1]].tolist()
+
+            ref = obj.get("@coords")
+            if ref is not None:
+                return unflatten(ref[1], base + ref[0])[0]
+
+            return {k: resolve(v, base) for k, v in obj.items()}
+
+        return obj
+
+    offsets = resolve(block.pop("coords"))
+    block["features"] = [resolve(f, offsets[2 * i]) for i, f in enumerate(block["features"])]
+
+    # attribute side table
+    attrs = block.pop("attrs", None)
+    if attrs is not None:
+        for i, f in enumerate(block["features"]):
+            f["prop"] = [values[i] for values in attrs]
+
+    return block
+
+
+class BinaryBlockEncoder:
+
+    def __init__(self):
+        self.f32 = []
+        self.u32 = []
+        self.f32Length = self.u32Length = 0
+        self.offsets = []       # offset and length of coordinate run of each feature
+
+    def encode(self, block, default=None):
+        block = dict(block)
+        feats = block.get("features", [])
+
+        # attribute side table
+        if feats and all("prop" in f for f in feats):
+            fieldCount = len(feats[0]["prop"])
+            if all(len(f["prop"]) == fieldCount for f in feats):
+                block["attrs"] = [[f["prop"][i] for f in feats] for i in range(fieldCount)]
+                feats = [{k: v for k, v in f.items() if k != "prop"} for f in feats]
+
+        block["features"] = [self.packFeature(f) for f in feats]
+        block["coords"] = self.append("u32", self.offsets)
+        block["sections"] = {"f32": self.f32Length, "u32": self.u32Length}
+
+        header = json.dumps(block, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+        header += b" " * (-len(header) % 4)
+
+        f32 = numpy.fromiter(itertools.chain.from_iterable(self.f32), dtype="<f4", count=self.f32Length)
+        u32 = numpy.fromiter(itertools.chain.from_iterable(self.u32), dtype="<u4", count=self.u32Length)
+
+        return b"".join([MAGIC, struct.pack("<II", VERSION, len(header)), header, f32.tobytes(), u32.tobytes()])
+
+    def append(self, kind, values):
+        """appends values to a section and returns a reference to them"""
+        if kind == "u32":
+            self.u32.append(values)
+            ref = {"@u32": [self.u32Length, len(values)]}
+            self.u32Length += len(values)
+        else:
+            self.f32.append(values)
+            ref = {"@f32": [self.f32Length, len(values)]}
+            self.f32Length += len(values)
+        return ref
+
+    def packFeature(self, feat):
+        """packs a feature. Coordinates in its geometry are flattened into a run in the Float32 section"""
+        coords = []
+        f = {k: self.packCoords(v, coords) if k == "geom" else self.pack(v) for k, v in feat.items()}
+
+        self.offsets.extend([self.f32Length, len(coords)])
+        self.append("f32", coords)
+        return f
+
+    def packCoords(self, obj, coords):
+        """replaces (nested) lists of coordinates in obj with references to elements of coords"""
+        if isinstance(obj, dict):
+            return {k: self.packCoords(v, coords) for k, v in obj.items()}
+
+        if isinstance(obj, (list, tuple)):
+            values = []
+            shape = self.flatten(obj, values)
+            if shape is None:
+                return [self.packCoords(v, coords) for v in obj]
+
+            if self.arrayKind(values) == "f32":
+                ref = {"@coords": [len(coords), shape]}
+                coords.extend(values)
+                return ref
+
+            # e.g. indices
+            return self.pack(obj)
+
+        return obj
+
+    @classmethod
+    def flatten(cls, obj, values):
+        """appends numbers in a (nested) list to values and returns the shape of the list.
+           None is returned if the list has an item that is neither a number nor a list."""
+        if all(type(v) in (int, float) for v in obj):
+            values.extend(obj)
+            return len(obj)
+
+        shapes = []
+        for v in obj:
+            if not isinstance(v, (list, tuple)):
+                return None
+
+            shape = cls.flatten(v, values)
+            if shape is None:
+                return None
+            shapes.append(shape)
+
+        if len(shapes) > 1 and all(shape == shapes[0] for shape in shapes):
+            return {"n": len(shapes), "each": shapes[0]}
+        return shapes
+
+    def pack(self, obj):
+        """replaces flat numeric lists in obj with references to the sections"""
+        if isinstance(obj, dict):
+            return {k: self.pack(v) for k, v in obj.items()}
+
+        if isinstance(obj, (list, tuple)):
+            if len(obj) >= MIN_ARRAY_LENGTH:
+                kind = self.arrayKind(obj)
+                if kind:
+                    return self.append(kind, obj)
+
+            return [self.pack(v) for v in obj]
+
+        return obj
+
+    @staticmethod
+    def arrayKind(values):
+        """returns "u32" if all values are non-negative integers, "f32" if all values are numbers, otherwise None"""
+        isInt = True
+        for v in values:
+            t = type(v)
+            if t is int:
+                if v < 0 or v > UINT32_MAX:
+                    isInt = False
+            elif t is float:
+                isInt = False
+            else:
+                return None
+
+        return "u32" if isInt else "f32"
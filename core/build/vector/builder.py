@@ -8,12 +8,13 @@ from qgis.core import QgsCoordinateTransform, QgsFeatureRequest
 from .feature_block_builder import FeatureBlockBuilder
 from .layer import VectorLayer
 from .object import ObjectType
-from ..layerbuilderbase import LayerBuilderBase
+from ..layerbuilderbase import LayerBuilderBase, buildTraced
 from ..datamanager import MaterialManager, ModelManager
+from ..layerstore import GeometryStore, LayerChange, propertiesSignature, sceneSignature
 from ...const import LayerType
 from ...geometry import VectorGeometry
 from ....conf import DEF_SETS, FEATURES_PER_BLOCK, DEBUG_MODE
-from ....utils import css_color, int_color, logMessage, parseInt
+from ....utils import css_color, int_color, logMessage, parseInt, trace
 
 
 class VectorLayerBuilder(LayerBuilderBase):
@@ -28,6 +29,9 @@ class VectorLayerBuilder(LayerBuilderBase):
         LayerBuilderBase.__init__(self, settings, layer, imageManager, pathRoot, urlRoot, progress, log)
 
         self.materialManager = MaterialManager(imageManager, settings.materialType())
+        if settings.isPreview and settings.binaryTransport:
+            self.materialManager.artifactStore = settings.artifactStore
+            self.materialManager.artifactOwner = layer.jsLayerId
         self.modelManager = ModelManager(settings)
 
         self.clipExtent = None
@@ -44,50 +48,39 @@ class VectorLayerBuilder(LayerBuilderBase):
         if self.layer.mapLayer is None or self.vlayer.ot is None:
             return
 
-        vlayer = self.vlayer
-        objType = type(vlayer.ot)
-        be = self.settings.baseExtent()
-        p = self.layer.properties
+        if not (self.layer.opt.changes & ~LayerChange.STYLE):
+            # update layer properties and labels only. objects in the view are kept
+            return {
+                "type": "layer",
+                "id": self.layer.jsLayerId,
+                "properties": self.layerProperties(),
+                "relabel": True
+            }
 
-        # feature request
-        request = QgsFeatureRequest()
-        if p.get("radioButton_IntersectingFeatures", False):
-            request.setFilterRect(vlayer.transform.transformBoundingBox(be.boundingBox(),
-                                                                        QgsCoordinateTransform.ReverseTransform))
+        parts = self.updatedParts()
+        if parts is not None:
+            # objects in the view are kept. parts of the features are updated with following blocks (see subBuilders())
+            return {
+                "type": "layer",
+                "id": self.layer.jsLayerId,
+                "properties": self.layerProperties(),
+                "update": parts
+            }
 
-            # geometry for clipping
-            if p.get("checkBox_Clip") and objType != ObjectType.Polygon:
-                self.clipExtent = be.clone().scale(0.9999)    # clip to slightly smaller extent than map canvas extent
-        self.features = []
+        objType = type(self.vlayer.ot)
+        p = self.layer.properties
         data = {}
 
-        # materials/models
-        if objType == ObjectType.ModelFile:
-            for feat in vlayer.features(request):
-                feat.model = vlayer.ot.model(feat)
-                self.features.append(feat)
-
-            data["models"] = self.modelManager.build(self.pathRoot is not None,
-                                                     base64=self.settings.jsonSerializable)
-
-            self.log("This layer has reference to 3D model file(s). If there are relevant files, you need to copy them to data directory for this export.", warning=True)
-        else:
-            for feat in vlayer.features(request):
-                feat.material = vlayer.ot.material(feat)
-                self.features.append(feat)
-
-            data["materials"] = self.materialManager.buildAll(self.pathRoot, self.urlRoot,
-                                                              base64=self.settings.jsonSerializable)
-
         if build_blocks:
             self._startBuildBlocks(cancelSignal)
 
+            # features are read, built into blocks and released block by block
             nf = 0
             blocks = []
-            for builder in self.subBuilders():
+            for builder in self.subBuilders(sendMaterials=False):
                 if self.canceled:
                     break
-                b = builder.build()
+                b = buildTraced(builder)
                 nf += b["featureCount"]
 
                 blocks.append(b)
@@ -102,6 +95,22 @@ class VectorLayerBuilder(LayerBuilderBase):
 
             data["blocks"] = blocks
 
+        # materials/models. In preview, they are sent with blocks (see subBuilders())
+        if objType == ObjectType.ModelFile:
+            data["models"] = self.modelManager.build(self.pathRoot is not None,
+                                                     base64=self.settings.jsonSerializable) if build_blocks else []
+
+            self.log("This layer has reference to 3D model file(s). If there are relevant files, you need to copy them to data directory for this export.", warning=True)
+        else:
+            data["materials"] = self.materialManager.buildAll(self.pathRoot, self.urlRoot,
+                                                              base64=self.settings.jsonSerializable) if build_blocks else []
+
+        if build_blocks:
+            if objType == ObjectType.ModelFile:
+                self.log("Models: " + self.modelManager.statsString())
+            else:
+                self.log("Materials: " + self.materialManager.statsString())
+
         d = {
             "type": "layer",
             "id": self.layer.jsLayerId,
@@ -117,6 +126,46 @@ class VectorLayerBuilder(LayerBuilderBase):
 
         return d
 
+    def dependsOnExtent(self):
+        if self.layer.properties.get("radioButton_IntersectingFeatures", False):
+            return True
+
+        # overlay polygons are split with the DEM grid, which is within base extent
+        return type(self.vlayer.ot) is ObjectType.Overlay and self.vlayer.isHeightRelativeToDEM()
+
+    def updatedParts(self):
+        """returns names of feature data to update if features in the preview can be updated without rebuilding
+           geometries (i.e. only materials, labels and/or attributes have been changed). Otherwise, returns None."""
+        changes = self.layer.opt.changes
+        if not self.settings.isPreview or changes & LayerChange.GEOMETRY:
+            return None
+
+        parts = []
+        if changes & LayerChange.MATERIAL:
+            parts.append("mtl")
+        if changes & LayerChange.LABEL:
+            parts.append("lbl")
+        if changes & LayerChange.ATTRIBUTE:
+            parts.append("prop")
+        return parts or None
+
+    def featureRequest(self):
+        """returns a feature request, and sets up clip extent"""
+        be = self.settings.baseExtent()
+        p = self.layer.properties
+
+        request = QgsFeatureRequest()
+        self.clipExtent = None
+        if p.get("radioButton_IntersectingFeatures", False):
+            request.setFilterRect(self.vlayer.transform.transformBoundingBox(be.boundingBox(),
+                                                                             QgsCoordinateTransform.ReverseTransform))
+
+            # geometry for clipping
+            if p.get("checkBox_Clip") and type(self.vlayer.ot) is not ObjectType.Polygon:
+                self.clipExtent = be.clone().scale(0.9999)    # clip to slightly smaller extent than map canvas extent
+
+        return request
+
     def layerProperties(self):
         p = LayerBuilderBase.layerProperties(self)
         p["type"] = self.type2str.get(self.layer.type)
@@ -151,13 +200,18 @@ class VectorLayerBuilder(LayerBuilderBase):
         # p.update(self.vlayer.ot.layerProperties(self.settings, self))
         return p
 
-    def subBuilders(self):
-        if self.vlayer.ot is None:
+    def subBuilders(self, sendMaterials=True):
+        """yields feature block builders. Features are read while blocks are being built.
+           sendMaterials: if True, each block has materials/models newly used by its features"""
+        if self.layer.mapLayer is None or self.vlayer.ot is None:
+            return
+
+        if not (self.layer.opt.changes & ~LayerChange.STYLE):
             return
 
         objType = type(self.vlayer.ot)
-        z_func = lambda x, y: 0
-        grid = None
+        parts = self.updatedParts()
+        demProvider = grid = None
 
         p = self.vlayer.properties
         if p.get("radioButton_zValue"):
@@ -167,7 +221,7 @@ class VectorLayerBuilder(LayerBuilderBase):
         else:
             useZM = VectorGeometry.NotUseZM
 
-        if self.vlayer.isHeightRelativeToDEM():
+        if self.vlayer.isHeightRelativeToDEM() and parts is None:
             demLayerId = p.get("comboBox_altitudeMode")
             demProvider = self.settings.demProviderByLayerId(demLayerId)
 
@@ -177,19 +231,32 @@ class VectorLayerBuilder(LayerBuilderBase):
 
                 # prepare a grid geometry
                 grid = demProvider.readAsGridGeometry(dem_seg.width() + 1, dem_seg.height() + 1, self.settings.baseExtent())
+                demProvider = None
 
-            else:
-                z_func = demProvider.readValue      # readValue(x, y)
+            elif hasattr(demProvider, "prefetch"):
+                # e.g. fetch elevation tiles of the base extent at once rather than tile by tile
+                demProvider.prefetch(self.settings.baseExtent())
+
+        geometries = None
+        if self.store and parts is None:
+            maxSize = self.store.available("geometries")
+            geometries = self.store.product("geometries", self.geometryStoreKey(), lambda: GeometryStore(maxSize))
 
         builder = FeatureBlockBuilder(self.settings, self.vlayer, self.layer.jsLayerId, self.pathRoot, self.urlRoot,
-                                      useZM, z_func, grid)
+                                      useZM, demProvider, grid, geometries, parts)
 
         one_per_block = (objType == ObjectType.Overlay
                          and self.vlayer.isHeightRelativeToDEM()
                          and self.settings.isPreview)
-        bIndex = startFIdx = 0
+
+        isModel = (objType == ObjectType.ModelFile)
+        bIndex = startFIdx = mIndex = 0
         feats = []
-        for f in self.features or []:
+        request = self.featureRequest()
+
+        # features are read while blocks are built, so the span is ended before each block is yielded
+        fetch = trace.span("vector.fetch", "vector").begin()
+        for f in self.vlayer.features(request, self.store):
             if self.clipExtent and self.layer.type != LayerType.POINT:
                 if f.clipGeometry(self.clipExtent) is None:
                     continue
@@ -200,21 +267,60 @@ class VectorLayerBuilder(LayerBuilderBase):
                     logMessage("empty/null geometry skipped")
                 continue
 
+            if isModel:
+                f.model = self.vlayer.ot.model(f)
+            elif parts is None or "mtl" in parts:
+                f.material = self.vlayer.ot.material(f)
+
             feats.append(f)
 
             if len(feats) == FEATURES_PER_BLOCK or one_per_block:
+                fetch.set(features=len(feats))
+                fetch.end()
+
                 b = builder.clone()
                 b.setBlockIndex(bIndex)
                 b.setFeatures(feats)
                 b.startFIdx = startFIdx
+                if sendMaterials:
+                    mIndex = self._setNewMaterials(b, mIndex)
                 yield b
 
+                fetch = trace.span("vector.fetch", "vector").begin()
+
                 bIndex += 1
                 startFIdx += len(feats)
                 feats = []
 
+        fetch.set(features=len(feats))
+        fetch.end()
+
         if len(feats) or bIndex == 0:
             builder.setBlockIndex(bIndex)
             builder.setFeatures(feats)
             builder.startFIdx = startFIdx
+            if sendMaterials:
+                self._setNewMaterials(builder, mIndex)
             yield builder
+
+    def geometryStoreKey(self):
+        """returns a key of built geometries, which changes when any setting that affects feature geometries changes"""
+        items = [sceneSignature(self.settings), propertiesSignature(self.layer.type, self.properties)]
+
+        if self.vlayer.isHeightRelativeToDEM():
+            demLayer = self.settings.getLayer(self.properties.get("comboBox_altitudeMode"))
+            if demLayer:
+                items.append(propertiesSignature(demLayer.type, demLayer.properties))
+
+        return "\n".join(items)
+
+    def _setNewMaterials(self, blockBuilder, start):
+        """set materials/models added since start index to a block builder. returns next start index"""
+        if type(self.vlayer.ot) is ObjectType.ModelFile:
+            blockBuilder.models = self.modelManager.build(self.pathRoot is not None,
+                                                          base64=self.settings.jsonSerializable, start=start)
+            return self.modelManager.count()
+
+        blockBuilder.materials = self.materialManager.buildAll(self.pathRoot, self.urlRoot,
+                                                               base64=self.settings.jsonSerializable, start=start)
+        return self.materialManager.count()
@@ -16,7 +16,7 @@ LayerType2GeomClass = {
 
 class Feature:
 
-    def __init__(self, vlayer, geom, props, attrs=None):
+    def __init__(self, vlayer, geom, props, attrs=None, fid=None):
 
         self.layerType = vlayer.type
         self.ot = vlayer.ot
@@ -24,6 +24,7 @@ class Feature:
         self.geom = geom            # an instance of QgsGeometry
         self.props = props          # a dict
         self.attributes = attrs     # a list or None
+        self.fid = fid              # feature id
 
         self.material = self.model = None
 
@@ -39,8 +40,9 @@ class Feature:
         return self.geom
 
     def geometry(self, z_func, mapTo3d, useZM=VectorGeometry.NotUseZM, baseExtent=None, grid=None):
+        """z_func: a function that takes x and y coordinate sequences and returns a NumPy array of z values"""
         alt = self.prop(PID.ALT, 0)
-        zf = lambda x, y: z_func(x, y) + alt
+        zf = (lambda xs, ys: z_func(xs, ys) + alt) if alt else z_func
 
         transform_func = mapTo3d.transform
 
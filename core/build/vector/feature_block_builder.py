@@ -3,12 +3,15 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import json
+import numpy
 from qgis.PyQt.QtCore import QVariant
+from qgis.core import QgsRectangle
 
+from . import binary_block
 from ...const import PropertyID as PID
 from ...geometry import VectorGeometry
 from ....conf import DEBUG_MODE
-from ....utils import logMessage, parseInt
+from ....utils import logMessage, parseInt, trace
 
 
 def json_default(o):
@@ -17,26 +20,39 @@ def json_default(o):
     raise TypeError(repr(o) + " is not JSON serializable")
 
 
+def encodeBlock(data):
+    """encodes block data in binary block format"""
+    with trace.span("serialize", "vector") as s:
+        b = binary_block.encode(data, default=json_default)
+        s.set(bytes=len(b))
+    return b
+
+
 class FeatureBlockBuilder:
 
-    def __init__(self, settings, vlayer, jsLayerId, pathRoot=None, urlRoot=None, useZM=VectorGeometry.NotUseZM, z_func=None, grid=None):
+    def __init__(self, settings, vlayer, jsLayerId, pathRoot=None, urlRoot=None, useZM=VectorGeometry.NotUseZM, demProvider=None, grid=None, geometries=None, parts=None):
+        """geometries: a GeometryStore to reuse built geometries across builds, or None
+           parts: names of feature data to update ("mtl", "lbl" and/or "prop"). If None, features are fully built"""
         self.settings = settings
         self.vlayer = vlayer
         self.jsLayerId = jsLayerId
         self.pathRoot = pathRoot
         self.urlRoot = urlRoot
         self.useZM = useZM
-        self.z_func = z_func
+        self.demProvider = demProvider
         self.grid = grid
+        self.geometries = geometries
+        self.parts = parts
 
         self.blockIndex = None
         self.startFIdx = None
         self.features = []
+        self.materials = self.models = None     # materials/models newly used in this block
 
     def clone(self):
         return FeatureBlockBuilder(self.settings, self.vlayer, self.jsLayerId,
                                    self.pathRoot, self.urlRoot,
-                                   self.useZM, self.z_func, self.grid)
+                                   self.useZM, self.demProvider, self.grid, self.geometries, self.parts)
 
     def setBlockIndex(self, index):
         self.blockIndex = index
@@ -48,26 +64,41 @@ class FeatureBlockBuilder:
         be = self.settings.baseExtent()
         obj_geom_func = self.vlayer.ot.geometry
         mapTo3d = self.settings.mapTo3d()
+        z_func = None
+        geoms = self.geometries
+        parts = self.parts
+        full = parts is None
 
         feats = []
         for f in self.features:
             d = {}
-            d["geom"] = obj_geom_func(f, f.geometry(self.z_func, mapTo3d, self.useZM, be, self.grid))
+            if full:
+                g = geoms.get(f.fid) if geoms is not None else None
+                if g is None:
+                    if z_func is None:
+                        z_func = self.zFunc()
+
+                    g = obj_geom_func(f, f.geometry(z_func, mapTo3d, self.useZM, be, self.grid))
+                    if geoms is not None and f.fid is not None:
+                        geoms.add(f.fid, g)
+
+                d["geom"] = g
 
-            if f.material is not None:
-                d["mtl"] = f.material
-            elif f.model is not None:
-                d["model"] = f.model
+            if full or "mtl" in parts:
+                if f.material is not None:
+                    d["mtl"] = f.material
+                elif f.model is not None:
+                    d["model"] = f.model
 
-            if f.attributes is not None:
+            if f.attributes is not None and (full or "prop" in parts):
                 d["prop"] = f.attributes
 
             text = f.prop(PID.LBLTXT)
-            if text is not None and text != "":
+            if text is not None and text != "" and (full or "lbl" in parts):
                 d["lbl"] = str(text)
                 d["lh"] = f.prop(PID.LBLH)
 
-            if f.hasProp(PID.DLY):
+            if full and f.hasProp(PID.DLY):
                 d["anim"] = {
                     "delay": parseInt(f.prop(PID.DLY)),
                     "duration": parseInt(f.prop(PID.DUR))
@@ -86,8 +117,40 @@ class FeatureBlockBuilder:
             "startIndex": self.startFIdx
         }
 
+        if not full:
+            # features in the view are updated with the data
+            data["update"] = parts
+
+        if self.materials:
+            data["materials"] = self.materials
+
+        if self.models:
+            data["models"] = self.models
+
+        if self.settings.isPreview and self.settings.binaryTransport:
+            # features are encoded in binary block format, which the page fetches by URL. materials and models are sent in JSON
+            d = {"type": "block",
+                 "layer": self.jsLayerId,
+                 "block": self.blockIndex,
+                 "featureCount": len(feats)}
+
+            for key in ["materials", "models"]:
+                if key in data:
+                    d[key] = data.pop(key)
+
+            d["url"] = self.settings.artifactStore.put(encodeBlock(data), owner=self.jsLayerId)
+            d["binary"] = True
+            return d
+
         if self.pathRoot is not None:
-            with open(self.pathRoot + "{0}.json".format(self.blockIndex), "w", encoding="utf-8") as f:
+            if self.settings.option("binaryBlocks"):
+                with open(self.pathRoot + "{0}.q3db".format(self.blockIndex), "wb") as f:
+                    f.write(encodeBlock(data))
+
+                url = self.urlRoot + "{0}.q3db".format(self.blockIndex)
+                return {"url": url, "featureCount": len(feats), "binary": True}
+
+            with open(self.pathRoot + "{0}.json".format(self.blockIndex), "w", encoding="utf-8") as f, trace.span("serialize", "vector"):
                 json.dump(data, f, ensure_ascii=False, indent=2 if DEBUG_MODE else None, default=json_default)
 
             url = self.urlRoot + "{0}.json".format(self.blockIndex)
@@ -95,3 +158,15 @@ class FeatureBlockBuilder:
 
         else:
             return data
+
+    def zFunc(self):
+        """returns a function that takes x and y coordinate sequences and returns a NumPy array of z values.
+           If heights are relative to a DEM, the DEM values are read into a window that covers all features in this block."""
+        if self.demProvider is None or not self.features:
+            return lambda xs, ys: numpy.zeros(len(xs))
+
+        rect = QgsRectangle(self.features[0].geom.boundingBox())
+        for f in self.features[1:]:
+            rect.combineExtentWith(f.geom.boundingBox())
+
+        return self.demProvider.readWindow(rect).valuesAt
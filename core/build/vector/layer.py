@@ -8,6 +8,7 @@ from qgis.core import (QgsCoordinateTransform, QgsExpression, QgsFeatureRequest,
 
 from .feature import Feature
 from .object import ObjectType
+from ..layerstore import FeatureStore
 from ...const import LayerType, PropertyID as PID
 from ....conf import DEF_SETS
 from ....gui.propwidget import PropertyWidget, ColorWidgetFunc, OpacityWidgetFunc, ColorTextureWidgetFunc
@@ -75,7 +76,8 @@ class VectorLayer:
                     PID.DUR: QgsExpression(str(kf.get("duration", DEF_SETS.ANM_DURATION)))
                 }
 
-    def features(self, request=None):
+    def features(self, request=None, store=None):
+        """store: LayerStore to reuse features read in the previous build"""
         mapTo3d = self.settings.mapTo3d()
         be = self.settings.baseExtent()
         beGeom = be.geometry()
@@ -87,20 +89,7 @@ class VectorLayer:
         self.renderer = self.mapLayer.renderer().clone()
         self.renderer.startRender(self.renderContext, self.mapLayer.fields())
 
-        for f in self.mapLayer.getFeatures(request or QgsFeatureRequest()):
-            # geometry
-            geom = f.geometry()
-            if geom is None:
-                logMessage("[{}] Null geometry skipped.".format(self.name))
-                continue
-
-            geom = QgsGeometry(geom)
-
-            # coordinate transformation - layer crs to project crs
-            if geom.transform(self.transform) != 0:
-                logMessage("[{}] Failed to transform a geometry.".format(self.name), warning=True)
-                continue
-
+        for f, geom in self.readFeatures(request or QgsFeatureRequest(), store):
             if rotation and self.onlyIntersecting:
                 # if map is rotated, check whether geometry intersects with the base extent
                 if not beGeom.intersects(geom):
@@ -124,10 +113,50 @@ class VectorLayer:
             if self.hasLabel:
                 props[PID.LBLH] *= mapTo3d.zScale
 
-            yield Feature(self, geom, props, attrs)
+            yield Feature(self, geom, props, attrs, f.id())
 
         self.renderer.stopRender(self.renderContext)
 
+    def readFeatures(self, request, store=None):
+        """yields tuples of a feature and its geometry transformed to the project CRS.
+           If a store is given, the features are kept in it unless they are too large."""
+        key = fs = None
+        if store:
+            key = (request.filterRect().toString(), self.mapLayer.crs().toWkt(), self.settings.crs.toWkt(), self.mapLayer.subsetString())
+            fs = store.get("features", key)
+            if fs is not None:
+                for f, geom in fs.features:
+                    yield f, QgsGeometry(geom)      # geometry may be modified by caller
+                return
+
+            fs = FeatureStore(store.available("features"))
+            store.dataModified = False
+
+        # parallel exporters read features from a snapshot of the layer created in the main thread
+        source = self.settings.featureSource(self.mapLayer.id()) or self.mapLayer
+
+        for f in source.getFeatures(request):
+            # geometry
+            geom = f.geometry()
+            if geom is None:
+                logMessage("[{}] Null geometry skipped.".format(self.name))
+                continue
+
+            geom = QgsGeometry(geom)
+
+            # coordinate transformation - layer crs to project crs
+            if geom.transform(self.transform) != 0:
+                logMessage("[{}] Failed to transform a geometry.".format(self.name), warning=True)
+                continue
+
+            if fs is not None:
+                fs.add(f, QgsGeometry(geom))
+
+            yield f, geom
+
+        if fs is not None and not fs.overflow:
+            store.put("features", key, fs)
+
     def evaluateProperties(self, feat, pids):
         d = {}
 
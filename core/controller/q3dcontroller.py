@@ -8,10 +8,13 @@ from qgis.PyQt.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot, qDebug
 from qgis.core import QgsApplication
 
 from ..build.builder import ThreeJSBuilder
+from ..build.layerbuilderbase import BlockBuildQueue
+from ..build.layerstore import LayerChange, classifyChanges
 from ..const import LayerType, Script
 from ..exportsettings import ExportSettings, Layer
-from ...conf import DEBUG_MODE
-from ...utils import hex_color, js_bool, logMessage
+from ..warpcache import warpCache
+from ...conf import DEBUG_MODE, EXTENT_UPDATE_DELAY
+from ...utils import hex_color, js_bool, logMessage, trace
 
 
 class Q3DControllerInterface(QObject):
@@ -113,6 +116,7 @@ class Q3DController(QObject):
     BUILD_SCENE_ALL = 1   # build scene
     BUILD_SCENE = 2       # build scene, but do not update background color, coordinates display mode and so on
     RELOAD_PAGE = 3
+    UPDATE_EXTENT = 4     # update scene for current map canvas extent
 
     def __init__(self, settings=None, thread=None, parent=None):
         super().__init__(parent)
@@ -136,22 +140,34 @@ class Q3DController(QObject):
         self.aborted = False  # layer export aborted
         self.processingLayer = None
         self.mapCanvas = None
+        self.layerOrigins = {}      # layer id -> 3D world origin (x, y) with which objects of the layer in the view were built
 
         self.requestQueue = []
         self.timer = QTimer(self)
         self.timer.setInterval(1)
         self.timer.setSingleShot(True)
 
+        # map canvas extent changes are coalesced while the map is being moved
+        self.extentTimer = QTimer(self)
+        self.extentTimer.setInterval(EXTENT_UPDATE_DELAY)
+        self.extentTimer.setSingleShot(True)
+
         # move to worker thread
         if thread:
             self.moveToThread(thread)
 
         self.timer.timeout.connect(self._processRequests)
+        self.extentTimer.timeout.connect(self.requestUpdateExtent)
 
     def teardown(self):
         self.timer.stop()
         self.timer.timeout.disconnect(self._processRequests)
 
+        self.extentTimer.stop()
+        self.extentTimer.timeout.disconnect(self.requestUpdateExtent)
+
+        self.builder.close()
+
         self.iface.deleteLater()
         self.iface = None
 
@@ -165,13 +181,11 @@ class Q3DController(QObject):
 
     def connectToMapCanvas(self, canvas):
         self.mapCanvas = canvas
-        self.mapCanvas.renderComplete.connect(self._requestBuildScene)
-        # self.mapCanvas.extentsChanged.connect(self.updateExtent)
+        self.mapCanvas.renderComplete.connect(self.mapCanvasRendered)
 
     def disconnectFromMapCanvas(self):
         if self.mapCanvas:
-            self.mapCanvas.renderComplete.disconnect(self._requestBuildScene)
-            # self.mapCanvas.extentsChanged.disconnect(self.updateExtent)
+            self.mapCanvas.renderComplete.disconnect(self.mapCanvasRendered)
             self.mapCanvas = None
 
     def buildScene(self, update_scene_opts=True, build_layers=True, update_extent=True):
@@ -213,6 +227,83 @@ class Q3DController(QObject):
         self.iface.clearStatusMessage()
         return not self.aborted
 
+    def updateExtent(self):
+        """update scene for current map canvas extent. If the extent has been just moved, objects of layers
+           that do not depend on the extent are translated instead of being rebuilt"""
+        if self.processingLayer:
+            logMessage("Previous processing is still in progress. Cannot start to update extent.")
+            return False
+
+        if not self.mapCanvas:
+            return True
+
+        be0 = self.settings.baseExtent()
+        crs0 = self.settings.crs
+        self.settings.setMapSettings(self.mapCanvas.mapSettings())
+        be = self.settings.baseExtent()
+
+        if be0 is None or be is None or self.settings.crs != crs0 or not be.isSameSize(be0):
+            return self.buildScene(update_scene_opts=False, update_extent=False)
+
+        self.aborted = False
+
+        if be.center() == be0.center():
+            # map canvas has been re-rendered with the same extent (e.g. layer style or data has been changed).
+            # update DEM textures and vector layers whose data have been changed
+            for layer in sorted(self.settings.layers(), key=lambda lyr: lyr.type):
+                if not layer.visible:
+                    continue
+
+                if layer.type == LayerType.DEM:
+                    layer = layer.clone()
+                    layer.opt.onlyMaterial = True
+                    layer.opt.changes = LayerChange.MATERIAL
+                else:
+                    store = self.builder.layerStores.get(layer.layerId)
+                    if store is None or not store.dataModified:
+                        continue
+
+                if not self._buildLayer(layer) or self.aborted:
+                    return False
+
+            self.iface.progress()
+            self.iface.clearStatusMessage()
+            return True
+
+        self.iface.sendJSONObject(self.builder.buildScene(False))
+
+        origin = self.settings.mapTo3d().origin
+        layers = []
+        for layer in sorted(self.settings.layers(), key=lambda lyr: lyr.type):
+            if not layer.visible:
+                continue
+
+            o = self.layerOrigins.get(layer.layerId)
+            store = self.builder.layerStores.get(layer.layerId)
+            rebuild = o is None or layer.type in (LayerType.DEM, LayerType.POINTCLOUD) or (store and store.dataModified)
+            if rebuild or self.builder.layerBuilder(layer).dependsOnExtent():
+                layers.append(layer)
+                continue
+
+            # move objects so that they keep their positions on the map
+            dx, dy = (o[0] - origin.x(), o[1] - origin.y())
+            if dx or dy:
+                self.iface.runScript('translateLayer("{}", {}, {})'.format(layer.jsLayerId, dx, dy))
+                self.layerOrigins[layer.layerId] = (origin.x(), origin.y())
+
+        self.iface.runScript('loadStart("LYRS", true)')
+
+        ret = True
+        for layer in layers:
+            if not self._buildLayer(layer) or self.aborted:
+                ret = False
+                break
+
+        self.iface.runScript('loadEnd("LYRS")')
+        self.iface.progress()
+        self.iface.clearStatusMessage()
+        return ret
+
     def buildLayers(self):
         self.aborted = False
         self.iface.runScript('loadStart("LYRS", true)')
@@ -250,6 +341,20 @@ class Q3DController(QObject):
     def _buildLayer(self, layer):
         self.processingLayer = layer
 
+        # artifacts of previous build that the page has not requested yet are no longer needed
+        self.discardArtifacts(layer.jsLayerId)
+
+        if layer.type != LayerType.DEM:
+            store = self.builder.layerStores.get(layer.layerId)
+            if store and store.dataModified:
+                # features in the view are out of date
+                layer.opt.changes = LayerChange.ALL
+
+        # objects of the layer are rebuilt unless their geometries are kept (only materials, labels, attributes
+        # or layer properties are updated)
+        keepObjects = layer.opt.onlyMaterial or not (layer.opt.changes & LayerChange.GEOMETRY)
+        origin = self.layerOrigins.pop(layer.layerId, None)
+
         pmsg = "Building {0}...".format(layer.name)
         self.iface.progress(0, pmsg)
 
@@ -265,46 +370,82 @@ class Q3DController(QObject):
                                         Script.POTREE,
                                         Script.PCLAYER])
 
-        t0 = t4 = time.time()
+        t0 = t3 = time.time()
+        layerSpan = trace.span("layer", name=layer.name).begin()
+        cache_stats = warpCache().stats()
         dlist = []
         i = 0
-        for builder in self.builder.layerBuilders(layer):
+
+        # grid blocks of DEM layer are built in worker threads while textures are rendered. built objects are sent in the original order.
+        queue = BlockBuildQueue(self.builder.executor)
+        builders = self.builder.layerBuilders(layer)
+        while True:
             self.iface.progress(i / (i + 4) * 100, pmsg)
             if self.aborted:
+                queue.cancel()
+                layerSpan.end()
                 logMessage("***** layer processing aborted *****")
                 self.processingLayer = None
                 return False
 
-            t1 = time.time()
-            obj = builder.build()
-            t2 = time.time()
+            builder = next(builders, None)
+            if builder:
+                queue.add(builder)
+                objs = queue.ready()
+            else:
+                objs = queue.results()
 
-            if obj:
-                self.iface.sendJSONObject(obj)
+            t1 = time.time()
+            for obj in objs:
+                if obj:
+                    self.iface.sendJSONObject(obj)
 
             QgsApplication.processEvents()      # NOTE: process events only for the calling thread
             i += 1
 
-            t3 = time.time()
-            dlist.append([t1 - t4, t2 - t1, t3 - t2])
-            t4 = t3
+            t2 = time.time()
+            dlist.append([t1 - t3, t2 - t1])
+            t3 = t2
+
+            if builder is None:
+                break
+
+        layerSpan.end()
 
         if DEBUG_MODE:
-            dlist = "\n".join([" {:.3f} {:.3f} {:.3f}".format(d[0], d[1], d[2]) for d in dlist])
-            qDebug("{0} layer updated: {1:.3f}s\n{2}\n".format(layer.name,
-                                                               time.time() - t0,
-                                                               dlist).encode("utf-8"))
+            dlist = "\n".join([" {:.3f} {:.3f}".format(d[0], d[1]) for d in dlist])
+            qDebug("{0} layer updated: {1:.3f}s\n{2}\n{3}\n".format(layer.name,
+                                                                    time.time() - t0,
+                                                                    dlist,
+                                                                    warpCache().statsString(since=cache_stats)).encode("utf-8"))
+
+        if keepObjects:
+            if origin:
+                self.layerOrigins[layer.layerId] = origin
+        else:
+            o = self.settings.mapTo3d().origin
+            self.layerOrigins[layer.layerId] = (o.x(), o.y())
+
         self.processingLayer = None
         return True
 
     def hideLayer(self, layer):
         """hide layer and remove all objects from the layer"""
+        self.layerOrigins.pop(layer.layerId, None)
+        self.discardArtifacts(layer.jsLayerId)
         self.iface.runScript('hideLayer("{}", true)'.format(layer.jsLayerId))
 
     def hideAllLayers(self):
         """hide all layers and remove all objects from the layers"""
+        self.layerOrigins.clear()
+        self.discardArtifacts()
         self.iface.runScript("hideAllLayers(true)")
 
+    def discardArtifacts(self, jsLayerId=None):
+        """discards artifacts of a layer that the page has not requested. If jsLayerId is None, artifacts of all layers are discarded."""
+        if self.settings.artifactStore:
+            self.settings.artifactStore.discard(jsLayerId)
+
     def processRequests(self):
         self.timer.stop()
         if self.requestQueue:
@@ -327,6 +468,11 @@ class Q3DController(QObject):
                 self.requestQueue.clear()
                 self.iface.runScript("location.reload()")
 
+            elif self.UPDATE_EXTENT in self.requestQueue:
+                # layer update requests are processed after the update
+                self.requestQueue = [i for i in self.requestQueue if i != self.UPDATE_EXTENT]
+                self.updateExtent()
+
             else:
                 item = self.requestQueue.pop(0)
                 if isinstance(item, Layer):
@@ -382,6 +528,16 @@ class Q3DController(QObject):
         else:
             self.processRequests()
 
+    @pyqtSlot()
+    def requestUpdateExtent(self):
+        if self.UPDATE_EXTENT not in self.requestQueue:
+            self.requestQueue.append(self.UPDATE_EXTENT)
+
+        if self.processingLayer:
+            self.abort(clear_queue=False)
+        else:
+            self.processRequests()
+
     @pyqtSlot(Layer)
     def requestBuildLayer(self, layer):
         if DEBUG_MODE:
@@ -391,6 +547,13 @@ class Q3DController(QObject):
         lyr = self.settings.getLayer(layer.layerId)
         if not lyr:
             return
+
+        # kinds of property changes since last request. objects in the view are reused as far as possible
+        if lyr.visible and layer.visible:
+            changes = classifyChanges(layer.type, lyr.properties, layer.properties)
+        else:
+            changes = LayerChange.ALL
+
         layer.copyTo(lyr)
 
         q = []
@@ -398,6 +561,7 @@ class Q3DController(QObject):
             if isinstance(i, Layer) and i.layerId == layer.layerId:
                 if not i.opt.onlyMaterial:
                     layer.opt.onlyMaterial = False
+                changes |= i.opt.changes
             else:
                 q.append(i)
 
@@ -407,6 +571,12 @@ class Q3DController(QObject):
             self.abort(clear_queue=False)
             if not self.processingLayer.opt.onlyMaterial:
                 layer.opt.onlyMaterial = False
+            changes |= self.processingLayer.opt.changes
+
+        layer.opt.changes = changes or LayerChange.ALL
+
+        if layer.type == LayerType.DEM and not (layer.opt.changes & LayerChange.GEOMETRY):
+            layer.opt.onlyMaterial = True
 
         if layer.visible:
             self.requestQueue.append(layer)
@@ -482,16 +652,9 @@ class Q3DController(QObject):
             self.settings.removeLayer(layerId)
 
     # @pyqtSlot(QPainter)
-    def _requestBuildScene(self, _=None):
-        self.requestBuildScene(update_all=False)
-
-    # @pyqtSlot()
-    # def updateExtent(self):
-    #     if self.settings.sceneProperties().get("radioButton_FixedExtent"):
-    #         return
-    #     self.requestQueue.clear()
-    #     if self.processingLayer:
-    #         self.abort(clear_queue=False)
+    def mapCanvasRendered(self, _=None):
+        # (re)start the timer. scene is updated when the map canvas has stopped changing for a while
+        self.extentTimer.start()
 
 
 class Mock:
@@ -2,17 +2,140 @@
 # (C) 2014 Minoru Akagi
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import hashlib
+import numpy
+import os
 import struct
+import threading
 
-from math import floor
+from math import ceil, floor, hypot
 from osgeo import gdal
+from qgis.core import QgsRectangle
 
 from .geometry import GridGeometry
-from ..utils import logMessage
+from .warpcache import warpCache
+from ..conf import DEM_PYRAMID_MIN_SIZE, DEM_USE_OVERVIEWS, DEM_WARP_MEMORY, DEM_WARP_THREADS
+from ..utils import logMessage, trace
+
+MAX_WINDOW_SIZE = 2048      # max number of grid points in each direction of a DEM window
+READ_CHUNK_SIZE = 1 << 20   # max number of grid points read at once by readInto()
+
+_pyramidLocks = {}     # path -> lock
+_pyramidLocksLock = threading.Lock()
+
+
+def _pyramidLock(path):
+    """returns a lock to create a pyramid level file"""
+    with _pyramidLocksLock:
+        return _pyramidLocks.setdefault(path, threading.Lock())
+
+
+class DEMWindow:
+
+    """grid of elevation values read for a rectangle. Used to sample elevation at many points at once."""
+
+    def __init__(self, x0, y0, xres, yres, values):
+        """x0, y0: coordinates of the top-left grid point
+           values: 2D NumPy array with (rows, cols) shape. rows and cols should be 2 or more."""
+        self.x0 = x0
+        self.y0 = y0
+        self.xres = xres
+        self.yres = yres
+        self.values = values
+
+    @classmethod
+    def read(cls, rect, xres, yres, readFunc):
+        """returns a window that covers a rectangle at a resolution. If the grid size exceeds MAX_WINDOW_SIZE,
+           a TiledDEMWindow is returned instead, so that the resolution is kept.
+           readFunc: function that takes (cols, rows, x0, y0, xres, yres) and returns a 2D NumPy array of values"""
+        cols, rows, x0, y0, xres, yres = cls.gridParams(rect, xres, yres)
+        if cols > MAX_WINDOW_SIZE or rows > MAX_WINDOW_SIZE:
+            return TiledDEMWindow(rect, xres, yres, readFunc)
+        return DEMWindow(x0, y0, xres, yres, readFunc(cols, rows, x0, y0, xres, yres))
+
+    @classmethod
+    def gridParams(cls, rect, xres, yres):
+        """returns grid size and position of a window that covers a rectangle.
+           returns (cols, rows, x0, y0, xres, yres)"""
+        cols = int(ceil(rect.width() / xres)) + 3
+        rows = int(ceil(rect.height() / yres)) + 3
+        return (cols, rows, rect.xMinimum() - xres, rect.yMaximum() + yres, xres, yres)
+
+    @staticmethod
+    def geotransform(x0, y0, xres, yres):
+        """geotransform of a raster whose pixel centers are grid points"""
+        return [x0 - xres / 2, xres, 0, y0 + yres / 2, 0, -yres]
+
+    def valuesAt(self, xs, ys):
+        """bilinear interpolation of values at points. returns a NumPy array."""
+        rows, cols = self.values.shape
+        fx = (numpy.asarray(xs, dtype=numpy.float64) - self.x0) / self.xres
+        fy = (self.y0 - numpy.asarray(ys, dtype=numpy.float64)) / self.yres
+
+        ix = numpy.clip(numpy.floor(fx).astype(numpy.intp), 0, cols - 2)
+        iy = numpy.clip(numpy.floor(fy).astype(numpy.intp), 0, rows - 2)
+        dx = fx - ix
+        dy = fy - iy
+
+        v = self.values
+        top = v[iy, ix] * (1 - dx) + v[iy, ix + 1] * dx
+        bottom = v[iy + 1, ix] * (1 - dx) + v[iy + 1, ix + 1] * dx
+        return top * (1 - dy) + bottom * dy
+
+
+class TiledDEMWindow:
+
+    """windows that cover a large rectangle in tiles. A window is read when values at points in it are requested."""
+
+    def __init__(self, rect, xres, yres, readFunc):
+        self.rect = rect
+        self.xres = xres
+        self.yres = yres
+        self.readFunc = readFunc
+
+        # a window of a tile has 3 more grid points than the tile in each direction (see DEMWindow.gridParams())
+        self.tileWidth = (MAX_WINDOW_SIZE - 4) * xres
+        self.tileHeight = (MAX_WINDOW_SIZE - 4) * yres
+        self.cols = int(ceil(rect.width() / self.tileWidth))
+        self.rows = int(ceil(rect.height() / self.tileHeight))
+
+        self._windows = {}      # tile index -> DEMWindow
+
+    def window(self, index):
+        w = self._windows.get(index)
+        if w is None:
+            row, col = divmod(index, self.cols)
+            xmin = self.rect.xMinimum() + col * self.tileWidth
+            ymax = self.rect.yMaximum() - row * self.tileHeight
+            rect = QgsRectangle(xmin, max(ymax - self.tileHeight, self.rect.yMinimum()),
+                                min(xmin + self.tileWidth, self.rect.xMaximum()), ymax)
+            w = self._windows[index] = DEMWindow.read(rect, self.xres, self.yres, self.readFunc)
+        return w
+
+    def valuesAt(self, xs, ys):
+        """bilinear interpolation of values at points. returns a NumPy array."""
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        cols = numpy.clip(numpy.floor((xs - self.rect.xMinimum()) / self.tileWidth).astype(numpy.intp), 0, self.cols - 1)
+        rows = numpy.clip(numpy.floor((self.rect.yMaximum() - ys) / self.tileHeight).astype(numpy.intp), 0, self.rows - 1)
+        indices = rows * self.cols + cols
+
+        values = numpy.empty(len(xs))
+        for index in numpy.unique(indices):
+            mask = indices == index
+            values[mask] = self.window(int(index)).valuesAt(xs[mask], ys[mask])
+        return values
+
+
+def pointsBoundingBox(xs, ys):
+    """returns (xmin, ymin, xmax, ymax) of points"""
+    return (min(xs), min(ys), max(xs), max(ys))
 
 
 class GDALDEMProvider:
 
+    threadSafe = True
+
     def __init__(self, filename, dest_wkt, source_wkt=None):
         self.filename = filename
         self.dest_wkt = dest_wkt
@@ -20,46 +143,235 @@ class GDALDEMProvider:
 
         self.mem_driver = gdal.GetDriverByName("MEM")
 
-        filename_utf8 = filename.encode("utf-8") if isinstance(filename, str) else filename
-        self.ds = gdal.Open(filename_utf8, gdal.GA_ReadOnly)
-
-        if self.ds is None:
-            logMessage("Cannot open file: " + filename, error=True)
-            self.ds = self.mem_driver.Create("", 1, 1, 1, gdal.GDT_Float32)
+        self._local = threading.local()
 
         self.width = self.ds.RasterXSize
         self.height = self.ds.RasterYSize
 
-    def _read(self, width, height, geotransform):
+        self._res = None
+        self._overviews = None
+
+    @property
+    def ds(self):
+        """dataset opened for current thread. A GDAL dataset cannot be shared by threads."""
+        ds = getattr(self._local, "ds", None)
+        if ds is None:
+            ds = self._local.ds = self._open()
+        return ds
+
+    def close(self):
+        """releases datasets opened in threads. They are opened again when data are read after this"""
+        self._local = threading.local()
+
+    def _open(self):
+        filename_utf8 = self.filename.encode("utf-8") if isinstance(self.filename, str) else self.filename
+        ds = gdal.Open(filename_utf8, gdal.GA_ReadOnly)
+
+        if ds is None:
+            logMessage("Cannot open file: " + self.filename, error=True)
+            ds = self.mem_driver.Create("", 1, 1, 1, gdal.GDT_Float32)
+        return ds
+
+    def _read(self, width, height, geotransform, cached=True):
+        """cached: whether to use warp cache. Grid reads are cached. One-off reads such as windows
+           for feature blocks are not, so that they do not evict grids from the cache."""
+        source = self._source(geotransform)
+
+        cache = warpCache()
+        key = cache.key(self.filename, self.dest_wkt, self.source_wkt, geotransform, width, height,
+                        "{}:{}".format(gdal.GRA_Bilinear, source)) if cached else None
+        with trace.span("dem.read", "dem", cells=width * height, source=source):
+            data = cache.get(key)
+            if data is None:
+                with trace.span("dem.warp", "dem", cells=width * height, bytes=width * height * 4):
+                    data = self._warp(width, height, geotransform, self._sourceDataset(source))
+                cache.put(key, data)
+        return data
+
+    def _warp(self, width, height, geotransform, src_ds=None):
         # create a memory dataset
         warped_ds = self.mem_driver.Create("", width, height, 1, gdal.GDT_Float32)
         warped_ds.SetProjection(self.dest_wkt)
         warped_ds.SetGeoTransform(geotransform)
 
         # reproject image
-        gdal.ReprojectImage(self.ds, warped_ds, self.source_wkt, None, gdal.GRA_Bilinear)
+        src_ds = src_ds or self.ds
+        if DEM_WARP_THREADS:
+            opts = gdal.WarpOptions(srcSRS=self.source_wkt or None,
+                                    resampleAlg=gdal.GRA_Bilinear,
+                                    multithread=True,
+                                    warpOptions=["NUM_THREADS={}".format(DEM_WARP_THREADS)],
+                                    warpMemoryLimit=DEM_WARP_MEMORY,
+                                    overviewLevel="NONE")       # source level is selected by _source()
+            gdal.Warp(warped_ds, src_ds, options=opts)
+        else:
+            gdal.ReprojectImage(src_ds, warped_ds, self.source_wkt, None, gdal.GRA_Bilinear)
 
         band = warped_ds.GetRasterBand(1)
         return band.ReadRaster(0, 0, width, height, buf_type=gdal.GDT_Float32)
 
+    def overviewFactors(self):
+        """returns downsampling factors of overviews of the source raster"""
+        if self._overviews is None:
+            band = self.ds.GetRasterBand(1)
+            self._overviews = [self.width / band.GetOverview(i).XSize for i in range(band.GetOverviewCount())]
+        return self._overviews
+
+    def _source(self, geotransform):
+        """selects the source level to read for a grid with the geotransform.
+           returns "" (full resolution), "ovr<index>" (overview) or "pyr<factor>" (cached pyramid level)"""
+        if not DEM_USE_OVERVIEWS:
+            return ""
+
+        # the coarsest level that is still finer than the grid
+        xres, yres = self.resolution()
+        ratio = min(hypot(geotransform[1], geotransform[2]) / xres,
+                    hypot(geotransform[4], geotransform[5]) / yres)
+        if ratio < 2:
+            return ""
+
+        factors = self.overviewFactors()
+        if factors:
+            candidates = [(f, i) for i, f in enumerate(factors) if f <= ratio]
+            return "ovr{}".format(max(candidates)[1]) if candidates else ""
+
+        if not DEM_PYRAMID_MIN_SIZE or max(self.width, self.height) < DEM_PYRAMID_MIN_SIZE:
+            return ""
+
+        factor = 2
+        while factor * 2 <= ratio and min(self.width, self.height) // (factor * 2) >= 2:
+            factor *= 2
+        return "pyr{}".format(factor)
+
+    def _sourceDataset(self, source):
+        """returns a dataset of the source level opened for current thread"""
+        if not source:
+            return self.ds
+
+        datasets = getattr(self._local, "sources", None)
+        if datasets is None:
+            datasets = self._local.sources = {}
+
+        ds = datasets.get(source)
+        if ds is None:
+            if source.startswith("ovr"):
+                ds = gdal.OpenEx(self.filename, gdal.OF_RASTER | gdal.OF_READONLY,
+                                 open_options=["OVERVIEW_LEVEL={}".format(source[3:])])
+            else:
+                path = self._pyramidLevel(int(source[3:]))
+                ds = gdal.Open(path, gdal.GA_ReadOnly) if path else None
+
+            if ds is None:
+                ds = self.ds        # fall back to full resolution
+            datasets[source] = ds
+        return ds
+
+    def _pyramidLevel(self, factor):
+        """returns path of a cached GeoTIFF file downsampled from the source raster by the factor.
+           Each level is made from the next finer level on first use. None is returned on failure."""
+        if factor == 1:
+            return self.filename
+
+        try:
+            st = os.stat(self.filename)
+        except (OSError, TypeError, ValueError):
+            return None
+
+        s = "\n".join([os.path.abspath(self.filename), str(st.st_mtime_ns), str(st.st_size), str(factor)])
+
+        # files are evicted with cache files of the warp cache
+        cache = warpCache()
+        path = cache.filePath("pyr-" + hashlib.sha1(s.encode("utf-8")).hexdigest() + ".tif")
+        if path is None:
+            return None
+
+        with _pyramidLock(path):
+            if os.path.exists(path):
+                return path
+
+            src = self._pyramidLevel(factor // 2)
+            if src is None:
+                return None
+
+            logMessage("Creating downsampled DEM (1/{}): {}".format(factor, self.filename))
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = path + ".tmp"
+                ds = gdal.Translate(tmp, src, format="GTiff",
+                                    width=max(1, self.width // factor), height=max(1, self.height // factor),
+                                    resampleAlg="average",
+                                    creationOptions=["TILED=YES", "COMPRESS=DEFLATE", "BIGTIFF=IF_SAFER"])
+                if ds is None:
+                    raise RuntimeError("gdal.Translate failed")
+                ds = None       # close
+                os.replace(tmp, path)
+
+            except (OSError, RuntimeError) as e:
+                logMessage("Failed to create downsampled DEM: {}".format(e), warning=True)
+                return None
+
+            cache.addFile(path)
+
+        return path
+
     def read(self, width, height, extent):
         """read data into a byte array"""
         return self._read(width, height, extent.geotransform(width, height))
 
     def readValues(self, width, height, extent):
-        """read data into a list"""
-        return struct.unpack("f" * width * height, self.read(width, height, extent))
+        """read data into a NumPy float32 array"""
+        return numpy.frombuffer(self.read(width, height, extent), dtype=numpy.float32).copy()
+
+    def readInto(self, values, extent):
+        """read data into a 2D NumPy float32 array with (rows, cols) shape, e.g. a memory-mapped file.
+           Data are read in chunks of rows so that the whole grid is not held in memory at once.
+           Each chunk is cached with its own key. A grid read in one chunk shares the cache entry with read()."""
+        height, width = values.shape
+        gt = extent.geotransform(width, height)
+        step = max(1, READ_CHUNK_SIZE // width)
+        for row in range(0, height, step):
+            rows = min(step, height - row)
+            geotransform = [gt[0] + row * gt[2], gt[1], gt[2], gt[3] + row * gt[5], gt[4], gt[5]]
+            values[row:row + rows] = numpy.frombuffer(self._read(width, rows, geotransform), dtype=numpy.float32).reshape((rows, width))
 
     def readAsGridGeometry(self, width, height, extent):
         return GridGeometry(extent,
                             width - 1, height - 1,
                             self.readValues(width, height, extent))
 
+    def resolution(self):
+        """approximate pixel size of the source raster in the destination CRS"""
+        if self._res is None:
+            try:
+                vrt = gdal.AutoCreateWarpedVRT(self.ds, self.source_wkt, self.dest_wkt, gdal.GRA_Bilinear)
+            except RuntimeError:
+                vrt = None
+
+            gt = (vrt or self.ds).GetGeoTransform()
+            self._res = (abs(gt[1]) or 1, abs(gt[5]) or 1)
+        return self._res
+
+    def readWindow(self, rect):
+        """read values of a window that covers a rectangle at about the resolution of source raster.
+           rect: a QgsRectangle in the destination CRS"""
+        xres, yres = self.resolution()
+        return DEMWindow.read(rect, xres, yres, self._readGrid)
+
+    def _readGrid(self, cols, rows, x0, y0, xres, yres):
+        values = self._read(cols, rows, DEMWindow.geotransform(x0, y0, xres, yres), cached=False)
+        return numpy.frombuffer(values, dtype=numpy.float32).reshape((rows, cols))
+
+    def readValuesAt(self, xs, ys):
+        """get values at specified positions. returns a NumPy array"""
+        if len(xs) == 0:
+            return numpy.empty(0)
+        return self.readWindow(QgsRectangle(*pointsBoundingBox(xs, ys))).valuesAt(xs, ys)
+
     def readValue(self, x, y):
         """get value at specified position using 1px * 1px memory raster"""
         res = 0.1
         geotransform = [x - res / 2, res, 0, y + res / 2, 0, -res]
-        return struct.unpack("f", self._read(1, 1, geotransform))[0]
+        return struct.unpack("f", self._warp(1, 1, geotransform))[0]
 
     def readValueOnTriangles(self, x, y, xmin, ymin, xres, yres):
         mx0 = floor((x - xmin) / xres)
@@ -67,7 +379,7 @@ class GDALDEMProvider:
         px0 = xmin + xres * mx0
         py0 = ymin + yres * my0
         geotransform = [px0, xres, 0, py0 + yres, 0, -yres]
-        z = struct.unpack("f" * 4, self._read(2, 2, geotransform))
+        z = struct.unpack("f" * 4, self._warp(2, 2, geotransform))
 
         sdx = (x - px0) / xres
         sdy = (y - py0) / yres
@@ -79,6 +391,8 @@ class GDALDEMProvider:
 
 class FlatDEMProvider:
 
+    threadSafe = True
+
     def __init__(self, value=0):
         self.value = value
 
@@ -86,15 +400,25 @@ class FlatDEMProvider:
         return "Flat Plane"
 
     def read(self, width, height, extent):
-        return struct.pack("{0}f".format(width * height), *([self.value] * width * height))
+        return self.readValues(width, height, extent).tobytes()
 
     def readValues(self, width, height, extent):
-        return [self.value] * width * height
+        return numpy.full(width * height, self.value, dtype=numpy.float32)
+
+    def readInto(self, values, extent):
+        values[:] = self.value
 
     def readAsGridGeometry(self, width, height, extent):
         return GridGeometry(extent,
                             width - 1, height - 1,
-                            [self.value] * width * height)
+                            self.readValues(width, height, extent))
+
+    def readWindow(self, rect):
+        return DEMWindow(rect.xMinimum(), rect.yMaximum(), rect.width() or 1, rect.height() or 1,
+                         numpy.full((2, 2), self.value, dtype=numpy.float32))
+
+    def readValuesAt(self, xs, ys):
+        return numpy.full(len(xs), self.value, dtype=numpy.float64)
 
     def readValue(self, x, y):
         return self.value
@@ -5,6 +5,7 @@
 
 import json
 import os
+import threading
 
 from qgis.PyQt.QtCore import QDir, QEventLoop, QFileInfo, QSize
 from qgis.PyQt.QtGui import QImage, QPainter
@@ -15,16 +16,22 @@ from ..build.vector.builder import VectorLayerBuilder
 from ..build.pointcloud.builder import PointCloudLayerBuilder
 from ..const import LayerType, Script
 from ..exportsettings import ExportSettings
+from ..texturecache import textureCache
+from ..warpcache import warpCache
 from ..controller.q3dcontroller import Q3DController
 from ..controller.q3dinterface import Q3DInterface
 from ...conf import DEBUG_MODE, PLUGIN_VERSION
 from ...gui.q3dview import Q3DWebPage
-from ...utils import hex_color
+from ...utils import hex_color, trace
 from ... import utils
 
+_copyLock = threading.Lock()     # exporters running in parallel copy library files to the same directory
+
 
 class ThreeJSExporter(ThreeJSBuilder):
 
+    BUILD_BLOCKS = True
+
     def __init__(self, settings=None, progress=None, log=None):
         ThreeJSBuilder.__init__(self, settings or ExportSettings(), progress, log)
 
@@ -38,7 +45,15 @@ class ThreeJSExporter(ThreeJSBuilder):
     def setMapSettings(self, settings):
         self.settings.setMapSettings(settings)
 
-    def export(self, filename=None, cancelSignal=None):
+    def export(self, filename=None, cancelSignal=None, traceFile=None):
+        """traceFile: path of a file to save a trace of build steps to (see utils/trace.py)"""
+        with trace.recording(traceFile):
+            try:
+                return self._export(filename, cancelSignal)
+            finally:
+                self.close()
+
+    def _export(self, filename=None, cancelSignal=None):
         if filename:
             self.settings.setOutputFilename(filename)
 
@@ -50,7 +65,11 @@ class ThreeJSExporter(ThreeJSBuilder):
             QDir().mkpath(dataDir)
 
         # export the scene and its layers
+        cache_stats = warpCache().stats()
+        tex_cache_stats = textureCache().stats()
         json_object = self.buildScene(cancelSignal=cancelSignal)
+        self.log(warpCache().statsString(since=cache_stats))
+        self.log(textureCache().statsString(since=tex_cache_stats))
 
         if self.canceled:
             return False
@@ -60,12 +79,12 @@ class ThreeJSExporter(ThreeJSBuilder):
             json_object["animation"] = self.settings.animationData(export=True, warning_log=self.warning_log)
 
         if self.settings.localMode:
-            with open(os.path.join(dataDir, "scene.js"), "w", encoding="utf-8") as f:
+            with open(os.path.join(dataDir, "scene.js"), "w", encoding="utf-8") as f, trace.span("serialize"):
                 f.write("app.loadJSONObject(")
                 json.dump(json_object, f, indent=2)
                 f.write('); window.setTimeout(function () { app.dispatchEvent({type: "sceneLoaded"}); }, 0);')
         else:
-            with open(os.path.join(dataDir, "scene.json"), "w", encoding="utf-8") as f:
+            with open(os.path.join(dataDir, "scene.json"), "w", encoding="utf-8") as f, trace.span("serialize"):
                 json.dump(json_object, f, indent=2 if DEBUG_MODE else None)
 
         narration = self.settings.narrations(warning_log=self.warning_log)
@@ -85,7 +104,8 @@ class ThreeJSExporter(ThreeJSBuilder):
                     self.log("Failed to copy {}.".format(f), warning=True)
 
         self.progress(95, "Copying library files...")
-        utils.copyFiles(self.filesToCopy(), self.settings.outputDirectory())
+        with _copyLock:
+            utils.copyFiles(self.filesToCopy(), self.settings.outputDirectory())
 
         # options in html file
         options = []
@@ -144,7 +164,7 @@ class ThreeJSExporter(ThreeJSBuilder):
         self._index += 1
         return self._index
 
-    def buildLayer(self, layer, cancelSignal=None):
+    def layerBuilder(self, layer):
         title = utils.abchex(self.nextLayerIndex())
 
         if self.settings.localMode:
@@ -158,9 +178,10 @@ class ThreeJSExporter(ThreeJSBuilder):
 
         builder_cls = LayerBuilderFactory.get(layer.type, VectorLayerBuilder)
         builder = builder_cls(self.settings, layer, self.imageManager, pathRoot, urlRoot, log=self.log)
+        builder.executor = self.executor
         if builder_cls == VectorLayerBuilder:
             self.modelManagers.append(builder.modelManager)
-        return builder.build(True, cancelSignal)
+        return builder
 
     def filesToCopy(self):
         # three.js library
@@ -285,6 +306,9 @@ class BridgeExporterBase:
         self.settings.isPreview = True
 
         self.page = Q3DWebPage()
+        self.settings.binaryTransport = getattr(self.page, "binaryTransport", False)
+        self.settings.artifactStore = getattr(self.page, "artifactStore", None)
+
         self.iface = Q3DInterface(self.settings, self.page)
         self.iface.statusMessage.connect(self.iface.showStatusMessage)
 
@@ -347,6 +371,8 @@ class ImageExporter(BridgeExporterBase):
 
         image, err = self.render(cameraState, cancelSignal)
         image.save(filename)
+
+        self.controller.builder.close()
         return err
 
 
@@ -375,4 +401,5 @@ class ModelExporter(BridgeExporterBase):
         # save model
         self.page.runScript("saveModelAsGLTF('{0}')".format(filename.replace("\\", "\\\\")))
 
+        self.controller.builder.close()
         return err
@@ -9,8 +9,9 @@ import os
 import re
 
 from qgis.PyQt.QtCore import QSettings, QSize, QUrl
-from qgis.core import QgsMapSettings, QgsPoint, QgsPointXY, QgsProject
+from qgis.core import QgsMapSettings, QgsPoint, QgsPointXY, QgsProject, QgsVectorLayer, QgsVectorLayerFeatureSource
 
+from .build.layerstore import LayerChange
 from .const import ATConst, GEOM_WIDGET_MAX_COUNT, LayerType, layerTypeFromMapLayer
 from .demprovider import GDALDEMProvider, FlatDEMProvider
 from .mapextent import MapExtent
@@ -25,6 +26,7 @@ class BuildOptions:
     def __init__(self):
         self.onlyMaterial = False
         self.allMaterials = False
+        self.changes = LayerChange.ALL      # kinds of property changes since the layer was built last time
 
 
 class Layer:
@@ -121,8 +123,13 @@ class ExportSettings:
 
         self.isPreview = False
         self.jsonSerializable = False
+        self.binaryTransport = False    # preview only. If True, feature blocks are sent in the binary block format
+        self.artifactStore = None       # preview only. ArtifactStore of the page if binary data are sent via the URL scheme handler
+        self.renderQueue = None         # MapRenderQueue (or RenderRequestQueue of processing jobs) to render textures in. If None, each builder has its own. not copied
         self.localMode = False
 
+        self.featureSources = None      # processing jobs only. layer id -> QgsVectorLayerFeatureSource created in the main thread. not copied
+
         self.nextJsLayerId = 0
 
         # cache
@@ -144,6 +151,8 @@ class ExportSettings:
         t.crs = self.crs
         t.isPreview = self.isPreview
         t.jsonSerializable = self.jsonSerializable
+        t.binaryTransport = self.binaryTransport
+        t.artifactStore = self.artifactStore
         t.localMode = self.localMode
         t.nextJsLayerId = self.nextJsLayerId
 
@@ -371,6 +380,19 @@ class ExportSettings:
     def layersToExport(self):
         return [lyr for lyr in self.layers() if lyr.visible]
 
+    def createFeatureSources(self):
+        """creates feature sources of vector layers to export, so that features can be read
+           in a worker thread. Must be called in the main thread"""
+        self.featureSources = {}
+        for layer in self.layersToExport():
+            mapLayer = QgsProject.instance().mapLayer(layer.layerId)
+            if isinstance(mapLayer, QgsVectorLayer):
+                self.featureSources[layer.layerId] = QgsVectorLayerFeatureSource(mapLayer)
+
+    def featureSource(self, layerId):
+        """returns a feature source created with createFeatureSources(), or None"""
+        return self.featureSources.get(layerId) if self.featureSources else None
+
     def mapLayerIdsToExport(self):
         return [lyr.layerId for lyr in self.layers() if lyr.visible]
 
@@ -2,14 +2,18 @@
 # (C) 2014 Minoru Akagi
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import threading
+from collections import OrderedDict
 from math import ceil, floor
+import numpy
 from qgis.core import (
-    QgsGeometry, QgsPointXY, QgsRectangle, QgsFeature, QgsSpatialIndex, QgsCoordinateTransform, QgsFeatureRequest,
+    QgsGeometry, QgsPointXY, QgsRectangle, QgsCoordinateTransform, QgsFeatureRequest,
     QgsPoint, QgsMultiPoint, QgsLineString, QgsMultiLineString, QgsPolygon, QgsMultiPolygon, QgsGeometryCollection,
     QgsProject, QgsTessellator, QgsVertexId, QgsWkbTypes)
 
-from ..lib.earcut import earcut
-from ..utils import logMessage
+from ..conf import GRID_SPLIT_CACHE_SIZE
+from ..lib.earcut import triangulation
+from ..utils import logMessage, trace
 
 
 class VectorGeometry:
@@ -18,6 +22,20 @@ class VectorGeometry:
     UseZ = 1
     UseM = 2
 
+    @staticmethod
+    def zValues(z_func, xs, ys):
+        """evaluate z_func for all points at once.
+           z_func: a function that takes x and y coordinate sequences and returns a sequence of z values, or None
+           returns a list of z values"""
+        if z_func is None:
+            return [0] * len(xs)
+
+        if len(xs) == 0:
+            return []
+
+        z = z_func(xs, ys)
+        return z.tolist() if hasattr(z, "tolist") else list(z)
+
     @classmethod
     def nestedPointXYList(cls, geom):
         if geom.wkbType() == QgsWkbTypes.GeometryCollection:
@@ -81,16 +99,20 @@ class PointGeometry(VectorGeometry):
         geom = cls()
         if useZM == VectorGeometry.NotUseZM:
             pts = cls.nestedPointXYList(geometry)
-            geom.pts = [transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in pts]
-
         else:
             pts = cls.nestedPointList(geometry.constGet())
-            if useZM == VectorGeometry.UseZ:
-                geom.pts = [transform_func(pt.x(), pt.y(), pt.z() + z_func(pt.x(), pt.y())) for pt in pts]
 
-            else:   # UseM
-                geom.pts = [transform_func(pt.x(), pt.y(), pt.m() + z_func(pt.x(), pt.y())) for pt in pts]
+        xs = [pt.x() for pt in pts]
+        ys = [pt.y() for pt in pts]
+        zs = cls.zValues(z_func, xs, ys)
+
+        if useZM == VectorGeometry.UseZ:
+            zs = [pt.z() + z for pt, z in zip(pts, zs)]
+
+        elif useZM == VectorGeometry.UseM:
+            zs = [pt.m() + z for pt, z in zip(pts, zs)]
 
+        geom.pts = [transform_func(x, y, z) for x, y, z in zip(xs, ys, zs)]
         return geom
 
     @classmethod
@@ -158,21 +180,29 @@ class LineGeometry(VectorGeometry):
 
     @classmethod
     def fromQgsGeometry(cls, geometry, z_func, transform_func, useZM=VectorGeometry.NotUseZM):
-        if z_func is None:
-            z_func = lambda x, y: 0
-
         geom = cls()
         if useZM == VectorGeometry.NotUseZM:
             lines = cls.nestedPointXYList(geometry)
-            geom.lines = [[transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in line] for line in lines]
-
         else:
             lines = cls.nestedPointList(geometry.constGet())
-            if useZM == VectorGeometry.UseZ:
-                geom.lines = [[transform_func(pt.x(), pt.y(), pt.z() + z_func(pt.x(), pt.y())) for pt in line] for line in lines]
 
-            else:   # UseM
-                geom.lines = [[transform_func(pt.x(), pt.y(), pt.m() + z_func(pt.x(), pt.y())) for pt in line] for line in lines]
+        pts = [pt for line in lines for pt in line]
+        xs = [pt.x() for pt in pts]
+        ys = [pt.y() for pt in pts]
+        zs = cls.zValues(z_func, xs, ys)
+
+        if useZM == VectorGeometry.UseZ:
+            zs = [pt.z() + z for pt, z in zip(pts, zs)]
+
+        elif useZM == VectorGeometry.UseM:
+            zs = [pt.m() + z for pt, z in zip(pts, zs)]
+
+        vertices = [transform_func(x, y, z) for x, y, z in zip(xs, ys, zs)]
+
+        i = 0
+        for line in lines:
+            geom.lines.append(vertices[i:i + len(line)])
+            i += len(line)
 
         return geom
 
@@ -250,29 +280,38 @@ class PolygonGeometry(VectorGeometry):
 
         if not centroidPerPolygon:
             pt = geometry.centroid().asPoint()
-            centroidHeight = z_func(pt.x(), pt.y())
+            centroidHeight = cls.zValues(z_func, [pt.x()], [pt.y()])[0]
             geom.centroids.append(transform_func(pt.x(), pt.y(), centroidHeight))
 
-        for polygon in cls.nestedPointXYList(geometry):
+        polygons = cls.nestedPointXYList(geometry)
 
-            if useCentroidHeight or centroidPerPolygon:
+        # heights at polygon centroids
+        if useCentroidHeight or centroidPerPolygon:
+            cpts = []
+            for polygon in polygons:
                 centroid = QgsGeometry.fromPolygonXY(polygon).centroid()
-                if centroid is None:
-                    centroidHeight = 0
-                    if centroidPerPolygon:
-                        geom.centroids.append(transform_func(0, 0, 0))
-                else:
-                    pt = centroid.asPoint()
-                    centroidHeight = z_func(pt.x(), pt.y())
-                    if centroidPerPolygon:
-                        geom.centroids.append(transform_func(pt.x(), pt.y(), centroidHeight))
+                cpts.append(None if centroid is None else centroid.asPoint())
+
+            valid = [pt for pt in cpts if pt is not None]
+            zs = iter(cls.zValues(z_func, [pt.x() for pt in valid], [pt.y() for pt in valid]))
+            cHeights = [0 if pt is None else next(zs) for pt in cpts]
 
-                if useCentroidHeight:
-                    z_func = (lambda x, y: centroidHeight)
+            if centroidPerPolygon:
+                for pt, z in zip(cpts, cHeights):
+                    geom.centroids.append(transform_func(0, 0, 0) if pt is None else transform_func(pt.x(), pt.y(), z))
 
+        # heights at vertices
+        if useCentroidHeight:
+            zs = [z for polygon, z in zip(polygons, cHeights) for bnd in polygon for pt in bnd]
+        else:
+            pts = [pt for polygon in polygons for bnd in polygon for pt in bnd]
+            zs = cls.zValues(z_func, [pt.x() for pt in pts], [pt.y() for pt in pts])
+
+        zs = iter(zs)
+        for polygon in polygons:
             bnds = []
             for i, bnd in enumerate(polygon):
-                pts = [transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in bnd]
+                pts = [transform_func(pt.x(), pt.y(), next(zs)) for pt in bnd]
                 if GeometryUtils.isClockwise(pts) ^ i == 0:
                     pts.reverse()    # outer boundary to clockwise and inner boundaries to counter-clockwise
                 bnds.append(pts)
@@ -329,63 +368,30 @@ class TINGeometry(PolygonGeometry):
         self.centroids = []
 
     def toDict(self, flat=False):
-        tris = IndexedTriangles3D()
-        for v0, v1, v2 in self.triangles:
-            tris.addTriangle(v0, v1, v2)
-
+        v, f = indexTriangles(self.triangles)
         if flat:
-            v = []
-            for pt in tris.vertices:
-                v.extend(pt)
+            v, f = (v.ravel(), f.ravel())
 
-            f = []
-            for c in tris.faces:
-                f.extend(c)
-
-        else:
-            v = tris.vertices
-            f = tris.faces
-
-        d = {"triangles": {"v": v, "f": f}}
+        d = {"triangles": {"v": v.tolist(), "f": f.tolist()}}
         if self.centroids:
             d["centroids"] = [[x, y, z if z == z else 0] for x, y, z in self.centroids]
         return d
 
     def toDict2(self, flat=False):
-        tris = IndexedTriangles2D()
-        for v0, v1, v2 in self.triangles:
-            tris.addTriangle(v0, v1, v2)
-
+        v, f = indexTriangles(self.triangles, dim=2)
         if flat:
-            v = []
-            for pt in tris.vertices:
-                v.extend(pt)
-
-            f = []
-            for c in tris.faces:
-                f.extend(c)
+            v, f = (v.ravel(), f.ravel())
 
-        else:
-            v = tris.vertices
-            f = tris.faces
-
-        d = {"triangles": {"v": v, "f": f}}
+        d = {"triangles": {"v": v.tolist(), "f": f.tolist()}}
         if self.centroids:
             d["centroids"] = [[x, y] for x, y, z in self.centroids]
         return d
 
     @classmethod
     def fromQgsGeometry(cls, geometry, z_func, transform_func, centroid=True, drop_z=False,
-                        ccw2d=False, use_z_func_cache=False, use_earcut=False):
+                        ccw2d=False, use_earcut=False):
         geom = cls()
 
-        if z_func:
-            if use_z_func_cache:
-                cache = FunctionCacheXY(z_func)
-                z_func = cache.func
-        else:
-            z_func = lambda x, y: 0
-
         if drop_z:
             g = geometry.get()
             g.dropZValue()
@@ -394,44 +400,50 @@ class TINGeometry(PolygonGeometry):
 
         if centroid:
             pt = geometry.centroid().asPoint()
-            if drop_z:
-                c = transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y()))
-            else:
+            z = cls.zValues(z_func, [pt.x()], [pt.y()])[0]
+            if not drop_z:
                 # use z coordinate of first vertex (until QgsAbstractGeometry supports z coordinate of centroid)
                 try:
-                    c = transform_func(pt.x(), pt.y(), g.vertexAt(QgsVertexId(0, 0, 0)).z() + z_func(pt.x(), pt.y()))
+                    z += g.vertexAt(QgsVertexId(0, 0, 0)).z()
                 except TypeError:   # if isinstance(g, QgsTriangle)
-                    c = transform_func(pt.x(), pt.y(), g.vertexAt(0).z() + z_func(pt.x(), pt.y()))
+                    z += g.vertexAt(0).z()
 
-            geom.centroids.append(c)
-
-        # vertex transform function
-        if drop_z:
-            v_func = lambda x, y, z: transform_func(x, y, z_func(x, y))
-        else:
-            v_func = lambda x, y, z: transform_func(x, y, z + z_func(x, y))
+            geom.centroids.append(transform_func(pt.x(), pt.y(), z))
 
         # triangulation
-        if use_earcut:
-            vertices = []
-            for poly in cls.nestedPointList(g):
-                if len(poly) == 1 and len(poly[0]) == 4:
-                    vertices.extend([v_func(pt.x(), pt.y(), pt.z()) for pt in poly[0][0:3]])
-                else:
-                    bnds = [[[pt.x(), pt.y(), pt.z()] for pt in bnd] for bnd in poly]
-                    data = earcut.flatten(bnds)
-                    v = data["vertices"]
-                    triangles = earcut.earcut(v, data["holes"], 3)
-                    vertices.extend([v_func(v[3 * i], v[3 * i + 1], v[3 * i + 2]) for i in triangles])
-        else:
-            tes = QgsTessellator(0, 0, False)
-            addPolygon = tes.addPolygon
-            for poly in cls.singleGeometries(g):
-                addPolygon(poly, 0)
+        with trace.span("triangulate", "vector") as s:
+            xs, ys, zs = ([], [], [])
+            if use_earcut:
+                coords, ringEnds, polygonEnds = ([], [], [])
+                for poly in cls.nestedPointList(g):
+                    for bnd in poly:
+                        for pt in bnd:
+                            coords.extend((pt.x(), pt.y(), pt.z()))
+                        ringEnds.append(len(coords) // 3)
+                    polygonEnds.append(len(ringEnds))
+
+                v = numpy.array(coords, dtype=numpy.float64).reshape(-1, 3)
+                v = v[triangulation.triangulate(v, ringEnds, polygonEnds, dim=3, keepTriangles=True)]
+                xs, ys, zs = (v[:, 0].tolist(), v[:, 1].tolist(), v[:, 2].tolist())
+            else:
+                tes = QgsTessellator(0, 0, False)
+                addPolygon = tes.addPolygon
+                for poly in cls.singleGeometries(g):
+                    addPolygon(poly, 0)
+
+                # mp = tes.asMultiPolygon()     # not available
+                data = tes.data()       # [x0, z0, -y0, x1, z1, -y1, ...]
+                xs = data[0::3]
+                ys = [-my for my in data[2::3]]
+                zs = data[1::3]
+            s.set(vertices=len(xs), triangles=len(xs) // 3)
+
+        if drop_z:
+            zs = cls.zValues(z_func, xs, ys)
+        elif z_func is not None:
+            zs = [z + dz for z, dz in zip(zs, cls.zValues(z_func, xs, ys))]
 
-            # mp = tes.asMultiPolygon()     # not available
-            data = tes.data()       # [x0, z0, -y0, x1, z1, -y1, ...]
-            vertices = [v_func(x, -my, z) for x, z, my in [data[i:i + 3] for i in range(0, len(data), 3)]]
+        vertices = [transform_func(x, y, z) for x, y, z in zip(xs, ys, zs)]
 
         if ccw2d:
             # orient triangles to counter-clockwise order
@@ -449,25 +461,6 @@ class TINGeometry(PolygonGeometry):
         return geom
 
 
-class FunctionCacheXY:
-
-    def __init__(self, func):
-        self._func = func
-        self.cache = {}
-
-    def clearCache(self):
-        self.cache = {}
-
-    def func(self, x, y):
-        xz = self.cache.get(y, {})
-        z = xz.get(x)
-        if z is None:
-            z = self._func(x, y)
-            xz[x] = z
-            self.cache[y] = xz
-        return z
-
-
 class GeometryUtils:
 
     @staticmethod
@@ -501,6 +494,10 @@ class GridGeometry:
     Triangular grid geometry
     """
 
+    _splitCache = OrderedDict()         # (polygon WKB, grid parameters) -> triangles. shared by grids.
+    _splitCacheUsed = 0                 # approximate size of the cache in bytes
+    _splitCacheLock = threading.Lock()
+
     def __init__(self, extent, x_segments, y_segments, values=None):
         self.extent = extent
         self.x_segments = x_segments
@@ -516,107 +513,143 @@ class GridGeometry:
         self.xres = self.width / x_segments
         self.yres = self.height / y_segments
 
-        self.vbands = self.hbands = None
+        self._values2d = None
 
-    def setupBands(self):
-        xmin, ymin, xmax, ymax = (self.xmin, self.ymin, self.xmax, self.ymax)
-        xres, yres = (self.xres, self.yres)
+    def cellRange(self, rect):
+        """returns range of columns and rows of grid cells that intersect with rect
+           as a tuple (col_min, col_max, row_min, row_max). Rows are counted from top.
+           If rect doesn't intersect with the grid, None is returned."""
+        c0 = max(0, floor((rect.xMinimum() - self.xmin) / self.xres))
+        c1 = min(self.x_segments - 1, ceil((rect.xMaximum() - self.xmin) / self.xres) - 1)
+        r0 = max(0, floor((self.ymax - rect.yMaximum()) / self.yres))
+        r1 = min(self.y_segments - 1, ceil((self.ymax - rect.yMinimum()) / self.yres) - 1)
+
+        if c0 > c1 or r0 > r1:
+            # on the right or bottom edge of the grid
+            if c0 == self.x_segments and rect.xMinimum() <= self.xmax:
+                c0 = c1 = self.x_segments - 1
+            if r0 == self.y_segments and rect.yMaximum() >= self.ymin:
+                r0 = r1 = self.y_segments - 1
+            if c0 > c1 or r0 > r1:
+                return None
+
+        return c0, c1, r0, r1
 
-        vrects = []
-        hrects = []
-        vbands = []
-        hbands = []
-
-        for x in range(self.x_segments):
-            f = QgsFeature(x)
-            r = QgsRectangle(xmin + x * xres, ymin,
-                             xmin + (x + 1) * xres, ymax)
-            f.setGeometry(QgsGeometry.fromRect(r))
-            vrects.append(r)
-            vbands.append(f)
-
-        for y in range(self.y_segments):
-            f = QgsFeature(y)
-            r = QgsRectangle(xmin, ymax - (y + 1) * yres,
-                             xmax, ymax - y * yres)
-            f.setGeometry(QgsGeometry.fromRect(r))
-            hrects.append(r)
-            hbands.append(f)
-
-        self.vrects = vrects
-        self.hrects = hrects
-        self.vbands = vbands
-        self.hbands = hbands
-
-        self.vidx = QgsSpatialIndex()
-        self.vidx.addFeatures(vbands)
-
-        self.hidx = QgsSpatialIndex()
-        self.hidx.addFeatures(hbands)
-
-    def vSplit(self, geom):
-        """split polygon vertically"""
-        for idx in self.vidx.intersects(geom.boundingBox()):
-            geometry = geom.clipped(self.vrects[idx])
-            if geometry:
-                yield idx, geometry
-
-    def hSplit(self, geom):
-        """split polygon horizontally"""
-        for idx in self.hidx.intersects(geom.boundingBox()):
-            geometry = geom.clipped(self.hrects[idx])
-            if geometry:
-                yield idx, geometry
+    def columnRect(self, col):
+        return QgsRectangle(self.xmin + col * self.xres, self.ymin,
+                            self.xmin + (col + 1) * self.xres, self.ymax)
+
+    def cellRect(self, col, row):
+        return QgsRectangle(self.xmin + col * self.xres, self.ymax - (row + 1) * self.yres,
+                            self.xmin + (col + 1) * self.xres, self.ymax - row * self.yres)
 
     def splitPolygonXY(self, geom):
-        return QgsGeometry.fromMultiPolygonXY(list(self._splitPolygon(geom)))
+        v = self.splitPolygonTriangles(geom)
+        return QgsGeometry.fromMultiPolygonXY([[[QgsPointXY(v[i], v[i + 1]),
+                                                 QgsPointXY(v[i + 2], v[i + 3]),
+                                                 QgsPointXY(v[i + 4], v[i + 5])]] for i in range(0, len(v), 6)])
 
     def splitPolygon(self, geom):
-        z_func = lambda x, y: self.valueOnSurface(x, y) or 0
-        cache = FunctionCacheXY(z_func)
-        z_func = cache.func
+        v = self.splitPolygonTriangles(geom).reshape(-1, 3, 2)
+        z = numpy.nan_to_num(self.valuesOnSurface(v[:, :, 0], v[:, :, 1]), nan=0)
 
         polygons = QgsMultiPolygon()
-        for poly in self._splitPolygon(geom):
+        for xs, ys, zs in zip(v[:, :, 0].tolist(), v[:, :, 1].tolist(), z.tolist()):
             p = QgsPolygon()
-            ring = QgsLineString()
-            for pt in poly[0]:
-                ring.addVertex(QgsPoint(pt.x(), pt.y(), z_func(pt.x(), pt.y())))
-            p.setExteriorRing(ring)
-
-            for bnd in poly[1:]:
-                ring = QgsLineString()
-                for pt in bnd:
-                    ring.addVertex(QgsPoint(pt.x(), pt.y(), z_func(pt.x(), pt.y())))
-                p.addInteriorRing(ring)
+            p.setExteriorRing(QgsLineString(xs, ys, zs))
             polygons.addGeometry(p)
         return QgsGeometry(polygons)
 
-    def _splitPolygon(self, geom):
-        if self.vbands is None:
-            self.setupBands()
+    def splitPolygonTriangles(self, geom):
+        """split polygon with grid cells and triangulate the pieces.
+           returns a flat NumPy array of vertex coordinates [x0, y0, x1, y1, x2, y2, ...] of counter-clockwise triangles.
+           Results are cached per polygon and grid so that rebuilding layers on the same grid skips the work.
+           The cache is limited by size, so that it holds all polygons of a large layer rather than a number of them."""
+        key = (bytes(geom.asWkb()), self.xmin, self.ymax, self.xres, self.yres, self.x_segments, self.y_segments)
+        with GridGeometry._splitCacheLock:
+            v = GridGeometry._splitCache.get(key)
+            if v is not None:
+                GridGeometry._splitCache.move_to_end(key)
+                return v
+
+        v = numpy.array(self._splitPolygon(geom), dtype=numpy.float64)
+
+        size = GridGeometry.splitCacheEntrySize(key, v)
+        if size <= GRID_SPLIT_CACHE_SIZE:
+            with GridGeometry._splitCacheLock:
+                old = GridGeometry._splitCache.pop(key, None)
+                if old is not None:
+                    GridGeometry._splitCacheUsed -= GridGeometry.splitCacheEntrySize(key, old)
+
+                GridGeometry._splitCache[key] = v
+                GridGeometry._splitCacheUsed += size
+                while GridGeometry._splitCacheUsed > GRID_SPLIT_CACHE_SIZE:
+                    k, d = GridGeometry._splitCache.popitem(last=False)
+                    GridGeometry._splitCacheUsed -= GridGeometry.splitCacheEntrySize(k, d)
+        return v
+
+    @staticmethod
+    def splitCacheEntrySize(key, v):
+        return len(key[0]) + v.nbytes + 256     # approximate overhead of objects
+
+    @classmethod
+    def clearSplitCache(cls):
+        with cls._splitCacheLock:
+            cls._splitCache.clear()
+            cls._splitCacheUsed = 0
 
-        for x, vc in self.vSplit(geom):
-            for y, c in self.hSplit(vc):
-                if c.isEmpty():
+    def _splitPolygon(self, geom):
+        cells = self.cellRange(geom.boundingBox())
+        if cells is None:
+            return []
+
+        c0, c1, r0, r1 = cells
+        if c0 == c1 and r0 == r1 and self.cellRect(c0, r0).contains(geom.boundingBox()):
+            return self._triangulate(geom)      # polygon within a cell
+
+        cellArea = self.xres * self.yres
+        v = []
+        for col in range(c0, c1 + 1):
+            strip = geom.clipped(self.columnRect(col))
+            if not strip or strip.isEmpty():
+                continue
+
+            rows = self.cellRange(strip.boundingBox())
+            if rows is None:
+                continue
+
+            for row in range(rows[2], rows[3] + 1):
+                rect = self.cellRect(col, row)
+                c = strip.clipped(rect)
+                if not c or c.isEmpty():
                     continue
 
-                for poly in PolygonGeometry.nestedPointXYList(c):
-                    bnds = [[[pt.x(), pt.y()] for pt in bnd] for bnd in poly]
-                    data = earcut.flatten(bnds)
-                    v = data["vertices"]
-                    triangles = earcut.earcut(v, data["holes"], data["dimensions"])
-                    vertices = [QgsPointXY(v[2 * i], v[2 * i + 1]) for i in triangles]
+                if c.area() >= cellArea * (1 - 1e-9):
+                    # cell is entirely covered with the polygon
+                    x0, y0, x1, y1 = (rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum())
+                    v.extend([x1, y1, x0, y1, x0, y0, x0, y0, x1, y0, x1, y1])
+                else:
+                    v.extend(self._triangulate(c))
+        return v
 
-                    for i in range(0, len(vertices), 3):
-                        yield [vertices[i:i + 3]]
+    @staticmethod
+    def _triangulate(geom):
+        coords, ringEnds, polygonEnds = ([], [], [])
+        for poly in PolygonGeometry.nestedPointXYList(geom):
+            for bnd in poly:
+                for pt in bnd:
+                    coords.extend((pt.x(), pt.y()))
+                ringEnds.append(len(coords) // 2)
+            polygonEnds.append(len(ringEnds))
+
+        v = numpy.array(coords, dtype=numpy.float64).reshape(-1, 2)
+        return v[triangulation.triangulate(v, ringEnds, polygonEnds)].ravel().tolist()
 
     def segmentizeBoundaries(self, geom):
         """geom: QgsGeometry (polygon or multi-polygon)"""
 
         xmin, ymax = (self.xmin, self.ymax)
         xres, yres = (self.xres, self.yres)
-        z_func = self.valueOnSurface
 
         polys = []
         for polygon in PolygonGeometry.nestedPointXYList(geom):
@@ -625,7 +658,8 @@ class GridGeometry:
                 if GeometryUtils.isClockwise(bnd) ^ (i > 0):   # xor
                     bnd.reverse()       # outer boundary should be ccw. inner boundaries should be cw.
 
-                ring = QgsLineString()
+                xs = []
+                ys = []
 
                 v = bnd[0]     # QgsPointXY
                 x0, y0 = (v.x(), v.y())
@@ -650,105 +684,79 @@ class GridGeometry:
                         p.remove(1)
 
                     for m in sorted(p):
-                        x = x0 + (x1 - x0) * m
-                        y = y0 + (y1 - y0) * m
-                        ring.addVertex(QgsPoint(x, y, z_func(x, y)))
+                        xs.append(x0 + (x1 - x0) * m)
+                        ys.append(y0 + (y1 - y0) * m)
 
                     x0, y0 = (x1, y1)
                     nx0, ny0, ns0 = (nx1, ny1, ns1)
 
-                ring.addVertex(QgsPoint(x0, y0, z_func(x0, y0)))    # last vertex
-                rings.addGeometry(ring)
+                xs.append(x0)       # last vertex
+                ys.append(y0)
+
+                zs = numpy.nan_to_num(self.valuesOnSurface(xs, ys), nan=0)
+                rings.addGeometry(QgsLineString(xs, ys, zs.tolist()))
             polys.append(QgsGeometry(rings))
         return polys
 
     def value(self, x, y):
         return self.values[x + y * (self.x_segments + 1)]
 
-    def valueOnSurface(self, x, y):
-        x = (x - self.xmin) / self.width
-        y = (y - self.ymin) / self.height
-        if x < 0 or 1 < x or y < 0 or 1 < y:
-            return None
+    def valuesOnSurface(self, xs, ys):
+        """returns values on the surface of triangulated grid at points.
+           xs, ys: sequences (or NumPy arrays) of x and y coordinates
+           returns a NumPy array of z values. Values at points outside the grid are NaN."""
+        x = (numpy.asarray(xs, dtype=numpy.float64) - self.xmin) / self.width
+        y = (numpy.asarray(ys, dtype=numpy.float64) - self.ymin) / self.height
+        outside = (x < 0) | (1 < x) | (y < 0) | (1 < y)
 
         mx = x * self.x_segments
         my = (1 - y) * self.y_segments     # inverted. top is 0.
-        mx0 = floor(mx)
-        my0 = floor(my)
+
+        # cells on the right or bottom edge are the last ones
+        mx0 = numpy.clip(numpy.floor(mx), 0, self.x_segments - 1).astype(numpy.intp)
+        my0 = numpy.clip(numpy.floor(my), 0, self.y_segments - 1).astype(numpy.intp)
         sdx = mx - mx0
         sdy = my - my0
 
-        if mx0 == self.x_segments:  # on right edge
-            mx0 -= 1
-            sdx = 1
-
-        if my0 == self.y_segments:  # on bottom edge
-            my0 -= 1
-            sdy = 1
-
-        z0, z1 = (self.value(mx0, my0), self.value(mx0 + 1, my0))
-        z2, z3 = (self.value(mx0, my0 + 1), self.value(mx0 + 1, my0 + 1))
+        v = self.values2d()
+        z0, z1 = (v[my0, mx0], v[my0, mx0 + 1])
+        z2, z3 = (v[my0 + 1, mx0], v[my0 + 1, mx0 + 1])
 
-        if sdx <= sdy:
-            return z0 + (z1 - z0) * sdx + (z2 - z0) * sdy
-        return z3 + (z2 - z3) * (1 - sdx) + (z1 - z3) * (1 - sdy)
-
-
-class IndexedTriangles2D:
-
-    EMPDICT = {}
-
-    def __init__(self):
-        self.vertices = []
-        self.faces = []
-        self.vidx = {}   # to find whether a vertex already exists: [y][x] = vertex index
-
-    def addTriangle(self, v1, v2, v3):
-        vi1 = self._vertexIndex(v1)
-        vi2 = self._vertexIndex(v2)
-        vi3 = self._vertexIndex(v3)
-        self.faces.append([vi1, vi2, vi3])
-
-    def _vertexIndex(self, v):
-        vi = self.vidx.get(v[1], self.EMPDICT).get(v[0])
-        if vi is not None:
-            return vi
-
-        vi = len(self.vertices)
-        self.vertices.append(v)
-
-        self.vidx[v[1]] = self.vidx.get(v[1], {})
-        self.vidx[v[1]][v[0]] = vi
-        return vi
-
-
-class IndexedTriangles3D:
-
-    EMPDICT = {}
+        z = numpy.where(sdx <= sdy,
+                        z0 + (z1 - z0) * sdx + (z2 - z0) * sdy,
+                        z3 + (z2 - z3) * (1 - sdx) + (z1 - z3) * (1 - sdy))
+        z[outside] = numpy.nan
+        return z
 
-    def __init__(self):
-        self.vertices = []
-        self.faces = []
-        self.vidx = {}   # to find whether a vertex already exists: [z][y][x] = vertex index
-
-    def addTriangle(self, v1, v2, v3):
-        vi1 = self._vertexIndex(v1)
-        vi2 = self._vertexIndex(v2)
-        vi3 = self._vertexIndex(v3)
-        self.faces.append([vi1, vi2, vi3])
-
-    def _vertexIndex(self, v):
-        vi = self.vidx.get(v[2], self.EMPDICT).get(v[1], self.EMPDICT).get(v[0])
-        if vi is not None:
-            return vi
-
-        vi = len(self.vertices)
-        self.vertices.append(v)
-
-        self.vidx[v[2]] = self.vidx.get(v[2], {})
-        self.vidx[v[2]][v[1]] = self.vidx[v[2]].get(v[1], {})
-        self.vidx[v[2]][v[1]][v[0]] = vi
-        return vi
+    def values2d(self):
+        """returns grid values as a 2D NumPy array (rows from top)"""
+        if self._values2d is None:
+            self._values2d = numpy.asarray(self.values, dtype=numpy.float64).reshape(self.y_segments + 1, self.x_segments + 1)
+        return self._values2d
+
+
+def indexTriangles(triangles, dim=3):
+    """build indexed triangles from a list of triangles.
+       triangles: a sequence of triangles, each of which is a sequence of three [x, y, z] vertices
+       dim: number of leading coordinates used to find identical vertices
+       returns a tuple of a float64 array of unique vertices with shape (n, 3) and
+       a uint32 array of vertex indices with shape (number of triangles, 3).
+       Vertices are in order of first appearance."""
+    vertices = numpy.asarray(triangles, dtype=numpy.float64).reshape(-1, 3)
+    if len(vertices) == 0:
+        return vertices, numpy.empty((0, 3), dtype=numpy.uint32)
+
+    # view each vertex as a single opaque item so that numpy.unique compares vertices, not coordinates.
+    # adding 0.0 normalizes negative zeros.
+    keys = numpy.ascontiguousarray(vertices[:, :dim] + 0.0)
+    keys = keys.view(numpy.dtype((numpy.void, keys.dtype.itemsize * dim))).ravel()
+    _, first, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+
+    order = numpy.argsort(first)
+    rank = numpy.empty(len(order), dtype=numpy.uint32)
+    rank[order] = numpy.arange(len(order), dtype=numpy.uint32)
+
+    return vertices[first[order]], rank[inverse.ravel()].reshape(-1, 3)
 
 
 def dissolvePolygonsWithinExtent(polygon_layer, extent, crs):
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import threading
+from collections import OrderedDict
+
+from ..utils import logMessage, trace
+
+
+class LRUCache:
+    """cache of data in a memory tier and an optional disk tier, both limited by size in bytes
+    and evicted in LRU order. Subclasses override _dataSize(), _toBytes() and _fromBytes()
+    for data other than bytes."""
+
+    NAME = "Cache"
+    FILE_EXT = ".bin"
+    EXTRA_FILE_EXTS = ()    # extensions of files that are written by callers in the disk tier (see filePath())
+
+    def __init__(self, memSize, diskSize, directory=None):
+        self.memSize = memSize
+        self.diskSize = diskSize if directory else 0
+        self.directory = directory
+
+        self._mem = OrderedDict()
+        self._memUsed = 0
+        self._diskUsed = None       # calculated when the disk tier is accessed for the first time
+        self._lock = threading.RLock()
+
+        self.hits = self.diskHits = self.misses = 0
+
+    def get(self, key, disk=True):
+        """disk: whether to look up the disk tier"""
+        if key is None or not (self.memSize or self.diskSize):
+            return None
+
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                trace.count(self.NAME + " hits")
+                return data
+
+            data = self._readFile(key) if disk else None
+            if data is not None:
+                self._putMem(key, data)
+                self.hits += 1
+                self.diskHits += 1
+                trace.count(self.NAME + " hits")
+                return data
+
+            self.misses += 1
+            trace.count(self.NAME + " misses")
+            return None
+
+    def put(self, key, data, disk=True):
+        """disk: whether to store data also in the disk tier"""
+        if key is None:
+            return
+
+        with self._lock:
+            self._putMem(key, data)
+            if disk:
+                self._writeFile(key, data)
+
+    def remove(self, key):
+        """removes data of the key from both tiers"""
+        with self._lock:
+            self._popMem(key)
+
+            if self.diskSize:
+                path = self._path(key)
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    if self._diskUsed is not None:
+                        self._diskUsed -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._memUsed = 0
+
+            if self.directory and os.path.isdir(self.directory):
+                for e in self._diskEntries():
+                    try:
+                        os.remove(e.path)
+                    except OSError:
+                        pass
+            self._diskUsed = None
+
+    def filePath(self, name):
+        """returns path of a file in the disk tier that a caller writes (e.g. with GDAL), or None if the disk tier
+           is disabled. The name must end with one of EXTRA_FILE_EXTS. An existing file is marked as recently used.
+           A new file is evicted with cache files after it is registered with addFile()."""
+        if not self.diskSize:
+            return None
+
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def addFile(self, path):
+        """adds size of a file written by a caller to the disk usage"""
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                if self._diskUsed is None:
+                    self._diskUsed = sum(e.stat().st_size for e in self._diskEntries())
+                else:
+                    self._diskUsed += size
+            except OSError:
+                return
+
+            if self._diskUsed > self.diskSize:
+                self._evictFiles()
+
+    def stats(self):
+        return {"hits": self.hits,
+                "diskHits": self.diskHits,
+                "misses": self.misses}
+
+    def statsString(self, since=None):
+        """since: a dict returned by stats(). If specified, counts since then are returned."""
+        s = self.stats()
+        if since:
+            s = {k: v - since.get(k, 0) for k, v in s.items()}
+
+        return "{}: {} hit(s) ({} from disk), {} miss(es)".format(self.NAME, s["hits"], s["diskHits"], s["misses"])
+
+    def _dataSize(self, data):
+        return len(data)
+
+    def _toBytes(self, data):
+        """serializes data to be written to a cache file"""
+        return data
+
+    def _fromBytes(self, b):
+        """deserializes data read from a cache file"""
+        return b
+
+    def _putMem(self, key, data):
+        size = self._dataSize(data)
+        if size > self.memSize:
+            return
+
+        self._popMem(key)
+
+        self._mem[key] = data
+        self._memUsed += size
+
+        while self._memUsed > self.memSize:
+            _, d = self._mem.popitem(last=False)
+            self._memUsed -= self._dataSize(d)
+
+    def _popMem(self, key):
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._memUsed -= self._dataSize(old)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.FILE_EXT)
+
+    def _readFile(self, key):
+        if not self.diskSize:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = self._fromBytes(f.read())
+            os.utime(path)      # mark as recently used
+            return data
+        except OSError:
+            return None
+
+    def _writeFile(self, key, data):
+        if not self.diskSize:
+            return
+
+        path = self._path(key)
+        try:
+            if os.path.exists(path):
+                return
+
+            data = self._toBytes(data)
+            if data is None or len(data) > self.diskSize:
+                return
+
+            os.makedirs(self.directory, exist_ok=True)
+            if self._diskUsed is None:
+                self._diskUsed = sum(e.stat().st_size for e in self._diskEntries())
+
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._diskUsed += len(data)
+
+        except OSError as e:
+            logMessage("Failed to write {} file: {}".format(self.NAME, e), warning=True)
+            return
+
+        if self._diskUsed > self.diskSize:
+            self._evictFiles()
+
+    def _diskEntries(self):
+        exts = (self.FILE_EXT,) + tuple(self.EXTRA_FILE_EXTS)
+        return [e for e in os.scandir(self.directory) if e.is_file() and e.name.endswith(exts)]
+
+    def _evictFiles(self):
+        entries = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in self._diskEntries()))
+        self._diskUsed = sum(e[1] for e in entries)
+
+        for _, size, path in entries:
+            if self._diskUsed <= self.diskSize:
+                break
+            try:
+                os.remove(path)
+                self._diskUsed -= size
+            except OSError:
+                pass
@@ -213,6 +213,13 @@ class MapExtent:
     def unrotatedRect(self):
         return self._unrotated_rect
 
+    def isSameSize(self, other, tolerance=1e-9):
+        """returns True if other extent has the same width, height and rotation.
+           tolerance: relative tolerance of width and height"""
+        if self._rotation != other._rotation:
+            return False
+        return abs(self._width - other._width) <= tolerance * self._width and abs(self._height - other._height) <= tolerance * self._height
+
     def geometry(self):
         geom = QgsGeometry.fromRect(self._unrotated_rect)
         if self._rotation:
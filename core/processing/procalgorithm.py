@@ -4,10 +4,15 @@
 # begin: 2018-11-06
 
 import os
+import queue
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ThreadPoolExecutor, wait
+from functools import partial
+
 import qgis
 from qgis.PyQt.QtCore import QDir, QSize
 from qgis.PyQt.QtXml import QDomDocument
-from qgis.core import (QgsCoordinateTransform,
+from qgis.core import (QgsApplication,
+                       QgsCoordinateTransform,
                        QgsExpression,
                        QgsGeometry,
                        QgsMemoryProviderUtils,
@@ -18,20 +23,24 @@ from qgis.core import (QgsCoordinateTransform,
                        QgsProcessingParameterExpression,
                        QgsProcessingParameterField,
                        QgsProcessingParameterFile,
+                       QgsProcessingParameterFileDestination,
                        QgsProcessingParameterFolderDestination,
                        QgsProcessingParameterNumber,
                        QgsProcessingParameterVectorLayer,
                        QgsWkbTypes)
 
+from ..build.renderqueue import MapRenderQueue
 from ..export.export import ThreeJSExporter, ImageExporter, ModelExporter
 from ..exportsettings import ExportSettings
 from ..mapextent import MapExtent
-from ...conf import DEBUG_MODE, DEF_SETS, P_OPEN_DIRECTORY
-from ...utils import logMessage, openDirectory
+from ...conf import DEBUG_MODE, DEF_SETS, P_EXPORT_JOBS, P_OPEN_DIRECTORY
+from ...utils import logMessage, openDirectory, trace
 
 
 class AlgorithmBase(QgsProcessingAlgorithm):
 
+    PARALLEL = False    # whether features can be exported in worker threads. See exportJob()
+
     INPUT = "INPUT"
     SCALE = "SCALE"
     BUFFER = "BUFFER"
@@ -42,6 +51,8 @@ class AlgorithmBase(QgsProcessingAlgorithm):
     SETTINGS = "SETTINGS"
     HEADER = "HEADER"
     FOOTER = "FOOTER"
+    TRACE = "TRACE"
+    JOBS = "JOBS"
     OUTPUT = "OUTPUT"
 
     def __init__(self):
@@ -172,6 +183,25 @@ class AlgorithmBase(QgsProcessingAlgorithm):
                                        )
         )
 
+        self.addAdvancedParameter(
+            QgsProcessingParameterFileDestination(self.TRACE,
+                                                  self.tr("Build Trace File"),
+                                                  self.tr("Chrome trace (*.json);;Summary table (*.txt)"),
+                                                  optional=True,
+                                                  createByDefault=False
+                                                  )
+        )
+
+        if self.PARALLEL:
+            self.addAdvancedParameter(
+                QgsProcessingParameterNumber(
+                    self.JOBS,
+                    self.tr("Number of features exported concurrently"),
+                    defaultValue=P_EXPORT_JOBS,
+                    minValue=1
+                )
+            )
+
     def prepareAlgorithm(self, parameters, context, feedback):
         clayer = self.parameterAsLayer(parameters, self.INPUT, context)
         cf_filter = self.parameterAsBool(parameters, self.CF_FILTER, context)
@@ -219,82 +249,273 @@ class AlgorithmBase(QgsProcessingAlgorithm):
         orig_size = mapSettings.outputSize()
 
         if cf_filter:
-            cf_layer = QgsMemoryProviderUtils.createMemoryLayer("current feature",
-                                                                clayer.fields(),
-                                                                clayer.wkbType(),
-                                                                clayer.crs())
+            style = QDomDocument("qgis")
+            clayer.exportNamedStyle(style)
+
+            cf_layer = self.currentFeatureLayer(clayer, style)
             layers = [cf_layer if lyr == clayer else lyr for lyr in mapSettings.layers()]
             mapSettings.setLayers(layers)
 
-            doc = QDomDocument("qgis")
-            clayer.exportNamedStyle(doc)
-            cf_layer.importNamedStyle(doc)
-
         total = clayer.featureCount()
-        for current, feature in enumerate(clayer.getFeatures()):
-            if feedback.isCanceled():
-                break
-
-            if cf_filter:
-                cf_layer.startEditing()
-                cf_layer.deleteFeatures([f.id() for f in cf_layer.getFeatures()])
-                cf_layer.addFeature(feature)
-                cf_layer.commitChanges()
-
-            title = feature.attribute(title_field)
-            feedback.setProgressText("({}/{}) Exporting {}...".format(current + 1, total, title))
-            logMessage("Exporting {}...".format(title))
-
-            # extent
-            geometry = QgsGeometry(feature.geometry())
-            geometry.transform(self.transform)
-            center = geometry.centroid().asPoint()
-
-            if fixed_scale or geometry.type() == QgsWkbTypes.PointGeometry:
-                tex_height = orig_tex_height or int(tex_width * orig_size.height() / orig_size.width())
-                extent = MapExtent(center, be.width(), be.width() * tex_height / tex_width, rotation).scale(1 + buf / 100)
-            else:
-                geometry.rotate(rotation, center)
-                rect = geometry.boundingBox().scaled(1 + buf / 100)
-                center = MapExtent.rotateQgsPoint(rect.center(), rotation, center)
-                if orig_tex_height:
-                    tex_height = orig_tex_height
-                    tex_ratio = tex_width / tex_height
-                    rect_ratio = rect.width() / rect.height()
-                    if tex_ratio > rect_ratio:
-                        extent = MapExtent(center, rect.height() * tex_ratio, rect.height(), rotation)
-                    else:
-                        extent = MapExtent(center, rect.width(), rect.width() / tex_ratio, rotation)
+
+        # in parallel mode, each feature is exported with its own copy of settings in a worker thread
+        jobs = self.parameterAsInt(parameters, self.JOBS, context) if self.PARALLEL else 1
+        jobQueue = ExportJobQueue(jobs, total, feedback) if jobs > 1 else None
+
+        trace_path = self.parameterAsFileOutput(parameters, self.TRACE, context)
+        with trace.recording(trace_path or None) as tracer:
+            for current, feature in enumerate(clayer.getFeatures()):
+                if feedback.isCanceled():
+                    break
+
+                if cf_filter and not jobQueue:
+                    cf_layer.startEditing()
+                    cf_layer.deleteFeatures([f.id() for f in cf_layer.getFeatures()])
+                    cf_layer.addFeature(feature)
+                    cf_layer.commitChanges()
+
+                title = feature.attribute(title_field)
+                feedback.setProgressText("({}/{}) Exporting {}...".format(current + 1, total, title))
+                logMessage("Exporting {}...".format(title))
+
+                # extent
+                geometry = QgsGeometry(feature.geometry())
+                geometry.transform(self.transform)
+                center = geometry.centroid().asPoint()
+
+                if fixed_scale or geometry.type() == QgsWkbTypes.PointGeometry:
+                    tex_height = orig_tex_height or int(tex_width * orig_size.height() / orig_size.width())
+                    extent = MapExtent(center, be.width(), be.width() * tex_height / tex_width, rotation).scale(1 + buf / 100)
                 else:
-                    # fit to buffered geometry bounding box
-                    extent = MapExtent(center, rect.width(), rect.height(), rotation)
-                    tex_height = tex_width * rect.height() / rect.width()
+                    geometry.rotate(rotation, center)
+                    rect = geometry.boundingBox().scaled(1 + buf / 100)
+                    center = MapExtent.rotateQgsPoint(rect.center(), rotation, center)
+                    if orig_tex_height:
+                        tex_height = orig_tex_height
+                        tex_ratio = tex_width / tex_height
+                        rect_ratio = rect.width() / rect.height()
+                        if tex_ratio > rect_ratio:
+                            extent = MapExtent(center, rect.height() * tex_ratio, rect.height(), rotation)
+                        else:
+                            extent = MapExtent(center, rect.width(), rect.width() / tex_ratio, rotation)
+                    else:
+                        # fit to buffered geometry bounding box
+                        extent = MapExtent(center, rect.width(), rect.height(), rotation)
+                        tex_height = tex_width * rect.height() / rect.width()
+
+                extent.toMapSettings(mapSettings)
+                mapSettings.setOutputSize(QSize(tex_width, tex_height))
+
+                self.settings.setMapSettings(mapSettings)
 
-            extent.toMapSettings(mapSettings)
-            mapSettings.setOutputSize(QSize(tex_width, tex_height))
+                # labels
+                exp_context.setFeature(feature)
+                self.settings.setHeaderLabel(header_exp.evaluate(exp_context))
+                self.settings.setFooterLabel(footer_exp.evaluate(exp_context))
 
-            self.settings.setMapSettings(mapSettings)
+                if jobQueue:
+                    settings = self.settings.clone()
+                    layer = None
+                    if cf_filter:
+                        # the feature is rendered from a layer of the job, since the current feature layer is shared
+                        layer = self.currentFeatureLayer(clayer, style, feature)
+                        settings.mapSettings.setLayers([layer if lyr == cf_layer else lyr for lyr in settings.mapSettings.layers()])
 
-            # labels
-            exp_context.setFeature(feature)
-            self.settings.setHeaderLabel(header_exp.evaluate(exp_context))
-            self.settings.setFooterLabel(footer_exp.evaluate(exp_context))
+                    # features are read from snapshots of layers created in the main thread,
+                    # and textures are rendered in the main thread
+                    settings.createFeatureSources()
+                    settings.renderQueue = jobQueue.renderRequests
 
-            self.export(title, out_dir, feedback)
+                    if not jobQueue.submit(ExportJob(title, settings, partial(self.exportJob, out_dir=out_dir), layer)):
+                        break
+                    continue
 
-            feedback.setProgress(int(current / total * 100))
+                with trace.span("atlas.feature", title=str(title)):
+                    self.export(title, out_dir, feedback)
+
+                feedback.setProgress(int(current / total * 100))
+
+            if jobQueue:
+                jobQueue.finish()
+
+        if trace_path:
+            feedback.pushInfo(tracer.summary())
 
         if P_OPEN_DIRECTORY and not DEBUG_MODE:
             openDirectory(out_dir)
 
-        return {}
+        return {self.TRACE: trace_path} if trace_path else {}
+
+    def currentFeatureLayer(self, clayer, style, feature=None):
+        """returns a memory layer that has the same fields and style as the coverage layer, and the feature if given"""
+        layer = QgsMemoryProviderUtils.createMemoryLayer("current feature",
+                                                         clayer.fields(),
+                                                         clayer.wkbType(),
+                                                         clayer.crs())
+        layer.importNamedStyle(style)
+
+        if feature is not None:
+            layer.dataProvider().addFeatures([feature])
+        return layer
 
     def export(self, title):
         pass
 
+    def exportJob(self, job, out_dir):
+        """exports a feature with settings of the job. Called in a worker thread.
+           returns an error message or None"""
+        pass
+
+
+class ExportJob:
+
+    """export of a coverage feature with its own copy of settings"""
+
+    def __init__(self, title, settings, func, layer=None):
+        """func: function that takes the job and exports the feature in a worker thread.
+           layer: current feature layer, which is kept until the job is finished"""
+        self.title = title
+        self.settings = settings
+        self.func = func
+        self.layer = layer
+
+        self.exporter = None
+        self.percentage = 0
+        self.canceled = False
+        self.messages = None    # queue of log messages
+
+    def run(self):
+        if self.canceled:
+            return None
+        return self.func(self)
+
+    def cancel(self):
+        self.canceled = True
+        if self.exporter:
+            self.exporter.cancel()
+
+    def progress(self, percentage=None, msg=None):
+        if percentage is not None:
+            self.percentage = percentage
+
+    def log(self, msg, warning=False):
+        self.messages.put((self.title, msg, warning))
+
+
+class ExportJobQueue:
+
+    """runs export jobs in worker threads, up to maxJobs jobs at a time. Progress, log messages and
+    cancellation of the jobs are handled with the processing feedback in the calling thread."""
+
+    def __init__(self, maxJobs, total, feedback):
+        self.maxJobs = maxJobs
+        self.total = max(1, total)
+        self.feedback = feedback
+
+        self.executor = ThreadPoolExecutor(maxJobs, thread_name_prefix="Qgis2threejsExport")
+        self.running = {}       # future -> job
+        self.finished = 0
+        self.messages = queue.Queue()
+
+        # map images requested by jobs are rendered in the calling thread
+        self.renderQueue = MapRenderQueue()
+        self.renderRequests = RenderRequestQueue()
+
+    def submit(self, job):
+        """starts a job when one of running jobs has finished. returns False if canceled"""
+        while len(self.running) >= self.maxJobs:
+            self.poll()
+
+        if self.feedback.isCanceled():
+            return False
+
+        job.messages = self.messages
+        self.running[self.executor.submit(job.run)] = job
+        return True
+
+    def poll(self, timeout=0.1):
+        """waits for a job to finish for a while, renders map images requested by jobs, and reports progress and messages"""
+        self.renderRequests.serve(self.renderQueue)
+        if self.renderQueue.running:
+            # rendering jobs are collected in the event loop
+            timeout = 0.01
+
+        done, _ = wait(list(self.running), timeout=timeout, return_when=FIRST_COMPLETED)
+        QgsApplication.processEvents()
+
+        for f in done:
+            job = self.running.pop(f)
+            self.finished += 1
+            try:
+                err = f.result()
+            except Exception as e:
+                err = str(e)
+
+            if err and not job.canceled:
+                self.feedback.reportError("Failed to export {}: {}".format(job.title, err))
+            elif not job.canceled:
+                self.feedback.pushInfo("Exported {}.".format(job.title))
+
+        while not self.messages.empty():
+            title, msg, warning = self.messages.get()
+            self.feedback.pushInfo("{}[{}] {}".format("Warning: " if warning else "", title, msg))
+
+        if self.feedback.isCanceled():
+            for job in self.running.values():
+                job.cancel()
+            self.renderQueue.cancel()
+
+        running = sum(job.percentage for job in self.running.values()) / 100
+        self.feedback.setProgressText("Exporting... ({} running, {}/{} finished)".format(len(self.running), self.finished, self.total))
+        self.feedback.setProgress(int((self.finished + running) / self.total * 100))
+
+    def finish(self):
+        """waits for all jobs to finish"""
+        while self.running:
+            self.poll()
+
+        self.executor.shutdown()
+
+
+class RenderRequestQueue:
+
+    """render queue of export jobs. Map images are requested from worker threads and rendered
+    in the render queue of the thread that serves the requests, since map layers live in the thread."""
+
+    def __init__(self):
+        self.requests = queue.Queue()
+
+    def start(self, settings):
+        """settings: QgsMapSettings
+           returns a Future of the image"""
+        future = Future()
+        self.requests.put((settings, future))
+        return future
+
+    def result(self, future):
+        return future.result()
+
+    def serve(self, renderQueue):
+        """starts rendering requested images in a render queue"""
+        while not self.requests.empty():
+            settings, future = self.requests.get()
+            if future.set_running_or_notify_cancel():
+                renderQueue.start(settings).add_done_callback(partial(self._rendered, future))
+
+    @staticmethod
+    def _rendered(future, f):
+        if f.cancelled():
+            future.set_exception(CancelledError())
+        elif f.exception() is not None:
+            future.set_exception(f.exception())
+        else:
+            future.set_result(f.result())
+
 
 class ExportAlgorithm(AlgorithmBase):
 
+    PARALLEL = True
+
     TEMPLATE = "TEMPLATE"
 
     def initAlgorithm(self, config):
@@ -335,6 +556,21 @@ class ExportAlgorithm(AlgorithmBase):
         err = self.exporter.export(cancelSignal=feedback.canceled)
         return True
 
+    def exportJob(self, job, out_dir):
+        job.settings.setOutputFilename(os.path.join(out_dir, "{}.html".format(job.title)))
+
+        err_msg = job.settings.checkValidity()
+        if err_msg:
+            return "Invalid settings: " + err_msg
+
+        job.exporter = ThreeJSExporter(job.settings, job.progress, job.log)
+        if job.canceled:
+            return None
+
+        with trace.span("atlas.feature", title=str(job.title)):
+            if not job.exporter.export() and not job.canceled:
+                return "Failed to export the scene."
+
 
 class ExportImageAlgorithm(AlgorithmBase):
 
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import hashlib
+import os
+import weakref
+from functools import partial
+
+from qgis.PyQt.QtCore import Qt, QBuffer, QByteArray, QIODevice
+from qgis.PyQt.QtGui import QColor, QImage
+from qgis.core import QgsMapLayerStyle, QgsProject, QgsProviderRegistry
+
+from .lrucache import LRUCache
+from ..conf import TEXTURE_CACHE_DISK_SIZE, TEXTURE_CACHE_MEM_SIZE
+from ..utils import cacheDir
+
+
+_textureCache = None
+
+
+def textureCache():
+    """returns the texture cache shared by preview, exporter and processing algorithms"""
+    global _textureCache
+    if _textureCache is None:
+        _textureCache = TextureCache(TEXTURE_CACHE_MEM_SIZE, TEXTURE_CACHE_DISK_SIZE, cacheDir("texture"))
+    return _textureCache
+
+
+def setTextureCache(cache):
+    """replaces the shared texture cache, e.g. with one in a temporary directory. returns the previous one"""
+    global _textureCache
+    prev, _textureCache = _textureCache, cache
+    return prev
+
+
+class TextureCache(LRUCache):
+    """cache of map images rendered for textures.
+    Memory tier entries of a layer are dropped when the layer requests repaint. Images are
+    stored in the disk tier only if all rendered layers are local files without unsaved changes."""
+
+    NAME = "Texture cache"
+    FILE_EXT = ".png"
+
+    def __init__(self, memSize, diskSize, directory=None):
+        LRUCache.__init__(self, memSize, diskSize, directory)
+
+        self._layerKeys = {}        # layer id -> set of keys of memory tier entries
+        self._revisions = {}        # layer id -> number of repaint requests
+        self._watched = {}          # layer id -> (weak reference to layer, slot connected to repaintRequested)
+        self._projectConnected = False
+
+    def key(self, settings):
+        """settings: QgsMapSettings to render an image with
+           returns a tuple of a cache key and a boolean that indicates whether the key persists across sessions"""
+        ext = settings.extent()
+        size = settings.outputSize()
+        items = [",".join(map(repr, [ext.xMinimum(), ext.yMinimum(), ext.xMaximum(), ext.yMaximum(), settings.rotation()])),
+                 "{}x{}".format(size.width(), size.height()),
+                 settings.destinationCrs().toWkt(),
+                 settings.backgroundColor().name(QColor.NameFormat.HexArgb),
+                 repr(settings.outputDpi()),
+                 str(int(settings.flags()))]
+
+        persistent = True
+        for layer in settings.layers():
+            if layer is None:
+                continue
+
+            state, p = self.layerState(layer)
+            items.append(state)
+            persistent = persistent and p
+
+        return hashlib.sha1("\n".join(items).encode("utf-8")).hexdigest(), persistent
+
+    @staticmethod
+    def layerState(layer):
+        """returns a tuple of a string that identifies current data source and style of a layer
+           and a boolean that indicates whether the string persists across sessions"""
+        style = QgsMapLayerStyle()
+        style.readFromLayer(layer)
+        items = [layer.id(), layer.providerType(), layer.source(), style.xmlData()]
+
+        persistent = False
+        path = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source()).get("path")
+        if path:
+            try:
+                st = os.stat(path)
+                items += [str(st.st_mtime_ns), str(st.st_size)]
+                persistent = not (layer.isEditable() and getattr(layer, "isModified", lambda: False)())
+            except OSError:
+                pass
+
+        return "\n".join(items), persistent
+
+    def revisions(self, layers):
+        with self._lock:
+            return tuple(self._revisions.get(layer.id(), 0) for layer in layers if layer)
+
+    def watch(self, layers):
+        """start watching repaint requests of layers. A layer is watched until it is removed from the project.
+           Layers are weakly referenced, so layers that are not in the project are not kept alive."""
+        with self._lock:
+            if not self._projectConnected:
+                QgsProject.instance().layerWillBeRemoved.connect(self.unwatch, Qt.ConnectionType.DirectConnection)
+                self._projectConnected = True
+
+            for layer in layers:
+                if layer is None:
+                    continue
+
+                w = self._watched.get(layer.id())
+                if w and w[0]() is layer:
+                    continue
+
+                # the slot is called directly because rendering may be done in a worker thread without event loop
+                slot = partial(self.layerRepainted, layer.id())
+                layer.repaintRequested.connect(slot, Qt.ConnectionType.DirectConnection)
+                self._watched[layer.id()] = (weakref.ref(layer), slot)
+
+    def unwatch(self, layerId):
+        """stops watching a layer and drops its memory tier entries"""
+        with self._lock:
+            w = self._watched.pop(layerId, None)
+            if w is None:
+                return
+
+            layer = w[0]()
+            if layer is not None:
+                try:
+                    layer.repaintRequested.disconnect(w[1])
+                except (RuntimeError, TypeError):
+                    pass
+
+            self.layerRepainted(layerId)
+
+    def layerRepainted(self, layerId, *args):
+        with self._lock:
+            self._revisions[layerId] = self._revisions.get(layerId, 0) + 1
+            for key in self._layerKeys.pop(layerId, ()):
+                self._popMem(key)
+
+    def putImage(self, key, image, layers, revisions, disk=True):
+        """revisions: revisions of the layers when rendering started. If any layer has requested
+           repaint since then, the image is not stored."""
+        with self._lock:
+            if self.revisions(layers) != revisions:
+                return
+
+            self.put(key, image, disk)
+            for layer in layers:
+                if layer:
+                    self._layerKeys.setdefault(layer.id(), set()).add(key)
+
+    def _dataSize(self, image):
+        return image.sizeInBytes()
+
+    def _toBytes(self, image):
+        ba = QByteArray()
+        buffer = QBuffer(ba)
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        if not image.save(buffer, "PNG"):
+            return None
+        return ba.data()
+
+    def _fromBytes(self, b):
+        image = QImage.fromData(b, "PNG")
+        if image.isNull():
+            return None
+        return image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
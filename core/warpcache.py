@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import hashlib
+import os
+
+from .lrucache import LRUCache
+from ..conf import WARP_CACHE_DISK_SIZE, WARP_CACHE_MEM_SIZE
+from ..utils import cacheDir
+
+
+_warpCache = None
+
+
+def warpCache():
+    """returns the warp cache shared by preview, exporter and processing algorithms"""
+    global _warpCache
+    if _warpCache is None:
+        _warpCache = WarpCache(WARP_CACHE_MEM_SIZE, WARP_CACHE_DISK_SIZE, cacheDir("dem"))
+    return _warpCache
+
+
+def setWarpCache(cache):
+    """replaces the shared warp cache, e.g. with one in a temporary directory. returns the previous one"""
+    global _warpCache
+    prev, _warpCache = _warpCache, cache
+    return prev
+
+
+class WarpCache(LRUCache):
+    """content-addressed cache of warped (reprojected and resampled) DEM rasters.
+    Data are kept in a memory tier and a disk tier, both evicted in LRU order."""
+
+    NAME = "DEM warp cache"
+    EXTRA_FILE_EXTS = (".tif",)     # downsampled DEM files (see GDALDEMProvider._pyramidLevel())
+
+    @staticmethod
+    def key(filename, dest_wkt, source_wkt, geotransform, width, height, resampling):
+        """returns a cache key. None is returned if the source is not a local file."""
+        try:
+            st = os.stat(filename)
+        except (OSError, TypeError, ValueError):
+            return None
+
+        s = "\n".join([os.path.abspath(filename),
+                       str(st.st_mtime_ns),
+                       str(st.st_size),
+                       dest_wkt or "",
+                       source_wkt or "",
+                       ",".join(map(repr, geotransform)),
+                       str(width),
+                       str(height),
+                       str(resampling)])
+        return hashlib.sha1(s.encode("utf-8")).hexdigest()
@@ -43,6 +43,9 @@ class ExportToWebDialog(QDialog):
 
         self.ui.checkBox_PreserveViewpoint.setChecked(bool(settings.option("viewpoint")))
         self.ui.checkBox_LocalMode.setChecked(bool(settings.option("localMode")))
+        self.ui.checkBox_BinaryBlocks.setChecked(bool(settings.option("binaryBlocks")))
+        self.ui.checkBox_BinaryBlocks.setEnabled(not self.ui.checkBox_LocalMode.isChecked())
+        self.ui.checkBox_LocalMode.toggled.connect(lambda checked: self.ui.checkBox_BinaryBlocks.setEnabled(not checked))
 
         # template settings
         cbox = self.ui.comboBox_Template
@@ -136,6 +139,8 @@ class ExportToWebDialog(QDialog):
         local_mode = self.ui.checkBox_LocalMode.isChecked()
         if local_mode:
             self.settings.setOption("localMode", True)
+        elif self.ui.checkBox_BinaryBlocks.isChecked():
+            self.settings.setOption("binaryBlocks", True)
 
         # template settings
         self.settings.setTemplate(self.ui.comboBox_Template.currentData())
@@ -402,7 +402,7 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
             widgets += [self.horizontalSlider_DEMSize, self.spinBox_Roughening]
             widgets += [self.checkBox_Clip, self.comboBox_ClipLayer]
 
-        widgets += [self.checkBox_Tiles, self.spinBox_Size]
+        widgets += [self.checkBox_Tiles, self.spinBox_Size, self.checkBox_LOD, self.spinBox_LODLevels]
         widgets += [self.checkBox_Sides, self.colorButton_Side, self.lineEdit_Bottom,
                     self.checkBox_Frame, self.colorButton_Edge,
                     self.checkBox_Wireframe, self.colorButton_Wireframe, self.checkBox_Visible, self.checkBox_Clickable]
@@ -431,6 +431,7 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
             self.checkBox_Clip.toggled.connect(self.clipToggled)
 
         self.checkBox_Tiles.toggled.connect(self.tilesToggled)
+        self.checkBox_LOD.toggled.connect(self.lodToggled)
         self.spinBox_Roughening.valueChanged.connect(self.rougheningChanged)
 
         # material group
@@ -494,6 +495,7 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
 
         # set enable and visible properties of widgets
         self.tilesToggled(self.checkBox_Tiles.isChecked())
+        self.lodToggled(self.checkBox_LOD.isChecked())
         self.comboBox_ClipLayer.setVisible(self.checkBox_Clip.isChecked())
         if not self.checkBox_Sides.isChecked():
             self.label_Bottom.setVisible(False)
@@ -575,6 +577,11 @@ Grid Spacing: {3:.5f} x {4:.5f}{5}"""
         if checked:
             self.checkBox_Clip.setChecked(False)
 
+    def lodToggled(self, checked):
+        # tiles of each level have the same grid roughness
+        self.setWidgetsEnabled([self.label_Roughness, self.spinBox_Roughening], not (checked or self.isPlane))
+        self.setWidgetsEnabled([self.label_LODLevels, self.spinBox_LODLevels], checked)
+
     def clipToggled(self, checked):
         if checked:
             self.checkBox_Frame.setChecked(False)
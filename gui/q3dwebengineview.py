@@ -17,8 +17,10 @@ else:
     from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineSettings
     from PyQt6.QtWebChannel import QWebChannel
 
+from .q3dwebscheme import installUrlSchemeHandler, registerUrlScheme, replaceBinaryData
 from .q3dwebviewcommon import Q3DWebPageCommon, Q3DWebViewCommon
-from ..utils import pluginDir
+from ..core.build.artifactstore import ArtifactStore
+from ..utils import pluginDir, trace
 
 
 def setChromiumFlags():
@@ -42,6 +44,9 @@ class Q3DWebEnginePage(Q3DWebPageCommon, QWebEnginePage):
         Q3DWebPageCommon.__init__(self)
 
         self.isWebEnginePage = True
+        self.binaryTransport = registerUrlScheme()     # whether binary data are sent via the URL scheme handler
+        self.artifactStore = ArtifactStore() if self.binaryTransport else None
+        self.schemeHandler = None
 
     def setup(self, settings, wnd=None):
         """wnd: Q3DWindow or None (off-screen mode)"""
@@ -51,6 +56,10 @@ class Q3DWebEnginePage(Q3DWebPageCommon, QWebEnginePage):
         self.channel.registerObject("bridge", self.bridge)
         self.setWebChannel(self.channel)
 
+        # binary data are fetched by the page from the URL scheme handler, which is shared by pages of the profile
+        if self.binaryTransport:
+            self.schemeHandler = installUrlSchemeHandler(self.profile())
+
         # security setting for billboard, model file and point cloud layer
         self.settings().setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessRemoteUrls, True)
 
@@ -61,6 +70,9 @@ class Q3DWebEnginePage(Q3DWebPageCommon, QWebEnginePage):
     def reload(self):
         Q3DWebPageCommon.reload(self)
 
+        if self.artifactStore:
+            self.artifactStore.clear()
+
         self.setUrl(self.myUrl)
 
     def runScript(self, string, data=None, message="", sourceID="q3dview.py", callback=None, wait=False):
@@ -101,7 +113,11 @@ class Q3DWebEnginePage(Q3DWebPageCommon, QWebEnginePage):
         return result
 
     def sendData(self, data):
-        self.bridge.sendScriptData.emit("loadJSONObject(pyData())", data)
+        with trace.span("web.send", "web"):
+            if self.schemeHandler:
+                data = replaceBinaryData(data, self.artifactStore)
+
+            self.bridge.sendScriptData.emit("loadJSONObject(pyData())", data)
 
     def logToConsole(self, message, level="debug"):
         self.runJavaScript('console.{}("{}");'.format(level, message.replace('"', '\\"')))
@@ -123,6 +139,7 @@ class Q3DWebEngineView(Q3DWebViewCommon, QWebEngineView):
 
     def __init__(self, parent=None):
         setChromiumFlags()
+        registerUrlScheme()
 
         QWebEngineView.__init__(self, parent)
         Q3DWebViewCommon.__init__(self)
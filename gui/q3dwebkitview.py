@@ -14,7 +14,7 @@ from qgis.PyQt.QtWebKitWidgets import QWebInspector, QWebPage, QWebView
 
 from .q3dwebviewcommon import Q3DWebPageCommon, Q3DWebViewCommon
 from ..conf import DEBUG_MODE
-from ..utils import pluginDir
+from ..utils import pluginDir, trace
 
 
 class Q3DWebKitPage(Q3DWebPageCommon, QWebPage):
@@ -80,7 +80,8 @@ class Q3DWebKitPage(Q3DWebPageCommon, QWebPage):
         if DEBUG_MODE:
             self.logToConsole(string)
 
-        self.runScript(string, data, message=None)
+        with trace.span("web.send", "web"):
+            self.runScript(string, data, message=None)
 
     def logToConsole(self, message, level="debug"):
         self.mainFrame().evaluateJavaScript('console.{}("{}");'.format(level, message.replace('"', '\\"')))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.PyQt.QtCore import PYQT_VERSION_STR, QBuffer, QByteArray, QIODevice, pyqtSignal
+from qgis.PyQt.QtGui import QImage
+
+if PYQT_VERSION_STR.split(".")[0] == "5":
+    from PyQt5.QtWebEngineCore import QWebEngineUrlRequestJob, QWebEngineUrlScheme, QWebEngineUrlSchemeHandler
+else:
+    from PyQt6.QtWebEngineCore import QWebEngineUrlRequestJob, QWebEngineUrlScheme, QWebEngineUrlSchemeHandler
+
+from ..conf import ARTIFACT_WORKERS
+from ..core.build.artifactstore import SCHEME as SCHEME_NAME, findArtifactStore, parseUrlPath, toByteArray
+from ..utils import logMessage, trace
+
+SCHEME = SCHEME_NAME.encode("ascii")
+
+
+def registerUrlScheme():
+    """registers the URL scheme for build artifacts. It must be done before the web engine is initialized.
+       returns True if the scheme is available"""
+    if QWebEngineUrlScheme.schemeByName(SCHEME).name() == SCHEME:
+        return True
+
+    scheme = QWebEngineUrlScheme(SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+    Flag = QWebEngineUrlScheme.Flag
+    scheme.setFlags(Flag.SecureScheme | Flag.LocalScheme | Flag.LocalAccessAllowed | Flag.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+    # registration is ignored if the web engine has already been initialized
+    return QWebEngineUrlScheme.schemeByName(SCHEME).name() == SCHEME
+
+
+def installUrlSchemeHandler(profile):
+    """installs the URL scheme handler in a web engine profile unless it has been installed, and returns the handler.
+       The handler is shared by the pages of the profile and lives as long as the profile."""
+    handler = profile.urlSchemeHandler(SCHEME)
+    if isinstance(handler, Q3DUrlSchemeHandler):
+        return handler
+
+    if handler:
+        # installed by previously loaded plugin module
+        profile.removeUrlSchemeHandler(handler)
+
+    handler = Q3DUrlSchemeHandler(profile)
+    profile.installUrlSchemeHandler(SCHEME, handler)
+    return handler
+
+
+class Q3DUrlSchemeHandler(QWebEngineUrlSchemeHandler):
+
+    """serves build artifacts (grids, images and feature blocks) in artifact stores to preview pages.
+    The store is identified by the URL of a request. Deferred artifacts are produced in worker threads,
+    and the requests are replied when they are ready."""
+
+    produced = pyqtSignal(object, object, bytes)    # job key, data, mime type
+
+    def __init__(self, parent=None):
+        QWebEngineUrlSchemeHandler.__init__(self, parent)
+
+        self.executor = None
+        self._jobs = {}     # key -> request job waiting for a deferred artifact
+        self._keys = itertools.count(1)
+
+        self.produced.connect(self.reply)
+
+    def requestStarted(self, job):
+        try:
+            storeId, artifactId = parseUrlPath(job.requestUrl().path())
+            store = findArtifactStore(storeId)
+            item = store.take(artifactId) if store else None
+        except ValueError:
+            item = None
+
+        if item is None:
+            logMessage("Artifact not found: " + job.requestUrl().toString(), warning=True)
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+
+        data, mimeType, deferred = item
+        mimeType = mimeType.encode("ascii")
+        if not deferred:
+            self._reply(job, toByteArray(data), mimeType)
+            return
+
+        # the request may be canceled by the page before the artifact is ready
+        key = next(self._keys)
+        self._jobs[key] = job
+        job.destroyed.connect(lambda _=None, key=key: self._jobs.pop(key, None))
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=max(1, ARTIFACT_WORKERS))
+
+        def produce():
+            try:
+                with trace.span("artifact.produce", "web"):
+                    ba = toByteArray(data())
+                self.produced.emit(key, ba, mimeType)
+            except Exception as e:
+                logMessage("Failed to produce artifact: {}".format(e), warning=True)
+                self.produced.emit(key, None, mimeType)
+
+        self.executor.submit(produce)
+
+    def reply(self, key, data, mimeType):
+        job = self._jobs.pop(key, None)
+        if job is None:
+            return
+
+        if data is None:
+            job.fail(QWebEngineUrlRequestJob.Error.RequestFailed)
+        else:
+            self._reply(job, data, mimeType)
+
+    def _reply(self, job, data, mimeType):
+        # the buffer is deleted with the job
+        trace.count("artifact bytes", data.size(), "web")
+        buf = QBuffer(job)
+        buf.setData(data)
+        buf.open(QIODevice.OpenModeFlag.ReadOnly)
+        job.reply(mimeType, buf)
+
+
+def replaceBinaryData(obj, store, owner=None):
+    """registers binary data in an object to be sent to a page as artifacts in the store of the page and replaces them with URLs.
+       {"binary": QByteArray} becomes {"url": URL, "binary": True} and {"object": QImage} becomes {"url": URL}."""
+    if isinstance(obj, list):
+        return [replaceBinaryData(v, store, owner) for v in obj]
+
+    if not isinstance(obj, dict):
+        return obj
+
+    if owner is None:
+        owner = obj.get("layer") or obj.get("id")
+
+    d = {}
+    for k, v in obj.items():
+        if k == "binary" and isinstance(v, QByteArray):
+            d["url"] = store.put(v, owner=owner)
+            d["binary"] = True
+        elif k == "object" and isinstance(v, QImage):
+            d["url"] = store.put(v, "image/png", owner=owner)
+        else:
+            d[k] = replaceBinaryData(v, store, owner)
+    return d
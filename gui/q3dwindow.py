@@ -26,6 +26,7 @@ from ..core.controller.q3dinterface import Q3DInterface
 from ..core.exportsettings import ExportSettings, Layer
 from ..core.plugin.pluginmanager import pluginManager
 from ..utils import createUid, hex_color, logMessage, pluginDir, Correspondent
+from ..utils.trace import tracer
 
 
 class Q3DViewerInterface(Q3DInterface):
@@ -94,7 +95,10 @@ class Q3DWindow(QMainWindow):
         self.webPage = self.ui.webView.page()
 
         if self.webPage:
-            settings.jsonSerializable = self.webPage.isWebEnginePage
+            # WebEngine: binary data are sent via a URL scheme handler if available, otherwise in JSON
+            settings.binaryTransport = self.webPage.isWebEnginePage and self.webPage.binaryTransport
+            settings.jsonSerializable = self.webPage.isWebEnginePage and not settings.binaryTransport
+            settings.artifactStore = self.webPage.artifactStore if settings.binaryTransport else None
             viewName = "WebEngine" if self.webPage.isWebEnginePage else "WebKit"
         else:
             previewEnabled = False
@@ -283,6 +287,20 @@ class Q3DWindow(QMainWindow):
             ui.menuTestDebug.addAction(ui.actionJSInfo)
             ui.actionJSInfo.triggered.connect(ui.webView.showJSInfo)
 
+            ui.menuTestDebug.addSeparator()
+
+            ui.actionTraceBuild = QAction(self)
+            ui.actionTraceBuild.setText("Trace Build")
+            ui.actionTraceBuild.setCheckable(True)
+            ui.actionTraceBuild.setChecked(tracer().enabled)
+            ui.menuTestDebug.addAction(ui.actionTraceBuild)
+            ui.actionTraceBuild.toggled.connect(self.traceBuildToggled)
+
+            ui.actionSaveBuildTrace = QAction(self)
+            ui.actionSaveBuildTrace.setText("Save Build Trace...")
+            ui.menuTestDebug.addAction(ui.actionSaveBuildTrace)
+            ui.actionSaveBuildTrace.triggered.connect(self.saveBuildTrace)
+
     def setupStatusBar(self, ui, iface, previewEnabled=True, viewName=""):
         w = ui.progressBar = QProgressBar(ui.statusbar)
         w.setObjectName("progressBar")
@@ -613,6 +631,19 @@ class Q3DWindow(QMainWindow):
         from ..tests.gui.test_gui import runTest
         runTest(self)
 
+    def traceBuildToggled(self, checked):
+        if checked:
+            tracer().start()
+        else:
+            tracer().stop()
+
+    def saveBuildTrace(self):
+        filename, _ = QFileDialog.getSaveFileName(self, "Save Build Trace", QDir.homePath(),
+                                                  "Chrome trace (*.json);;Summary table (*.txt)")
+        if filename:
+            tracer().save(filename)
+            logMessage("Build trace summary:\n" + tracer().summary())
+
 
 class PropertiesDialog(QDialog):
 
@@ -219,6 +219,20 @@ class Ui_DEMPropertiesWidget(object):
         self.label_2.setAlignment(QtCore.Qt.AlignmentFlag.AlignRight|QtCore.Qt.AlignmentFlag.AlignTrailing|QtCore.Qt.AlignmentFlag.AlignVCenter)
         self.label_2.setObjectName("label_2")
         self.gridLayout_Tiles.addWidget(self.label_2, 0, 0, 1, 1)
+        self.checkBox_LOD = QtWidgets.QCheckBox(parent=self.groupBox_Tiles)
+        self.checkBox_LOD.setObjectName("checkBox_LOD")
+        self.gridLayout_Tiles.addWidget(self.checkBox_LOD, 1, 0, 1, 2)
+        self.label_LODLevels = QtWidgets.QLabel(parent=self.groupBox_Tiles)
+        self.label_LODLevels.setAlignment(QtCore.Qt.AlignmentFlag.AlignRight|QtCore.Qt.AlignmentFlag.AlignTrailing|QtCore.Qt.AlignmentFlag.AlignVCenter)
+        self.label_LODLevels.setObjectName("label_LODLevels")
+        self.gridLayout_Tiles.addWidget(self.label_LODLevels, 1, 2, 1, 1)
+        self.spinBox_LODLevels = QtWidgets.QSpinBox(parent=self.groupBox_Tiles)
+        self.spinBox_LODLevels.setMinimumSize(QtCore.QSize(70, 0))
+        self.spinBox_LODLevels.setMinimum(1)
+        self.spinBox_LODLevels.setMaximum(6)
+        self.spinBox_LODLevels.setProperty("value", 3)
+        self.spinBox_LODLevels.setObjectName("spinBox_LODLevels")
+        self.gridLayout_Tiles.addWidget(self.spinBox_LODLevels, 1, 3, 1, 1)
         self.verticalLayout_3.addLayout(self.gridLayout_Tiles)
         self.verticalLayout_2.addWidget(self.groupBox_Tiles)
         spacerItem1 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Expanding)
@@ -332,7 +346,9 @@ class Ui_DEMPropertiesWidget(object):
         DEMPropertiesWidget.setTabOrder(self.checkBox_Shading, self.checkBox_Tiles)
         DEMPropertiesWidget.setTabOrder(self.checkBox_Tiles, self.spinBox_Size)
         DEMPropertiesWidget.setTabOrder(self.spinBox_Size, self.spinBox_Roughening)
-        DEMPropertiesWidget.setTabOrder(self.spinBox_Roughening, self.checkBox_Sides)
+        DEMPropertiesWidget.setTabOrder(self.spinBox_Roughening, self.checkBox_LOD)
+        DEMPropertiesWidget.setTabOrder(self.checkBox_LOD, self.spinBox_LODLevels)
+        DEMPropertiesWidget.setTabOrder(self.spinBox_LODLevels, self.checkBox_Sides)
         DEMPropertiesWidget.setTabOrder(self.checkBox_Sides, self.colorButton_Side)
         DEMPropertiesWidget.setTabOrder(self.colorButton_Side, self.lineEdit_Bottom)
         DEMPropertiesWidget.setTabOrder(self.lineEdit_Bottom, self.checkBox_Frame)
@@ -375,6 +391,10 @@ class Ui_DEMPropertiesWidget(object):
         self.spinBox_Roughening.setToolTip(_translate("DEMPropertiesWidget", "Grid roughness of tiles other than center tile"))
         self.spinBox_Size.setToolTip(_translate("DEMPropertiesWidget", "Number of tiles is square of this value. Should be an odd number."))
         self.label_2.setText(_translate("DEMPropertiesWidget", "Size"))
+        self.checkBox_LOD.setToolTip(_translate("DEMPropertiesWidget", "Export tiles as a quadtree pyramid, which is loaded by level of detail. Web export only."))
+        self.checkBox_LOD.setText(_translate("DEMPropertiesWidget", "Quadtree LOD"))
+        self.label_LODLevels.setText(_translate("DEMPropertiesWidget", "Levels"))
+        self.spinBox_LODLevels.setToolTip(_translate("DEMPropertiesWidget", "Number of levels of the quadtree"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab), _translate("DEMPropertiesWidget", "Main"))
         self.checkBox_Sides.setText(_translate("DEMPropertiesWidget", "Build sides"))
         self.checkBox_Wireframe.setText(_translate("DEMPropertiesWidget", "Add quad wireframe"))
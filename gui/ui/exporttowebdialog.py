@@ -57,6 +57,9 @@ class Ui_ExportToWebDialog(object):
         self.checkBox_LocalMode = QtWidgets.QCheckBox(parent=self.groupBox_General)
         self.checkBox_LocalMode.setObjectName("checkBox_LocalMode")
         self.gridLayout_3.addWidget(self.checkBox_LocalMode, 4, 0, 1, 3)
+        self.checkBox_BinaryBlocks = QtWidgets.QCheckBox(parent=self.groupBox_General)
+        self.checkBox_BinaryBlocks.setObjectName("checkBox_BinaryBlocks")
+        self.gridLayout_3.addWidget(self.checkBox_BinaryBlocks, 5, 0, 1, 3)
         self.verticalLayout_3.addWidget(self.groupBox_General)
         self.groupBox_Template = QtWidgets.QGroupBox(parent=self.tabSettings)
         self.groupBox_Template.setObjectName("groupBox_Template")
@@ -157,6 +160,8 @@ class Ui_ExportToWebDialog(object):
         self.label_4.setText(_translate("ExportToWebDialog", "Page title"))
         self.checkBox_PreserveViewpoint.setText(_translate("ExportToWebDialog", "Preserve the current viewpoint"))
         self.checkBox_LocalMode.setText(_translate("ExportToWebDialog", "Enable the viewer to run locally"))
+        self.checkBox_BinaryBlocks.setToolTip(_translate("ExportToWebDialog", "Vector layer data are written in compact binary files. Not available when the viewer runs locally."))
+        self.checkBox_BinaryBlocks.setText(_translate("ExportToWebDialog", "Write vector data in binary format"))
         self.groupBox_Template.setTitle(_translate("ExportToWebDialog", "Template"))
         self.label_MND2.setText(_translate("ExportToWebDialog", "degrees"))
         self.label_MND.setText(_translate("ExportToWebDialog", "Magnetic North direction"))
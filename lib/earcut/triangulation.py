@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Polygon triangulation backend
+
+Uses the compiled mapbox_earcut module if it is importable, otherwise the bundled
+pure-Python earcut port. Both implement the same algorithm.
+"""
+
+import numpy
+
+from . import earcut as _earcut
+
+try:
+    import mapbox_earcut
+except ImportError:
+    mapbox_earcut = None
+
+
+BACKEND = "mapbox_earcut" if mapbox_earcut else "earcut"
+
+
+def triangulate(coords, ringEnds, polygonEnds, dim=2, keepTriangles=False):
+    """triangulate many polygons at once.
+       coords: flat sequence of vertex coordinates of all rings [x0, y0(, z0), x1, y1(, z1), ...].
+               Only x and y are used for triangulation.
+       ringEnds: cumulative vertex counts, i.e. end vertex index (exclusive) of each ring
+       polygonEnds: cumulative ring counts, i.e. end ring index (exclusive) of each polygon.
+                    First ring of a polygon is the outer boundary and the others are holes.
+       dim: number of coordinates per vertex
+       keepTriangles: if True, a polygon that consists of a single closed triangle ring is returned as is
+       returns a NumPy uint32 array of indices into the vertices. Each three indices make a triangle."""
+    v = numpy.asarray(coords, dtype=numpy.float64).reshape(-1, dim)
+    ringEnds = numpy.asarray(ringEnds, dtype=numpy.uint32)
+
+    if mapbox_earcut:
+        xy = numpy.ascontiguousarray(v[:, :2])
+
+        def func(start, end, ends):
+            return mapbox_earcut.triangulate_float64(xy[start:end], (ends - start).astype(numpy.uint32))
+    else:
+        def func(start, end, ends):
+            return _earcut.earcut(v[start:end].ravel().tolist(), (ends[:-1] - start).tolist(), dim)
+
+    indices = []
+    ringStart = 0
+    for ringEnd in polygonEnds:
+        if ringEnd == ringStart:
+            continue
+
+        start = int(ringEnds[ringStart - 1]) if ringStart else 0
+        ends = ringEnds[ringStart:ringEnd]
+        end = int(ends[-1])
+
+        if keepTriangles and ringEnd - ringStart == 1 and end - start == 4:
+            indices.append(numpy.arange(start, start + 3, dtype=numpy.uint32))
+        else:
+            indices.append(numpy.asarray(func(start, end, ends), dtype=numpy.uint32) + start)
+
+        ringStart = ringEnd
+
+    if not indices:
+        return numpy.empty(0, dtype=numpy.uint32)
+    return numpy.concatenate(indices)
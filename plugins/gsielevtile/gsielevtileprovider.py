@@ -13,23 +13,24 @@ import math
 import numpy
 import struct
 
-from osgeo import gdal
+from osgeo import gdal, gdal_array
 from qgis.PyQt.QtCore import QSettings
-from qgis.core import Qgis, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsPointXY, QgsRectangle, QgsProject
+from qgis.core import Qgis, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsGeometry, QgsPointXY, QgsRectangle, QgsProject
 
-from .downloader import Downloader
+from .tilestore import NODATA_VALUE, TILE_SIZE, TILE_URL, mosaic, tileStore
+from ...core.demprovider import DEMWindow, pointsBoundingBox
 from ...core.geometry import GridGeometry
 from ...utils import logMessage
 
-TILE_SIZE = 256
 TSIZE1 = 20037508.342789244
-NODATA_VALUE = 0
-NODATA_VALUE_BYTES = b"0"
 ZMAX = 14
+MAX_TILES = 128     # max number of tiles for a dataset
 
 
 class GSIElevTileProvider:
 
+    urlTemplate = TILE_URL      # can be a path template of a local tile directory, e.g. for offline tests
+
     def __init__(self, dest_wkt):
         self.dest_wkt = dest_wkt
 
@@ -43,9 +44,9 @@ class GSIElevTileProvider:
         # approximate bbox of this data
         self.boundingbox = QgsRectangle(13667807, 2320477, 17230031, 5713298)
 
-        self.downloader = Downloader()
-        self.downloader.userAgent = "QGIS/{0} Qgis2threejs GSIElevTileProvider".format(Qgis.QGIS_VERSION_INT)  # will be overwritten in QgsNetworkAccessManager::createRequest() since 2.2
-        self.downloader.DEFAULT_CACHE_EXPIRATION = QSettings().value("/qgis/defaultTileExpiry", 24, type=int)
+        self.store = tileStore(self.urlTemplate)
+        self.store.userAgent = "QGIS/{0} Qgis2threejs GSIElevTileProvider".format(Qgis.QGIS_VERSION_INT)  # will be overwritten in QgsNetworkAccessManager::createRequest()
+        self.store.expiry = QSettings().value("/qgis/defaultTileExpiry", 24, type=int) * 3600     # hours -> seconds
 
         self.driver = gdal.GetDriverByName("MEM")
         self.last_dataset = None
@@ -74,14 +75,54 @@ class GSIElevTileProvider:
         return self._read(ds, width, height, geotransform)
 
     def readValues(self, width, height, extent):
-        """read data into a list"""
-        return struct.unpack("f" * width * height, self.read(width, height, extent))
+        """read data into a NumPy float32 array"""
+        return numpy.frombuffer(self.read(width, height, extent), dtype=numpy.float32).copy()
+
+    def readInto(self, values, extent):
+        """read data into a 2D NumPy float32 array with (rows, cols) shape"""
+        height, width = values.shape
+        values[:] = numpy.frombuffer(self.read(width, height, extent), dtype=numpy.float32).reshape((height, width))
 
     def readAsGridGeometry(self, width, height, extent):
         return GridGeometry(extent,
                             width - 1, height - 1,
                             self.readValues(width, height, extent))
 
+    def readWindow(self, rect):
+        """read values of a window that covers a rectangle at about the resolution of max zoom level tiles"""
+        # grid resolution in the destination CRS, which corresponds to the tile resolution of max zoom level
+        mpp = TSIZE1 * 2 / TILE_SIZE / 2 ** ZMAX
+        c = rect.center()
+        pt = self.transform.transform(c)
+        pt = self.transform.transform(QgsPointXY(pt.x() + mpp, pt.y() + mpp), QgsCoordinateTransform.ReverseTransform)
+        xres, yres = (abs(pt.x() - c.x()) or 1, abs(pt.y() - c.y()) or 1)
+
+        return DEMWindow.read(rect, xres, yres, self._readGrid)
+
+    def _readGrid(self, cols, rows, x0, y0, xres, yres):
+        mpp = TSIZE1 * 2 / TILE_SIZE / 2 ** ZMAX
+        geotransform = DEMWindow.geotransform(x0, y0, xres, yres)
+
+        # calculate bounding box of the window in EPSG:3857
+        geometry = QgsGeometry.fromRect(QgsRectangle(geotransform[0], geotransform[3] - rows * yres,
+                                                     geotransform[0] + cols * xres, geotransform[3]))
+        geometry.transform(self.transform)
+        merc_rect = geometry.boundingBox()
+
+        if self.boundingbox.intersects(merc_rect):
+            ds = self.getDataset(merc_rect.xMinimum(), merc_rect.yMinimum(), merc_rect.xMaximum(), merc_rect.yMaximum(), mpp)
+            values = numpy.frombuffer(self._read(ds, cols, rows, geotransform), dtype=numpy.float32).reshape((rows, cols))
+        else:
+            values = numpy.full((rows, cols), NODATA_VALUE, dtype=numpy.float32)
+
+        return values
+
+    def readValuesAt(self, xs, ys):
+        """get values at specified positions. returns a NumPy array"""
+        if len(xs) == 0:
+            return numpy.empty(0)
+        return self.readWindow(QgsRectangle(*pointsBoundingBox(xs, ys))).valuesAt(xs, ys)
+
     def readValue(self, x, y):
         """Get value at specified position using 1px * 1px memory raster. The value is calculated using a tile of max zoom level"""
         # coordinate transformation into EPSG:3857
@@ -115,6 +156,33 @@ class GSIElevTileProvider:
         band = warped_ds.GetRasterBand(1)
         return band.ReadRaster(0, 0, width, height, buf_type=gdal.GDT_Float32)
 
+    def prefetch(self, extent):
+        """fetches tiles of max zoom level that cover the extent into the tile store, so that following
+           reads of elevation at points (e.g. for vector features) do not wait for each tile"""
+        geometry = extent.geometry()
+        geometry.transform(self.transform)
+        merc_rect = geometry.boundingBox()
+        if not self.boundingbox.intersects(merc_rect):
+            return
+
+        zoom, ulx, uly, lrx, lry = self.tileRange(merc_rect.xMinimum(), merc_rect.yMinimum(), merc_rect.xMaximum(), merc_rect.yMaximum(), ZMAX)
+        if (lrx - ulx + 1) * (lry - uly + 1) > MAX_TILES:
+            logMessage("Too many tiles to prefetch. Skipped.")
+            return
+
+        self.store.prefetch(zoom, ulx, uly, lrx, lry)
+
+    @staticmethod
+    def tileRange(xmin, ymin, xmax, ymax, zoom):
+        """returns zoom level and tile range (yOrigin is top) that covers a rectangle in EPSG:3857"""
+        size = TSIZE1 / 2 ** (zoom - 1)
+        matrixSize = 2 ** zoom
+        ulx = max(0, int((xmin + TSIZE1) / size))
+        uly = max(0, int((TSIZE1 - ymax) / size))
+        lrx = min(int((xmax + TSIZE1) / size), matrixSize - 1)
+        lry = min(int((TSIZE1 - ymin) / size), matrixSize - 1)
+        return zoom, ulx, uly, lrx, lry
+
     def getDataset(self, xmin, ymin, xmax, ymax, mapUnitsPerPixel):
         # calculate zoom level
         mpp1 = TSIZE1 / TILE_SIZE
@@ -122,18 +190,14 @@ class GSIElevTileProvider:
         zoom = max(0, min(zoom, ZMAX))
 
         # calculate tile range (yOrigin is top)
+        zoom, ulx, uly, lrx, lry = self.tileRange(xmin, ymin, xmax, ymax, zoom)
         size = TSIZE1 / 2 ** (zoom - 1)
-        matrixSize = 2 ** zoom
-        ulx = max(0, int((xmin + TSIZE1) / size))
-        uly = max(0, int((TSIZE1 - ymax) / size))
-        lrx = min(int((xmax + TSIZE1) / size), matrixSize - 1)
-        lry = min(int((TSIZE1 - ymin) / size), matrixSize - 1)
 
         cols = lrx - ulx + 1
         rows = lry - uly + 1
 
         # download count limit
-        if cols * rows > 128:
+        if cols * rows > MAX_TILES:
             logMessage("Number of tiles to fetch is too large!")
             width = height = 1
             return self.driver.Create("", width, height, 1, gdal.GDT_Float32, [])
@@ -141,50 +205,15 @@ class GSIElevTileProvider:
         if self.last_dataset and self.last_dataset[0] == [zoom, ulx, uly, lrx, lry]:    # if same as last tile set, return cached dataset
             return self.last_dataset[1]
 
-        urltmpl = "https://cyberjapandata.gsi.go.jp/xyz/dem/{z}/{x}/{y}.txt"
-        #urltmpl = "http://localhost/xyz/dem/{z}/{x}/{y}.txt"
-        tiles = self.fetchFiles(urltmpl, zoom, ulx, uly, lrx, lry)
+        tiles = self.store.tiles(zoom, ulx, uly, lrx, lry)
 
-        # create a memory dataset
-        width = cols * TILE_SIZE
-        height = rows * TILE_SIZE
+        # create a dataset that refers to the mosaic array without copying
         res = size / TILE_SIZE
         geotransform = [ulx * size - TSIZE1, res, 0, TSIZE1 - uly * size, 0, -res]
 
-        #mem_driver = gdal.GetDriverByName("GTiff")
-        #ds = mem_driver.Create("D:/fetched_tile.tif", width, height, 1, gdal.GDT_Float32, [])
-
-        ds = self.driver.Create("", width, height, 1, gdal.GDT_Float32, [])
+        ds = gdal_array.OpenArray(mosaic(tiles, cols, rows))
         ds.SetProjection(str(self.crs3857.toWkt()))
         ds.SetGeoTransform(geotransform)
 
-        band = ds.GetRasterBand(1)
-        for i, tile in enumerate(tiles):
-            if tile:
-                col = i % cols
-                row = i // cols
-                band.WriteRaster(col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE, tile)
-
-        ds.FlushCache()
-
         self.last_dataset = [[zoom, ulx, uly, lrx, lry], ds]   # cache dataset
         return ds
-
-    def fetchFiles(self, urltmpl, zoom, xmin, ymin, xmax, ymax):
-        downloadTimeout = 60
-
-        urls = []
-        for y in range(ymin, ymax + 1):
-            for x in range(xmin, xmax + 1):
-                urls.append(urltmpl.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(zoom)))
-        files = self.downloader.fetchFiles(urls, downloadTimeout)
-
-        for url in urls:
-            data = files.get(url)
-            if data:
-                array = numpy.fromstring(data.replace(b"e", NODATA_VALUE_BYTES).replace(b"\n", b","), dtype=numpy.float32, sep=",")
-            else:
-                array = numpy.empty(TILE_SIZE * TILE_SIZE, dtype=numpy.float32)
-                array.fill(NODATA_VALUE)
-
-            yield array.tobytes()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import hashlib
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+from qgis.PyQt.QtCore import QUrl
+from qgis.PyQt.QtNetwork import QNetworkRequest
+from qgis.core import QgsBlockingNetworkRequest
+
+from ...conf import GSI_TILE_CONNECTIONS, GSI_TILE_STORE_MEM_SIZE, GSI_TILE_STORE_SIZE
+from ...core.lrucache import LRUCache
+from ...utils import cacheDir, logMessage
+
+TILE_SIZE = 256
+NODATA_VALUE = 0
+NODATA_VALUE_BYTES = b"0"
+TILE_URL = "https://cyberjapandata.gsi.go.jp/xyz/dem/{z}/{x}/{y}.txt"
+
+_DECODE_TABLE = bytes.maketrans(b"e\n", NODATA_VALUE_BYTES + b",")   # "e" (no data) -> nodata value, line break -> separator
+
+_tileStores = {}
+_lock = threading.Lock()
+
+
+def tileStore(urlTemplate=TILE_URL):
+    """returns the tile store for a URL template (or a local path template), which is shared by providers"""
+    with _lock:
+        store = _tileStores.get(urlTemplate)
+        if store is None:
+            subdir = hashlib.sha1(urlTemplate.encode("utf-8")).hexdigest()[:16]
+            store = _tileStores[urlTemplate] = TileStore(urlTemplate, GSI_TILE_STORE_MEM_SIZE, GSI_TILE_STORE_SIZE,
+                                                         cacheDir("gsielevtile", subdir), GSI_TILE_CONNECTIONS)
+        return store
+
+
+def decodeTile(data):
+    """decodes a tile in text format (comma separated values, "e" for no data) into a float32 array.
+       Values of GSI tiles have two decimal places. If all values do, they are parsed as integers
+       in centimeters, which is much faster than parsing floating point numbers."""
+    c = numpy.frombuffer(data, dtype=numpy.uint8)
+    dots = numpy.flatnonzero(c == 0x2E)
+    fixed = (len(dots) + numpy.count_nonzero(c == 0x65) == TILE_SIZE * TILE_SIZE)
+    if fixed and len(dots):
+        # each decimal point should be followed by two digits and a separator (or the end of data)
+        fixed = bool(dots[-1] + 2 < len(c))
+        if fixed:
+            d1, d2 = c[dots + 1], c[dots + 2]
+            p = dots[dots + 3 < len(c)] + 3
+            digits = numpy.all((d1 >= 0x30) & (d1 <= 0x39) & (d2 >= 0x30) & (d2 <= 0x39))
+            fixed = bool(digits and numpy.all((c[p] == 0x2C) | (c[p] == 0x0A)))
+
+    if fixed:
+        array = (numpy.fromstring(data.translate(_DECODE_TABLE, b"."), dtype=numpy.int32, sep=",") / 100).astype(numpy.float32)
+    else:
+        array = numpy.fromstring(data.translate(_DECODE_TABLE), dtype=numpy.float32, sep=",")
+
+    if array.size != TILE_SIZE * TILE_SIZE:
+        raise ValueError("invalid tile size: {}".format(array.size))
+    return array
+
+
+def mosaic(tiles, cols, rows):
+    """returns a 2D float32 array made of tiles in row-major order. Tiles that are None or empty are filled with nodata value."""
+    array = numpy.full((rows * TILE_SIZE, cols * TILE_SIZE), NODATA_VALUE, dtype=numpy.float32)
+    for i, tile in enumerate(tiles):
+        if tile is not None and tile.size:
+            row, col = divmod(i, cols)
+            array[row * TILE_SIZE:(row + 1) * TILE_SIZE, col * TILE_SIZE:(col + 1) * TILE_SIZE] = tile.reshape((TILE_SIZE, TILE_SIZE))
+    return array
+
+
+class TileStore(LRUCache):
+    """persistent store of decoded elevation tiles. Each tile is kept as a float32 array with the time
+    it was fetched in a memory tier and a disk tier, both evicted in LRU order. Tiles that do not exist
+    on the server are stored as empty arrays so that they are not requested again until they expire."""
+
+    NAME = "GSI elevation tile store"
+
+    def __init__(self, urlTemplate, memSize, diskSize, directory=None, maxConnections=4, userAgent="", expiry=0):
+        """urlTemplate: URL of tiles with {z}, {x} and {y} placeholders. A file path template can also be given.
+           expiry: seconds after which a tile is fetched again. 0 for no expiry"""
+        LRUCache.__init__(self, memSize, diskSize, directory)
+        self.urlTemplate = urlTemplate
+        self.maxConnections = max(1, maxConnections)
+        self.userAgent = userAgent
+        self.expiry = expiry
+
+        self._fetchLock = threading.Lock()
+
+    @staticmethod
+    def tileKey(z, x, y):
+        return "{}-{}-{}".format(z, x, y)
+
+    def tile(self, z, x, y):
+        """returns a stored tile (an empty array if the tile does not exist) or None if it has not been fetched or has expired"""
+        return self._fresh(self.get(self.tileKey(z, x, y)))
+
+    def tiles(self, z, xmin, ymin, xmax, ymax):
+        """returns a list of tiles in the range in row-major order. Tiles that are not in the store are fetched
+        concurrently with up to maxConnections requests. None is given for a tile that could not be fetched."""
+        keys = [(x, y) for y in range(ymin, ymax + 1) for x in range(xmin, xmax + 1)]
+        tiles = {k: self.tile(z, *k) for k in keys}
+
+        missing = [k for k, t in tiles.items() if t is None]
+        if missing:
+            with self._fetchLock:
+                with ThreadPoolExecutor(max_workers=min(self.maxConnections, len(missing))) as executor:
+                    for k, t in zip(missing, executor.map(lambda k: self.fetch(z, *k), missing)):
+                        tiles[k] = t
+
+        return [tiles[k] for k in keys]
+
+    def prefetch(self, z, xmin, ymin, xmax, ymax):
+        """fetches tiles in the range that are not in the store"""
+        self.tiles(z, xmin, ymin, xmax, ymax)
+
+    def fetch(self, z, x, y):
+        """fetches a tile and stores it. Safe to call from worker threads.
+           If an expired tile cannot be fetched again, the expired tile is returned."""
+        key = self.tileKey(z, x, y)
+        entry = self.get(key)
+        tile = self._fresh(entry)
+        if tile is not None:
+            return tile
+
+        url = self.urlTemplate.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(z))
+        data, notFound = self._load(url)
+
+        if data is not None:
+            try:
+                tile = decodeTile(data)
+            except ValueError as e:
+                logMessage("Failed to decode tile {}: {}".format(url, e), warning=True)
+                return None
+
+        elif notFound:
+            tile = numpy.empty(0, dtype=numpy.float32)
+
+        else:
+            return entry[1] if entry else None
+
+        if entry:
+            self.remove(key)    # expired
+
+        self.put(key, (time.time(), tile))
+        return tile
+
+    def _fresh(self, entry):
+        """returns the tile of a stored entry, or None if the entry is None or has expired"""
+        if entry is None:
+            return None
+
+        fetched, tile = entry
+        if self.expiry and time.time() - fetched > self.expiry:
+            return None
+        return tile
+
+    def _load(self, url):
+        """returns a tuple of tile data (or None) and whether the tile does not exist"""
+        if "://" not in url:
+            # local tile directory
+            try:
+                with open(url, "rb") as f:
+                    return f.read(), False
+            except FileNotFoundError:
+                return None, True
+            except OSError as e:
+                logMessage("Failed to read tile {}: {}".format(url, e), warning=True)
+                return None, False
+
+        request = QNetworkRequest(QUrl(url))
+        if self.userAgent:
+            request.setRawHeader(b"User-Agent", self.userAgent.encode("ascii", "ignore"))
+
+        blockingRequest = QgsBlockingNetworkRequest()
+        err = blockingRequest.get(request)
+        reply = blockingRequest.reply()
+        if err == QgsBlockingNetworkRequest.ErrorCode.NoError:
+            return bytes(reply.content()), False
+
+        status = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        if status == 404:
+            return None, True
+
+        logMessage("Failed to fetch tile {}: {}".format(url, blockingRequest.errorMessage()), warning=True)
+        return None, False
+
+    def _dataSize(self, entry):
+        return entry[1].nbytes + 8
+
+    def _toBytes(self, entry):
+        return struct.pack("<d", entry[0]) + entry[1].tobytes()
+
+    def _fromBytes(self, b):
+        if len(b) < 8:
+            return None
+        return struct.unpack_from("<d", b)[0], numpy.frombuffer(b, dtype=numpy.float32, offset=8)
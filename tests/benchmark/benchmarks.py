@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""benchmark cases of builder stages. Run them with run_benchmark.py"""
+
+import atexit
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+from copy import deepcopy
+
+import numpy
+from qgis.PyQt.QtCore import QSize
+from qgis.core import QgsFeature, QgsGeometry, QgsPointXY, QgsProject, QgsRectangle, QgsVectorLayer, QgsWkbTypes
+
+from Qgis2threejs.core.const import DEMMtlType
+from Qgis2threejs.core.export.export import ThreeJSExporter
+from Qgis2threejs.core.geometry import GridGeometry, TINGeometry
+from Qgis2threejs.core.mapextent import MapExtent
+from Qgis2threejs.conf import TEXTURE_CACHE_DISK_SIZE, TEXTURE_CACHE_MEM_SIZE, WARP_CACHE_DISK_SIZE, WARP_CACHE_MEM_SIZE
+from Qgis2threejs.core.texturecache import TextureCache, setTextureCache
+from Qgis2threejs.core.warpcache import WarpCache, setWarpCache
+from Qgis2threejs.tests.utilities import dataPath, loadProject, outputPath
+
+TEX_WIDTH, TEX_HEIGHT = (1024, 1024)
+
+DEM_LAYER = "dem_srtm30"
+
+# grid size levels (horizontalSlider_DEMSize) and feature counts
+DEM_SIZE_LEVELS = [1, 2, 4, 8]
+FEATURE_COUNTS = [100, 1000, 10000]
+QUICK_DEM_SIZE_LEVELS = [1, 2]
+QUICK_FEATURE_COUNTS = [100, 1000]
+
+# source layers of scaled-up vector layers. object types are set in scene1.qto3settings
+VECTOR_LAYERS = ["polygon1",            # Extruded
+                 "polygon2",            # Overlay (split with DEM grid)
+                 "ne_10m_railroads"]    # Wall
+
+
+_cacheDir = None
+
+
+def clearCaches():
+    """replaces shared caches with empty ones in a temporary directory so that every run starts cold.
+       Cache files of the user are kept."""
+    global _cacheDir
+    if _cacheDir is None:
+        _cacheDir = tempfile.mkdtemp(prefix="q3d_benchmark_")
+        atexit.register(shutil.rmtree, _cacheDir, True)
+
+    shutil.rmtree(_cacheDir, True)
+    setWarpCache(WarpCache(WARP_CACHE_MEM_SIZE, WARP_CACHE_DISK_SIZE, os.path.join(_cacheDir, "dem")))
+    setTextureCache(TextureCache(TEXTURE_CACHE_MEM_SIZE, TEXTURE_CACHE_DISK_SIZE, os.path.join(_cacheDir, "texture")))
+    GridGeometry.clearSplitCache()
+
+
+def directorySize(path):
+    return sum(os.path.getsize(os.path.join(root, fn)) for root, _, fns in os.walk(path) for fn in fns)
+
+
+def scaledLayer(srcLayer, count, seed=0):
+    """returns a memory layer with count features, which are copies of the features of srcLayer
+       translated randomly within the layer extent. Copies are not identical, so no geometry cache hits."""
+    uri = "{}?crs={}".format(QgsWkbTypes.displayString(srcLayer.wkbType()), srcLayer.crs().authid())
+    layer = QgsVectorLayer(uri, "{}_x{}".format(srcLayer.name(), count), "memory")
+    pr = layer.dataProvider()
+    pr.addAttributes(srcLayer.fields().toList())
+    layer.updateFields()
+
+    src = list(srcLayer.getFeatures())
+    ext = srcLayer.extent()
+    rng = random.Random(seed)
+
+    feats = []
+    for i in range(count):
+        f = QgsFeature(src[i % len(src)])
+        g = QgsGeometry(f.geometry())
+        g.translate(rng.uniform(-0.5, 0.5) * ext.width(), rng.uniform(-0.5, 0.5) * ext.height())
+        f.setGeometry(g)
+        feats.append(f)
+
+    pr.addFeatures(feats)
+    layer.updateExtents()
+    layer.setRenderer(srcLayer.renderer().clone())
+    return layer
+
+
+def starPolygon(cx, cy, radius, vertices, hole=True, rng=None):
+    """returns a star-shaped polygon with a square hole"""
+    rng = rng or random.Random(0)
+    ring = []
+    for i in range(vertices):
+        a = 2 * math.pi * i / vertices
+        r = radius * (1 if i % 2 else rng.uniform(0.4, 0.8))
+        ring.append(QgsPointXY(cx + r * math.cos(a), cy + r * math.sin(a)))
+    ring.append(ring[0])
+
+    rings = [ring]
+    if hole:
+        h = radius * 0.15
+        rings.append([QgsPointXY(cx - h, cy - h), QgsPointXY(cx - h, cy + h), QgsPointXY(cx + h, cy + h),
+                      QgsPointXY(cx + h, cy - h), QgsPointXY(cx - h, cy - h)])
+    return QgsGeometry.fromPolygonXY(rings)
+
+
+def randomPolygons(count, vertices, extent, seed=0):
+    rng = random.Random(seed)
+    radius = min(extent.width(), extent.height()) / 20
+    return [starPolygon(rng.uniform(extent.xMinimum() + radius, extent.xMaximum() - radius),
+                        rng.uniform(extent.yMinimum() + radius, extent.yMaximum() - radius),
+                        radius, vertices, rng=rng) for _ in range(count)]
+
+
+class Case:
+
+    """a benchmark case. prepare() is called before each run and is not timed.
+    run() returns size of the output in bytes."""
+
+    def __init__(self, stage, **params):
+        self.stage = stage
+        self.params = params
+
+    @property
+    def name(self):
+        return self.stage + "".join("_{}{}".format(k, v) for k, v in self.params.items())
+
+    def prepare(self):
+        clearCaches()
+
+    def run(self):
+        return 0
+
+    def cleanup(self):
+        pass
+
+
+class ExportCase(Case):
+
+    """exports scene1 to a web page, optionally with only some layers visible"""
+
+    def __init__(self, stage, layers=None, demSizeLevel=None, scaleLayer=None, count=None, **params):
+        """layers: names of layers to export. If None, layers visible in scene1.qto3settings are exported.
+           scaleLayer: name of a vector layer that is replaced with a memory layer with count features"""
+        if demSizeLevel is not None:
+            params["demSizeLevel"] = demSizeLevel
+        if scaleLayer is not None:
+            params["layer"] = scaleLayer
+            params["features"] = count
+
+        Case.__init__(self, stage, **params)
+        self.layers = layers
+        self.demSizeLevel = demSizeLevel
+        self.scaleLayer = scaleLayer
+        self.count = count
+
+        self.outPath = outputPath("benchmark", self.name, "index.html")
+        self.exporter = None
+
+    def prepare(self):
+        Case.prepare(self)
+
+        outDir = os.path.dirname(self.outPath)
+        if os.path.exists(outDir):
+            shutil.rmtree(outDir)
+        os.makedirs(outDir)
+
+        mapSettings = loadProject(dataPath("testproject1.qgs"))
+        ext = mapSettings.extent()
+        MapExtent(ext.center(), ext.height(), ext.height(), 0).toMapSettings(mapSettings)
+        mapSettings.setOutputSize(QSize(TEX_WIDTH, TEX_HEIGHT))
+
+        exporter = ThreeJSExporter()
+        exporter.loadSettings(dataPath("scene1.qto3settings"))
+        exporter.setMapSettings(mapSettings)
+        settings = exporter.settings
+
+        layers = self.layers
+        if self.scaleLayer:
+            srcLayer = QgsProject.instance().mapLayersByName(self.scaleLayer)[0]
+            mapLayer = scaledLayer(srcLayer, self.count)
+            QgsProject.instance().addMapLayer(mapLayer)
+
+            srcProps = settings.getLayer(srcLayer.id()).properties
+            settings.updateLayers()
+            settings.getLayer(mapLayer.id()).properties = deepcopy(srcProps)
+            layers = [mapLayer.name()]
+
+        if layers is not None:
+            for layer in settings.layers():
+                layer.visible = (layer.name in layers)
+
+        if self.demSizeLevel is not None:
+            for layer in settings.layers():
+                if layer.name == DEM_LAYER:
+                    p = layer.properties
+                    p["horizontalSlider_DEMSize"] = self.demSizeLevel
+
+                    # solid color material, so that texture rendering is not measured
+                    p["materials"] = [{"id": "benchmark", "name": "color", "type": DEMMtlType.COLOR,
+                                       "properties": {"colorButton_Color": [192, 192, 192, 255], "spinBox_Opacity": 100}}]
+                    p["mtlId"] = "benchmark"
+
+        self.exporter = exporter
+
+    def run(self):
+        assert self.exporter.export(self.outPath), "export failed"
+        return directorySize(os.path.dirname(self.outPath))
+
+    def cleanup(self):
+        self.exporter = None
+
+
+class TINCase(Case):
+
+    """triangulates synthetic polygons with TINGeometry"""
+
+    def __init__(self, count, vertices):
+        Case.__init__(self, "tin", polygons=count, vertices=vertices)
+        self.geoms = None
+
+    def prepare(self):
+        Case.prepare(self)
+        if self.geoms is None:
+            self.geoms = randomPolygons(self.params["polygons"], self.params["vertices"], QgsRectangle(0, 0, 10000, 10000))
+
+    def run(self):
+        z_func = lambda xs, ys: numpy.zeros(len(xs))
+        transform_func = lambda x, y, z: [x, y, z]
+
+        size = 0
+        for g in self.geoms:
+            tin = TINGeometry.fromQgsGeometry(g, z_func, transform_func, use_earcut=True)
+            size += len(json.dumps(tin.toDict()))
+        return size
+
+
+class SplitPolygonCase(Case):
+
+    """splits synthetic polygons with a DEM grid (Overlay polygons)"""
+
+    def __init__(self, count, segments):
+        Case.__init__(self, "split_polygon", polygons=count, segments=segments)
+        self.grid = self.geoms = None
+
+    def prepare(self):
+        Case.prepare(self)      # split results are cached per polygon and grid
+        if self.grid is None:
+            segments = self.params["segments"]
+            extent = QgsRectangle(0, 0, 10000, 10000)
+            y, x = numpy.mgrid[0:segments + 1, 0:segments + 1]
+            values = (numpy.sin(x / 8) * numpy.cos(y / 8) * 100).ravel()
+
+            self.grid = GridGeometry(extent, segments, segments, values)
+            self.geoms = randomPolygons(self.params["polygons"], 64, extent)
+
+    def run(self):
+        size = 0
+        for g in self.geoms:
+            size += len(self.grid.splitPolygon(g).asWkb())
+        return size
+
+
+def cases(quick=False, stages=None):
+    """returns a list of benchmark cases. stages: names of stages to include, or None for all"""
+    levels = QUICK_DEM_SIZE_LEVELS if quick else DEM_SIZE_LEVELS
+    counts = QUICK_FEATURE_COUNTS if quick else FEATURE_COUNTS
+
+    items = [ExportCase("export")]
+    items += [ExportCase("dem_grid", layers=[DEM_LAYER], demSizeLevel=level) for level in levels]
+    items += [ExportCase("feature_blocks", scaleLayer=name, count=count) for name in VECTOR_LAYERS for count in counts]
+    items += [TINCase(count, vertices) for count in counts for vertices in [16, 256]]
+    items += [SplitPolygonCase(100, segments) for segments in ([64, 256] if quick else [64, 256, 1024])]
+
+    if stages:
+        items = [c for c in items if c.stage in stages]
+    return items
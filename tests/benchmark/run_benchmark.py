@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""headless benchmark of builder stages
+
+    python run_benchmark.py [-q] [-r REPEAT] [-s STAGE ...] [-o results.json] [-c baseline.json]
+
+Each case is run REPEAT times with cold caches. Wall time (min and median), peak RSS and output size
+are written to a JSON file, which can be given to --compare in a later run to report differences."""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+plugin_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RESULT_VERSION = 1
+
+
+def resetPeakRss():
+    """resets peak RSS of this process if possible (Linux)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peakRss():
+    """returns peak RSS of this process in bytes, or None if not available"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def gitRevision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=plugin_dir,
+                                       stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spanTotals(tracer):
+    """returns total time of spans by name in seconds"""
+    totals = {}
+    for e in tracer.events():
+        if e["ph"] == "X":
+            totals[e["name"]] = totals.get(e["name"], 0) + e["dur"] / 1e6
+    return {name: round(t, 6) for name, t in sorted(totals.items())}
+
+
+def runCase(case, repeat, spans=True):
+    from Qgis2threejs.utils.trace import tracer
+
+    times = []
+    size = peak = None
+    perCase = False
+    for i in range(repeat):
+        case.prepare()
+
+        perCase = resetPeakRss()
+        t0 = time.perf_counter()
+        size = case.run()
+        times.append(time.perf_counter() - t0)
+
+        rss = peakRss()
+        if rss is not None:
+            peak = rss if peak is None else max(peak, rss)
+
+    result = {
+        "name": case.name,
+        "stage": case.stage,
+        "params": case.params,
+        "times": [round(t, 6) for t in times],
+        "min": round(min(times), 6),
+        "median": round(statistics.median(times), 6),
+        "peakRss": peak,
+        "peakRssScope": "case" if perCase else "process",     # peak RSS cannot be reset on some platforms
+        "outputSize": size
+    }
+
+    if spans:
+        # an extra run with tracing on for breakdown by span. It is not included in timing
+        case.prepare()
+        tracer().start()
+        try:
+            case.run()
+        finally:
+            tracer().stop()
+        result["spans"] = spanTotals(tracer())
+        tracer().clear()
+
+    case.cleanup()
+    return result
+
+
+def compare(results, baseline, threshold):
+    """prints differences from baseline results. returns number of cases that got slower than threshold (ratio)"""
+    base = {r["name"]: r for r in baseline["results"]}
+    print("\n{:<48} {:>10} {:>10} {:>8} {:>8} {:>8}".format("case", "base (s)", "new (s)", "time", "rss", "size"))
+
+    def ratio(a, b):
+        return "{:.2f}".format(b / a) if a and b is not None else "-"
+
+    regressions = 0
+    for r in results:
+        b = base.get(r["name"])
+        if b is None:
+            print("{:<48} {:>10} {:>10.3f}".format(r["name"], "-", r["median"]))
+            continue
+
+        mark = ""
+        if b["median"] and r["median"] / b["median"] > threshold:
+            regressions += 1
+            mark = "  <-- slower"
+
+        print("{:<48} {:>10.3f} {:>10.3f} {:>8} {:>8} {:>8}{}".format(r["name"], b["median"], r["median"],
+                                                                      ratio(b["median"], r["median"]),
+                                                                      ratio(b.get("peakRss"), r.get("peakRss")),
+                                                                      ratio(b.get("outputSize"), r.get("outputSize")),
+                                                                      mark))
+    return regressions
+
+
+def runBenchmark(args):
+    from qgis.core import Qgis
+    from Qgis2threejs import conf
+    conf.DEBUG_MODE = 0
+
+    from Qgis2threejs.tests.benchmark.benchmarks import cases
+
+    results = []
+    for case in cases(args.quick, args.stage):
+        print("{} ...".format(case.name), end=" ", flush=True)
+        r = runCase(case, args.repeat, not args.no_spans)
+        print("{:.3f}s (min {:.3f}s), peak RSS {} MB, output {} KB".format(
+            r["median"], r["min"],
+            "-" if r["peakRss"] is None else r["peakRss"] // (1024 * 1024),
+            (r["outputSize"] or 0) // 1024))
+        results.append(r)
+
+    data = {
+        "version": RESULT_VERSION,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "revision": gitRevision(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "qgis": Qgis.version(),
+        "repeat": args.repeat,
+        "results": results
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        print("Results were written to {}.".format(args.output))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Qgis2threejs builder benchmark")
+    parser.add_argument("-q", "--quick", action="store_true", help="run smaller grid sizes and feature counts only")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="number of timed runs of each case")
+    parser.add_argument("-s", "--stage", nargs="*", help="stages to run (export, dem_grid, feature_blocks, tin, split_polygon)")
+    parser.add_argument("-o", "--output", help="JSON file to write results to")
+    parser.add_argument("-c", "--compare", help="JSON file of baseline results to compare with")
+    parser.add_argument("-t", "--threshold", type=float, default=1.1,
+                        help="ratio of median time to baseline over which a case is reported as a regression")
+    parser.add_argument("--no-spans", action="store_true", help="skip the traced run for breakdown by span")
+    args = parser.parse_args()
+
+    # no display is needed
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    from qgis.PyQt.QtCore import Qt
+    from qgis.core import QgsApplication
+    from qgis.testing import start_app
+
+    sys.path.append(os.path.dirname(plugin_dir))
+
+    QgsApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
+    QGISAPP = start_app()
+    sys.stdout.flush()
+
+    sys.exit(runBenchmark(args))
@@ -3,13 +3,20 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 # begin: 2018-11-27
 
+import json
+import math
+import os
+import tempfile
 from qgis.PyQt.QtCore import QEventLoop, QFileInfo, QSize, QTimer, QUrl
 from qgis.PyQt.QtGui import QImage, QPainter
 from qgis.PyQt.QtWebKitWidgets import QWebPage
 from qgis.testing import unittest
 
+from Qgis2threejs.core.build.vector import binary_block
 from Qgis2threejs.core.export.export import ThreeJSExporter, ImageExporter, ModelExporter
 from Qgis2threejs.core.mapextent import MapExtent
+from Qgis2threejs.core.texturecache import TextureCache, setTextureCache
+from Qgis2threejs.core.warpcache import WarpCache, setWarpCache
 from Qgis2threejs.tests.utilities import dataPath, expectedDataPath, outputPath, loadProject
 
 OUT_WIDTH, OUT_HEIGHT = (1024, 768)
@@ -99,6 +106,179 @@ class TestExport(unittest.TestCase):
         image.save(outputPath(filename))
         assert QImage(outputPath(filename)) == QImage(expectedDataPath(filename)), "captured image is different from expected."
 
+    def test04_export_scene1_warp_cache(self):
+        """test that DEM reads of the second export are served from warp cache"""
+
+        mapSettings = self.loadProject(dataPath("testproject1.qgs"))
+
+        out_path = outputPath("scene1WC.html")
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = WarpCache(64 * 1024 * 1024, 64 * 1024 * 1024, cache_dir)
+            prev = setWarpCache(cache)
+            try:
+                for i in range(2):
+                    exporter = ThreeJSExporter()
+                    exporter.loadSettings(dataPath("scene1.qto3settings"))
+                    exporter.setMapSettings(mapSettings)
+
+                    stats = cache.stats()
+                    err = exporter.export(out_path)
+
+                    assert err, "export failed"
+            finally:
+                setWarpCache(prev)
+
+        s = cache.stats()
+        assert s["hits"] > stats["hits"], "no warp cache hit"
+        assert s["misses"] == stats["misses"], "warp cache missed"
+
+    def test05_export_scene1_binary_blocks(self):
+        """test that binary block files decode to the same blocks as JSON block files"""
+
+        mapSettings = self.loadProject(dataPath("testproject1.qgs"))
+
+        for title, binary in [("scene1BJ", False), ("scene1BB", True)]:
+            exporter = ThreeJSExporter()
+            exporter.loadSettings(dataPath("scene1.qto3settings"))
+            exporter.settings.setOption("binaryBlocks", binary)
+            exporter.setMapSettings(mapSettings)
+            err = exporter.export(outputPath(title + ".html"))
+
+            assert err, "export failed"
+
+        def assertSame(a, b, path="block"):
+            if isinstance(a, float) or isinstance(b, float):
+                assert math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-4), "{}: {} != {}".format(path, a, b)
+            elif isinstance(a, dict):
+                assert isinstance(b, dict) and a.keys() == b.keys(), "{}: keys differ".format(path)
+                for k in a:
+                    assertSame(a[k], b[k], "{}.{}".format(path, k))
+            elif isinstance(a, list):
+                assert isinstance(b, list) and len(a) == len(b), "{}: lengths differ".format(path)
+                for i, (u, v) in enumerate(zip(a, b)):
+                    assertSame(u, v, "{}[{}]".format(path, i))
+            else:
+                assert a == b, "{}: {!r} != {!r}".format(path, a, b)
+
+        json_dir = outputPath("data", "scene1BJ")
+        data_dir = outputPath("data", "scene1BB")
+        files = [fn for fn in os.listdir(data_dir) if fn.endswith(".q3db")]
+        assert files, "no binary block file"
+
+        for fn in files:
+            with open(os.path.join(data_dir, fn), "rb") as f:
+                data = f.read()
+                block = binary_block.decode(data)
+
+            # coordinates are not left in the header as nested lists
+            header = json.loads(data[12:12 + int.from_bytes(data[8:12], "little")].decode("utf-8"))
+            assert len(block["features"]) * 2 == header["coords"]["@u32"][1], "{}: invalid offset table".format(fn)
+            assert '"@coords"' in json.dumps(header) or not header["features"], "{}: coordinates are not packed".format(fn)
+
+            with open(os.path.join(json_dir, fn[:-5] + ".json"), encoding="utf-8") as f:
+                expected = json.load(f)
+
+            assertSame(expected, block, fn)
+
+    def test06_export_scene1_trace(self):
+        """test that build steps of web page export are traced"""
+
+        mapSettings = self.loadProject(dataPath("testproject1.qgs"))
+
+        exporter = ThreeJSExporter()
+        exporter.loadSettings(dataPath("scene1.qto3settings"))
+        exporter.setMapSettings(mapSettings)
+
+        trace_path = outputPath("scene1_trace.json")
+
+        # empty caches, so that DEM data are read and textures are rendered
+        with tempfile.TemporaryDirectory() as cache_dir:
+            prevWarpCache = setWarpCache(WarpCache(64 * 1024 * 1024, 64 * 1024 * 1024, os.path.join(cache_dir, "dem")))
+            prevTextureCache = setTextureCache(TextureCache(64 * 1024 * 1024, 64 * 1024 * 1024, os.path.join(cache_dir, "texture")))
+            try:
+                err = exporter.export(outputPath("scene1TR.html"), traceFile=trace_path)
+            finally:
+                setWarpCache(prevWarpCache)
+                setTextureCache(prevTextureCache)
+
+        assert err, "export failed"
+
+        with open(trace_path, encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+
+        names = set(e["name"] for e in events if e["ph"] == "X")
+        for name in ["scene", "layer", "dem.read", "texture.render"]:
+            assert name in names, "no {} span in trace".format(name)
+
+    def test07_export_scene1_texture_cache(self):
+        """test that textures of the second export are served from texture cache"""
+
+        mapSettings = self.loadProject(dataPath("testproject1.qgs"))
+
+        out_path = outputPath("scene1TC.html")
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = TextureCache(64 * 1024 * 1024, 64 * 1024 * 1024, cache_dir)
+            prev = setTextureCache(cache)
+            try:
+                for i in range(2):
+                    exporter = ThreeJSExporter()
+                    exporter.loadSettings(dataPath("scene1.qto3settings"))
+                    exporter.setMapSettings(mapSettings)
+
+                    stats = cache.stats()
+                    err = exporter.export(out_path)
+
+                    assert err, "export failed"
+            finally:
+                setTextureCache(prev)
+
+        s = cache.stats()
+        assert s["hits"] > stats["hits"], "no texture cache hit"
+        assert s["misses"] == stats["misses"], "texture cache missed"
+
+    def test08_export_scene1_lod(self):
+        """test that DEM tiles are exported as a quadtree pyramid with LOD option"""
+
+        mapSettings = self.loadProject(dataPath("testproject1.qgs"))
+
+        levels = 3
+        exporter = ThreeJSExporter()
+        exporter.loadSettings(dataPath("scene1.qto3settings"))
+        exporter.setMapSettings(mapSettings)
+
+        layer = exporter.settings.getLayer("dem_srtm3020150914165149263")
+        layer.properties["checkBox_Tiles"] = True
+        layer.properties["checkBox_LOD"] = True
+        layer.properties["spinBox_LODLevels"] = levels
+
+        err = exporter.export(outputPath("scene1LOD.html"))
+        assert err, "export failed"
+
+        with open(outputPath("data", "scene1LOD", "scene.json"), encoding="utf-8") as f:
+            scene = json.load(f)
+
+        dem = [lyr for lyr in scene["layers"] if lyr["properties"].get("type") == "dem"][0]
+        assert dem["properties"].get("lod") == {"levels": levels}, "no LOD properties"
+
+        blocks = [b for b in dem["data"] if "grid" in b]
+        assert len(blocks) == sum(4 ** level for level in range(levels)), "unexpected number of tiles: {}".format(len(blocks))
+
+        tiles = sorted(tuple(b["tile"]) for b in blocks)
+        expected = sorted((level, x, y) for level in range(levels) for y in range(2 ** level) for x in range(2 ** level))
+        assert tiles == expected, "unexpected tile indices"
+
+        # grid values of each tile are written to a binary file
+        files = {}
+        for b in blocks:
+            url = b["grid"]["url"]
+            assert url.endswith(".bin"), "grid is not in a binary file: " + url
+            assert os.path.exists(outputPath(*url.split("/")[1:])), "grid file not found: " + url
+            files[b["tile"][0]] = files.get(b["tile"][0], 0) + 1
+
+        assert files == {level: 4 ** level for level in range(levels)}, "unexpected number of grid files per level"
+
     def test11_export_scene1_image(self):
         """test image export with testproject1.qgs and scene1.qto3settings"""
 
@@ -3,12 +3,18 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 # begin: 2015-09-16
 
+import os
+import shutil
+import time
+
+import numpy
 from qgis.PyQt.QtCore import QSize
 from qgis.testing import unittest
 
 from Qgis2threejs.core.export.export import ThreeJSExporter
 from Qgis2threejs.core.mapextent import MapExtent
 from Qgis2threejs.core.plugin.pluginmanager import pluginManager
+from Qgis2threejs.plugins.gsielevtile.tilestore import TILE_SIZE, TileStore, decodeTile, mosaic
 from Qgis2threejs.tests.utilities import dataPath, outputPath, loadProject
 
 OUT_WIDTH, OUT_HEIGHT = (1024, 768)
@@ -49,6 +55,77 @@ class TestPlugins(unittest.TestCase):
 
         assert err, "export failed"
 
+    def test02_tilestore(self):
+        """test GSI elevation tile store with a local tile directory"""
+        tile_dir = outputPath("gsielevtile", "tiles")
+        store_dir = outputPath("gsielevtile", "store")
+        shutil.rmtree(outputPath("gsielevtile"), ignore_errors=True)
+
+        values = numpy.arange(TILE_SIZE * TILE_SIZE, dtype=numpy.float32) / 16 + 100
+        tokens = [repr(float(v)) for v in values]
+        tokens[0] = "e"     # no data
+        text = "\n".join(",".join(tokens[i:i + TILE_SIZE]) for i in range(0, values.size, TILE_SIZE)) + "\n"
+        for x in range(3):
+            os.makedirs(os.path.join(tile_dir, "14", str(x)))
+            with open(os.path.join(tile_dir, "14", str(x), "0.txt"), "w") as f:
+                f.write(text)
+
+        template = os.path.join(tile_dir, "{z}", "{x}", "{y}.txt")
+        tileBytes = values.nbytes + 64     # a tile and its fetch time
+
+        # fetch tiles. a tile that does not exist is stored as an empty array
+        store = TileStore(template, 0, tileBytes * 2, store_dir)
+        tiles = store.tiles(14, 0, 0, 1, 1)
+        self.assertEqual(len(tiles), 4)
+        self.assertEqual(tiles[0][0], 0)
+        numpy.testing.assert_array_equal(tiles[1][1:], values[1:])
+        self.assertEqual(tiles[2].size, 0)
+
+        # tiles are read from the store after the source has gone
+        shutil.rmtree(os.path.join(tile_dir, "14", "1"))
+        store = TileStore(template, 0, tileBytes * 2, store_dir)
+        numpy.testing.assert_array_equal(store.tile(14, 1, 0), tiles[1])
+
+        # least recently used tile is evicted
+        store.fetch(14, 2, 0)
+        self.assertIsNone(store.tile(14, 0, 0))
+        self.assertIsNotNone(store.tile(14, 2, 0))
+
+        # expired tiles are fetched again. an expired tile is used if it cannot be fetched
+        store.expiry = 3600
+        for x in [1, 2]:
+            key = TileStore.tileKey(14, x, 0)
+            store.remove(key)
+            store.put(key, (time.time() - 7200, values))
+        self.assertIsNone(store.tile(14, 2, 0))
+        numpy.testing.assert_array_equal(store.fetch(14, 2, 0), tiles[1])
+        self.assertIsNotNone(store.tile(14, 2, 0))
+
+        os.makedirs(os.path.join(tile_dir, "14", "1", "0.txt"))     # fails to read
+        numpy.testing.assert_array_equal(store.fetch(14, 1, 0), values)
+
+    def test03_tiledecoder(self):
+        """test decoding GSI elevation tiles and making a mosaic"""
+        values = numpy.arange(TILE_SIZE * TILE_SIZE, dtype=numpy.float32) / 4 - 100
+        for fmt, lastFmt, eol in [("{:.2f}", "{:.2f}", b"\n"),     # fixed decimal places
+                                  ("{:g}", "{:g}", b"\n"),         # others
+                                  ("{:.2f}", "{:.1f}", b""),        # last value has one decimal place
+                                  ("{:.2f}", "{:.1f}", b"\n")]:
+            tokens = [fmt.format(v) for v in values]
+            tokens[1] = "e"
+            tokens[-1] = lastFmt.format(values[-1])
+            data = "\n".join(",".join(tokens[i:i + TILE_SIZE]) for i in range(0, values.size, TILE_SIZE)).encode() + eol
+
+            expected = numpy.fromstring(data.replace(b"e", b"0").replace(b"\n", b","), dtype=numpy.float32, sep=",")
+            numpy.testing.assert_array_equal(decodeTile(data), expected)
+
+        tile = decodeTile(data)
+        m = mosaic([tile, None, numpy.empty(0, dtype=numpy.float32), tile], 2, 2)
+        self.assertEqual(m.shape, (TILE_SIZE * 2, TILE_SIZE * 2))
+        numpy.testing.assert_array_equal(m[TILE_SIZE:, TILE_SIZE:].ravel(), tile)
+        self.assertFalse(m[:TILE_SIZE, TILE_SIZE:].any())
+        self.assertFalse(m[TILE_SIZE:, :TILE_SIZE].any())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import tempfile
+from unittest import mock
+
+import qgis.utils
+from qgis.core import (QgsFeature,
+                       QgsGeometry,
+                       QgsProcessingContext,
+                       QgsProcessingFeedback,
+                       QgsProject,
+                       QgsRectangle,
+                       QgsVectorLayer)
+from qgis.testing import unittest
+
+from Qgis2threejs.core.processing import procalgorithm
+from Qgis2threejs.core.processing.procalgorithm import ExportAlgorithm
+from Qgis2threejs.tests.utilities import dataPath, loadProject
+
+FEATURES = 4
+
+
+class CancelingFeedback(QgsProcessingFeedback):
+
+    """cancels the algorithm when the first feature has been exported"""
+
+    def pushInfo(self, info):
+        QgsProcessingFeedback.pushInfo(self, info)
+        if info.startswith("Exported "):
+            self.cancel()
+
+
+class TestProcessing(unittest.TestCase):
+
+    def setUp(self):
+        self.mapSettings = loadProject(dataPath("testproject1.qgs"))
+
+        # coverage layer that has features in a row in the middle of map extent
+        extent = self.mapSettings.extent()
+        self.clayer = QgsVectorLayer("Polygon?crs={}&field=name:string".format(self.mapSettings.destinationCrs().authid()),
+                                     "coverage", "memory")
+        w = extent.width() / (FEATURES + 2)
+        h = extent.height() / 4
+        features = []
+        for i in range(FEATURES):
+            xmin = extent.xMinimum() + w * (i + 1)
+            f = QgsFeature(self.clayer.fields())
+            f.setAttribute("name", "page{}".format(i))
+            f.setGeometry(QgsGeometry.fromRect(QgsRectangle(xmin, extent.center().y() - h / 2, xmin + w, extent.center().y() + h / 2)))
+            features.append(f)
+        self.clayer.dataProvider().addFeatures(features)
+        QgsProject.instance().addMapLayer(self.clayer, False)
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayer(self.clayer.id())
+
+    def runExport(self, out_dir, feedback):
+        """runs web page export algorithm with 2 jobs"""
+        plugin = mock.Mock()
+        plugin.iface.mapCanvas.return_value.mapSettings.return_value = self.mapSettings
+
+        with mock.patch.dict(qgis.utils.plugins, {"Qgis2threejs": plugin}), \
+                mock.patch.object(procalgorithm, "P_OPEN_DIRECTORY", False):
+            alg = ExportAlgorithm()
+            alg.initAlgorithm({})
+
+            parameters = {
+                alg.OUTPUT: out_dir,
+                alg.INPUT: self.clayer,
+                alg.TITLE_FIELD: "name",
+                alg.CF_FILTER: False,
+                alg.TEX_WIDTH: 256,
+                alg.HEADER: "''",
+                alg.FOOTER: "''",
+                alg.SETTINGS: dataPath("scene1.qto3settings"),
+                alg.JOBS: 2,
+                alg.TEMPLATE: 0
+            }
+
+            context = QgsProcessingContext()
+            context.setProject(QgsProject.instance())
+
+            assert alg.prepareAlgorithm(parameters, context, feedback), "failed to prepare algorithm"
+            alg.processAlgorithm(parameters, context, feedback)
+
+        return sorted(fn for fn in os.listdir(out_dir) if fn.endswith(".html"))
+
+    def test01_export_webpages_in_parallel(self):
+        """test that a page is exported for each feature by 2 jobs"""
+        with tempfile.TemporaryDirectory() as out_dir:
+            pages = self.runExport(out_dir, QgsProcessingFeedback())
+
+        assert pages == ["page{}.html".format(i) for i in range(FEATURES)], "pages: {}".format(pages)
+
+    def test02_cancel_parallel_export(self):
+        """test that queued jobs are not started after the export is canceled"""
+        with tempfile.TemporaryDirectory() as out_dir:
+            feedback = CancelingFeedback()
+            pages = self.runExport(out_dir, feedback)
+
+        assert feedback.isCanceled(), "not canceled"
+        assert 1 <= len(pages) < FEATURES, "pages: {}".format(pages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from qgis.PyQt.QtCore import QEventLoop, QObject, QTimer, QUrl
+from qgis.testing import unittest
+
+from Qgis2threejs.core.build.artifactstore import ArtifactStore
+from Qgis2threejs.gui.q3dwebscheme import Q3DUrlSchemeHandler
+
+
+class RequestJob(QObject):
+
+    """stands in for QWebEngineUrlRequestJob"""
+
+    def __init__(self, url, loop):
+        QObject.__init__(self)
+        self.url = QUrl(url)
+        self.loop = loop
+        self.data = self.mimeType = self.error = None
+
+    def requestUrl(self):
+        return self.url
+
+    def reply(self, mimeType, device):
+        self.mimeType = bytes(mimeType)
+        self.data = bytes(device.readAll())
+        self.loop.quit()
+
+    def fail(self, error):
+        self.error = error
+        self.loop.quit()
+
+
+class TestUrlSchemeHandler(unittest.TestCase):
+
+    def request(self, handler, url):
+        loop = QEventLoop()
+        job = RequestJob(url, loop)
+        QTimer.singleShot(5000, loop.quit)
+
+        handler.requestStarted(job)
+        if job.data is None and job.error is None:
+            loop.exec()
+        return job
+
+    def test01_deferred_artifact(self):
+        """deferred artifacts are produced in a worker thread and replied"""
+        handler = Q3DUrlSchemeHandler()
+        store = ArtifactStore()
+
+        url = store.putDeferred(lambda: b"deferred", "text/plain")
+        job = self.request(handler, url)
+        self.assertIsNone(job.error)
+        self.assertEqual(job.data, b"deferred")
+        self.assertEqual(job.mimeType, b"text/plain")
+
+        # each artifact is served once
+        job = self.request(handler, url)
+        self.assertIsNotNone(job.error)
+
+        url = store.put(b"immediate")
+        self.assertEqual(self.request(handler, url).data, b"immediate")
+
+        handler.executor.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Qgis2threejs contributors
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""build tracing
+
+Spans and counters of the build pipeline are recorded while tracing is enabled:
+
+    from ..utils import trace
+
+    with trace.span("dem.read", "dem", width=w, height=h) as s:
+        ...
+        s.set(bytes=n)
+
+    trace.count("warp cache hits")
+
+Records can be saved as Chrome trace_event JSON (chrome://tracing, Perfetto) or as a summary table.
+When tracing is disabled, span() returns a shared no-op object and count() returns immediately."""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from ..conf import TRACE_BUILD
+
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+    def begin(self):
+        return self
+
+    def end(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._addSpan(self.name, self.cat, self.start, end, self.args)
+        return False
+
+    def set(self, **args):
+        """sets span arguments. numeric arguments are summed up by name in the summary"""
+        self.args.update(args)
+
+    def begin(self):
+        """starts the span. Use begin() and end() where a with statement does not fit, e.g. across yields"""
+        return self.__enter__()
+
+    def end(self):
+        self.__exit__(None, None, None)
+
+
+class Tracer:
+
+    def __init__(self):
+        self.enabled = False
+
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._events = []
+        self._counters = defaultdict(float)
+        self._threads = {}      # thread id -> name
+
+    def start(self, clear=True):
+        if clear:
+            self.clear()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            self._origin = time.perf_counter()
+            self._events = []
+            self._counters = defaultdict(float)
+            self._threads = {}
+
+    def span(self, name, cat="build", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def count(self, name, value=1, cat="build"):
+        """adds value to a counter"""
+        if not self.enabled:
+            return
+
+        ts = time.perf_counter()
+        with self._lock:
+            self._counters[name] += value
+            self._events.append({"ph": "C", "name": name, "cat": cat, "ts": self._us(ts),
+                                 "pid": os.getpid(), "tid": self._tid(),
+                                 "args": {"value": self._counters[name]}})
+
+    def _addSpan(self, name, cat, start, end, args):
+        with self._lock:
+            self._events.append({"ph": "X", "name": name, "cat": cat, "ts": self._us(start), "dur": (end - start) * 1e6,
+                                 "pid": os.getpid(), "tid": self._tid(), "args": args})
+
+    def _tid(self):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        return tid
+
+    def _us(self, t):
+        return (t - self._origin) * 1e6
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def chromeTrace(self):
+        """returns records in Chrome trace_event format"""
+        with self._lock:
+            pid = os.getpid()
+            meta = [{"ph": "M", "name": "process_name", "pid": pid, "tid": 0, "args": {"name": "Qgis2threejs"}}]
+            meta += [{"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": name}}
+                     for tid, name in self._threads.items()]
+            return {"traceEvents": meta + self._events,
+                    "displayTimeUnit": "ms"}
+
+    def summary(self):
+        """returns a summary table of spans and counters in text"""
+        stats = {}      # name -> [count, total, max, {arg: sum}]
+        for e in self.events():
+            if e["ph"] != "X":
+                continue
+
+            s = stats.get(e["name"])
+            if s is None:
+                s = stats[e["name"]] = [0, 0, 0, defaultdict(float)]
+            s[0] += 1
+            s[1] += e["dur"]
+            s[2] = max(s[2], e["dur"])
+            for k, v in e["args"].items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    s[3][k] += v
+
+        lines = ["{:<24} {:>7} {:>11} {:>10} {:>10}  {}".format("span", "count", "total (ms)", "mean (ms)", "max (ms)", "counters")]
+        for name, (n, total, mx, sums) in sorted(stats.items(), key=lambda item: -item[1][1]):
+            sec = total / 1e6
+            counters = ", ".join("{}={:g} ({:.0f}/s)".format(k, v, v / sec) if sec else "{}={:g}".format(k, v)
+                                 for k, v in sums.items())
+            lines.append("{:<24} {:>7} {:>11.1f} {:>10.2f} {:>10.2f}  {}".format(name, n, total / 1e3, total / n / 1e3, mx / 1e3, counters))
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+
+        if counters:
+            lines.append("")
+            lines.append("{:<24} {:>12}".format("counter", "value"))
+            lines += ["{:<24} {:>12g}".format(name, value) for name, value in counters]
+
+        return "\n".join(lines)
+
+    def save(self, filename):
+        """saves records to a file. A summary table is written if the extension is .txt, otherwise Chrome trace JSON"""
+        with open(filename, "w", encoding="utf-8") as f:
+            if os.path.splitext(filename)[1].lower() == ".txt":
+                f.write(self.summary())
+            else:
+                json.dump(self.chromeTrace(), f)
+
+
+_tracer = Tracer()
+_tracer.enabled = bool(TRACE_BUILD)
+
+
+def tracer():
+    """returns the tracer shared by builders, exporters and the preview"""
+    return _tracer
+
+
+def span(name, cat="build", **args):
+    if not _tracer.enabled:
+        return _NULL_SPAN
+    return _Span(_tracer, name, cat, args)
+
+
+def count(name, value=1, cat="build"):
+    if _tracer.enabled:
+        _tracer.count(name, value, cat)
+
+
+@contextmanager
+def recording(filename=None):
+    """records spans and counters in the with block and saves them to a file (see Tracer.save()).
+       If filename is None, nothing is changed. A trace that is already being recorded is continued."""
+    wasEnabled = _tracer.enabled
+    if filename and not wasEnabled:
+        _tracer.start()
+
+    try:
+        yield _tracer
+    finally:
+        if filename:
+            _tracer.save(filename)
+            _tracer.enabled = wasEnabled
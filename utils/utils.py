@@ -11,7 +11,7 @@ import shutil
 from qgis.PyQt.QtCore import qDebug as qDebugA, QBuffer, QByteArray, QDir, QFile, QFileInfo, QIODevice, QObject, QProcess, QSettings, QUrl, QUuid, pyqtSignal
 from qgis.PyQt.QtGui import QDesktopServices, QImage
 
-from qgis.core import NULL, Qgis, QgsMapLayer, QgsMessageLog, QgsProject
+from qgis.core import NULL, Qgis, QgsApplication, QgsMapLayer, QgsMessageLog, QgsProject
 
 from ..conf import DEBUG_MODE, PLUGIN_NAME
 
@@ -282,6 +282,11 @@ def temporaryOutputDir():
     return QDir.tempPath() + "/Qgis2threejs"
 
 
+def cacheDir(*subdirs):
+    """Return a directory path for persistent cache files of this plugin."""
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), "cache", PLUGIN_NAME, *subdirs)
+
+
 def openDirectory(dir_path):
     """Open a directory in the OS default file manager."""
     QDesktopServices.openUrl(QUrl.fromLocalFile(dir_path))
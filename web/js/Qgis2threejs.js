@@ -70,6 +70,10 @@ Q3D.Config = {
 	// layer
 	allVisible: false,   // set every layer visible property to true on load if set to true
 
+	dem: {
+		lodDistance: 2    // a quadtree LOD tile is replaced with its child tiles when camera is closer than this multiple of tile width
+	},
+
 	line: {
 		dash: {
 			dashSize: 1,
@@ -464,6 +468,14 @@ Q3D.E = function (id) {
 		});
 	};
 
+	app.loadBinaryBlockFile = function (url, callback) {
+		app.loadFile(url, "arraybuffer", function (buffer) {
+			var obj = Q3D.Utils.decodeBinaryBlock(buffer);
+			app.loadJSONObject(obj);
+			if (callback) callback(obj);
+		});
+	};
+
 	app.loadSceneFile = function (url, sceneFileLoadedCallback, sceneLoadedCallback) {
 
 		var onload = function () {
@@ -1016,6 +1028,9 @@ Q3D.E = function (id) {
 			app.camera.updateMatrixWorld();
 		}
 
+		// load/unload DEM tiles by level of detail
+		app.scene.updateLOD(app.camera);
+
 		// render
 		if (app.effect) {
 			app.effect.render(app.scene, app.camera);
@@ -2017,6 +2032,12 @@ class Q3DScene extends THREE.Scene {
 		}
 	}
 
+	updateLOD(camera) {
+		for (var id in this.mapLayers) {
+			if (this.mapLayers[id].updateLOD) this.mapLayers[id].updateLOD(camera);
+		}
+	}
+
 	buildLights(lights, rotation) {
 		var p, light;
 		for (var i = 0; i < lights.length; i++) {
@@ -2462,6 +2483,10 @@ class Q3DDEMBlock extends Q3DDEMBlockBase {
 				// WebKit Bridge
 				grid.array = new Float32Array(grid.binary.buffer, 0, grid.width * grid.height);
 			}
+			else if (grid.base64 !== undefined) {
+				grid.array = Q3D.Utils.base64ToFloat32Array(grid.base64);
+				delete grid.base64;
+			}
 			buildGeometry(grid.array);
 		}
 
@@ -2649,6 +2674,7 @@ class Q3DDEMBlock extends Q3DDEMBlockBase {
 			group.add(new THREE.Line(geom, material));
 		}
 
+		group.name = "wireframe";
 		parent.add(group);
 		parent.updateMatrixWorld();
 	}
@@ -2937,10 +2963,22 @@ class Q3DDEMLayer extends Q3DMapLayer {
 			}
 			this.objectGroup.updateMatrixWorld();
 
+			if (jsonObject.decorations !== undefined) {
+				this.updateDecorations(jsonObject.decorations);
+			}
+
 			if (jsonObject.data !== undefined) {
-				jsonObject.data.forEach(function (obj) {
-					this.buildBlock(obj, scene, this);
-				}, this);
+				this.lod = undefined;
+
+				if (this.properties.lod) {
+					this.blocks = [];
+					this.initLOD(jsonObject.data, scene);
+				}
+				else {
+					jsonObject.data.forEach(function (obj) {
+						this.buildBlock(obj, scene, this);
+					}, this);
+				}
 			}
 		}
 		else if (jsonObject.type == "block") {
@@ -2948,7 +2986,8 @@ class Q3DDEMLayer extends Q3DMapLayer {
 		}
 	}
 
-	buildBlock(jsonObject, scene, layer) {
+	// onBuilt: function called with the mesh when the block has been built
+	buildBlock(jsonObject, scene, layer, onBuilt) {
 		var _this = this,
 			block = this.blocks[jsonObject.block];
 
@@ -2991,17 +3030,183 @@ class Q3DDEMLayer extends Q3DMapLayer {
 				block.addEdges(_this, mesh, material.mtl, (jsonObject.sides) ? jsonObject.sides.bottom : undefined);
 			}
 
+			if (onBuilt) onBuilt(mesh);
+
 			_this.requestRender();
 		});
 	}
 
+	// replace materials of sides, edges and wireframe of all blocks. objects are kept
+	updateDecorations(decorations) {
+		var names = {
+			sides: ["side", "bottom"],
+			edges: ["frame"],
+			wireframe: ["wireframe"]
+		};
+
+		for (var key in names) {
+			if (decorations[key] === undefined) continue;
+
+			var material = new Q3DMaterial(),
+				oldMtls = [];
+
+			material.loadJSONObject(decorations[key].mtl);
+
+			this.objectGroup.traverse(function (obj) {
+				if (names[key].indexOf(obj.name) == -1) return;
+
+				obj.traverse(function (o) {
+					if (o.material === undefined || o.material === material.mtl) return;
+					if (oldMtls.indexOf(o.material) == -1) oldMtls.push(o.material);
+					o.material = material.mtl;
+				});
+			});
+
+			if (oldMtls.length) {
+				this.materials.add(material);
+				oldMtls.forEach(function (mtl) {
+					this.materials.removeItem(mtl, true);
+				}, this);
+			}
+			else {
+				material.dispose();
+			}
+		}
+		this.requestRender();
+	}
+
+	// quadtree level of detail (LOD)
+	// data: block objects of all tiles. tiles are loaded and unloaded by distance from camera
+	initLOD(data, scene) {
+		var tiles = {}, t;
+		data.forEach(function (obj) {
+			t = tiles[obj.block] = tiles[obj.block] || {objs: [], children: []};
+			t.objs.push(obj);
+			if (obj.tile !== undefined) {
+				t.level = obj.tile[0];
+				t.x = obj.tile[1];
+				t.y = obj.tile[2];
+				t.block = obj.block;
+				t.width = obj.width;
+				t.height = obj.height;
+				t.center = new THREE.Vector3(obj.translate[0], obj.translate[1], 0);
+			}
+		});
+
+		var index = {};
+		for (var b in tiles) {
+			t = tiles[b];
+			index[t.level + "/" + t.x + "/" + t.y] = t;
+		}
+
+		for (var key in index) {
+			t = index[key];
+			for (var i = 0; i < 4; i++) {
+				var c = index[(t.level + 1) + "/" + (t.x * 2 + i % 2) + "/" + (t.y * 2 + Math.floor(i / 2))];
+				if (c !== undefined) t.children.push(c);
+			}
+		}
+
+		this.lod = {
+			root: index["0/0/0"],
+			scene: scene
+		};
+
+		if (this.lod.root) this.loadTile(this.lod.root);
+	}
+
+	// called before rendering
+	updateLOD(camera) {
+		if (this.lod === undefined || this.lod.root === undefined || !this.visible) return;
+
+		var pos = this.objectGroup.worldToLocal(camera.position.clone());
+		pos.z /= this.sceneData.zScale || 1;
+
+		this.updateTile(this.lod.root, pos);
+	}
+
+	// returns true if the tile or its descendants cover the tile area
+	updateTile(tile, pos) {
+		var split = (tile.children.length && pos.distanceTo(tile.center) < Q3D.Config.dem.lodDistance * tile.width);
+
+		if (split) {
+			var ready = true;
+			tile.children.forEach(function (c) {
+				if (!c.loaded) this.loadTile(c);
+				if (!this.updateTile(c, pos)) ready = false;
+			}, this);
+
+			// show this tile until all child tiles have been built
+			if (tile.mesh) tile.mesh.visible = !ready;
+			if (ready) return true;
+		}
+		else {
+			tile.children.forEach(this.unloadTile, this);
+			if (tile.mesh) tile.mesh.visible = true;
+		}
+
+		if (!tile.loaded) this.loadTile(tile);
+		return Boolean(tile.mesh);
+	}
+
+	loadTile(tile) {
+		tile.loaded = true;
+		tile.objs.forEach(function (obj) {
+			this.buildBlock(obj, this.lod.scene, this, function (mesh) {
+				tile.mesh = mesh;
+
+				var mtl = this.blocks[tile.block].materials[this.currentMtlIndex];
+				if (this.currentMtlIndex !== undefined && mtl !== undefined) mesh.material = mtl.mtl;
+			}.bind(this));
+		}, this);
+	}
+
+	unloadTile(tile) {
+		tile.children.forEach(this.unloadTile, this);
+
+		// a tile that is being loaded is unloaded in a later update
+		if (!tile.loaded || !tile.mesh) return;
+
+		tile.loaded = false;
+		this.removeBlockObject(tile.block, tile.mesh);
+		tile.mesh = undefined;
+	}
+
+	removeBlockObject(blockIndex, mesh) {
+		var block = this.blocks[blockIndex];
+
+		// dispose of geometries and materials used only by the block
+		mesh.traverse(function (obj) {
+			if (obj.geometry) obj.geometry.dispose();
+			if (obj.material) this.materials.removeItem(obj.material, true);
+		}.bind(this));
+
+		if (block) {
+			block.materials.forEach(function (m) {
+				if (m.mtl) m.dispose();
+			});
+		}
+
+		this.objectGroup.remove(mesh);
+
+		var objs = [];
+		mesh.traverse(function (obj) {
+			objs.push(obj);
+		});
+		this.objects = this.objects.filter(function (obj) {
+			return objs.indexOf(obj) == -1;
+		});
+
+		delete this.blocks[blockIndex];
+	}
+
 	// calculate elevation at the coordinates (x, y) on triangle face
 	getZ(x, y) {
 		for (var i = 0, l = this.blocks.length; i < l; i++) {
-			var block = this.blocks[i],
-				data = block.data;
+			var block = this.blocks[i];
+			if (block === undefined || !block.contains(x, y)) continue;
 
-			if (!block.contains(x, y)) continue;
+			var data = block.data;
 
 			var ix = data.width / (data.grid.width - 1),
 				iy = data.height / (data.grid.height - 1);
@@ -3104,7 +3309,7 @@ class Q3DDEMLayer extends Q3DMapLayer {
 		var b, m;
 		for (var i = 0, l = this.blocks.length; i < l; i++) {
 			b = this.blocks[i];
-			m = b.materials[mtlIndex];
+			m = (b !== undefined && b.obj) ? b.materials[mtlIndex] : undefined;
 			if (m !== undefined) {
 				b.obj.material = m.mtl;
 				this.materials.add(m);
@@ -3254,6 +3459,37 @@ class Q3DVectorLayer extends Q3DMapLayer {
 		if (this.labelConnectorGroup) this.labelConnectorGroup.clear();
 	}
 
+	createLabelGroups(scene) {
+		// create a label group and a label connector group
+		if (this.labelGroup === undefined) {
+			this.labelGroup = new Q3DGroup();
+			this.labelGroup.userData.layerId = this.id;
+			this.labelGroup.visible = this.visible;
+			this.labelGroup.position.copy(this.objectGroup.position);
+			this.labelGroup.updateMatrixWorld();
+			scene.labelGroup.add(this.labelGroup);
+		}
+
+		if (this.labelConnectorGroup === undefined) {
+			this.labelConnectorGroup = new Q3DGroup();
+			this.labelConnectorGroup.userData.layerId = this.id;
+			this.labelConnectorGroup.visible = this.visible;
+			this.labelConnectorGroup.position.copy(this.objectGroup.position);
+			this.labelConnectorGroup.updateMatrixWorld();
+			scene.labelConnectorGroup.add(this.labelConnectorGroup);
+		}
+	}
+
+	// move objects and labels in the 3D world (e.g. to keep their positions on the map when the world origin moves)
+	translate(dx, dy) {
+		[this.objectGroup, this.labelGroup, this.labelConnectorGroup].forEach(function (group) {
+			if (group === undefined) return;
+			group.position.x += dx;
+			group.position.y += dy;
+			group.updateMatrixWorld();
+		});
+	}
+
 	buildLabels(features, getPointsFunc) {
 		if (this.properties.label === undefined || getPointsFunc === undefined) return;
 
@@ -3395,41 +3631,118 @@ class Q3DVectorLayer extends Q3DMapLayer {
 		if (jsonObject.type == "layer") {
 			if (jsonObject.data !== undefined) {
 				this.features = [];
+				this.loadId = (this.loadId || 0) + 1;
 				this.clearLabels();
 
-				// build labels
-				if (this.properties.label !== undefined) {
-					// create a label group and a label connector group
-					if (this.labelGroup === undefined) {
-						this.labelGroup = new Q3DGroup();
-						this.labelGroup.userData.layerId = this.id;
-						this.labelGroup.visible = this.visible;
-						scene.labelGroup.add(this.labelGroup);
-					}
+				// objects are built in current world coordinates
+				this.translate(-this.objectGroup.position.x, -this.objectGroup.position.y);
 
-					if (this.labelConnectorGroup === undefined) {
-						this.labelConnectorGroup = new Q3DGroup();
-						this.labelConnectorGroup.userData.layerId = this.id;
-						this.labelConnectorGroup.visible = this.visible;
-						scene.labelConnectorGroup.add(this.labelConnectorGroup);
-					}
-				}
+				// build labels
+				if (this.properties.label !== undefined) this.createLabelGroups(scene);
 
 				(jsonObject.data.blocks || []).forEach(function (block) {
-					if (block.url !== undefined) Q3D.application.loadJSONFile(block.url);
+					if (block.url !== undefined) {
+						if (block.binary) Q3D.application.loadBinaryBlockFile(block.url);
+						else Q3D.application.loadJSONFile(block.url);
+					}
 					else {
 						this.build(block.features, block.startIndex);
 						if (this.properties.label !== undefined) this.buildLabels(block.features);
 					}
 				}, this);
 			}
+			else if (jsonObject.update !== undefined) {
+				// geometries of features are kept. other parts of the features are updated with following blocks
+				this.loadId = (this.loadId || 0) + 1;
+
+				if (jsonObject.update.indexOf("mtl") != -1) this.clearObjects();
+
+				this.clearLabels();
+				if (this.properties.label !== undefined) this.createLabelGroups(scene);
+			}
+			else if (jsonObject.relabel) {
+				// only label style has been changed. rebuild labels of current features
+				this.clearLabels();
+				if (this.properties.label !== undefined) {
+					this.createLabelGroups(scene);
+					this.buildLabels(this.features.filter(Boolean));
+				}
+			}
 		}
 		else if (jsonObject.type == "block") {
+			// materials newly used by features in this block
+			if (jsonObject.materials !== undefined) {
+				this.materials.loadJSONObject(jsonObject.materials);
+			}
+
+			if (jsonObject.url !== undefined) {
+				// features are loaded from binary data (preview) or a file
+				if (jsonObject.binary) {
+					var loadId = this.loadId;
+					Q3D.application.loadFile(jsonObject.url, "arraybuffer", function (buffer) {
+						if (this.loadId !== loadId) return;     // layer data have been reloaded since then
+						scene.loadJSONObject(Q3D.Utils.decodeBinaryBlock(buffer));
+					}.bind(this));
+				}
+				else {
+					Q3D.application.loadJSONFile(jsonObject.url);
+				}
+				return;
+			}
+
+			if (jsonObject.update !== undefined) {
+				this.updateFeatures(jsonObject.features, jsonObject.startIndex, jsonObject.update);
+				return;
+			}
+
 			this.build(jsonObject.features, jsonObject.startIndex);
 			if (this.properties.label !== undefined) this.buildLabels(jsonObject.features);
 		}
 	}
 
+	// update parts (materials, labels and/or attributes) of built features, and rebuild their objects and labels
+	// features: feature data that have only the parts
+	updateFeatures(features, startIndex, parts) {
+		var keys = {
+			mtl: ["mtl"],
+			lbl: ["lbl", "lh"],
+			prop: ["prop"]
+		};
+
+		var feats = [], f;
+		for (var i = 0; i < features.length; i++) {
+			f = this.features[startIndex + i];
+			if (f === undefined) {
+				console.warn("Feature to update not found: " + (startIndex + i));
+				return;
+			}
+
+			parts.forEach(function (part) {
+				keys[part].forEach(function (key) {
+					if (features[i][key] === undefined) delete f[key];
+					else f[key] = features[i][key];
+				});
+			});
+			feats.push(f);
+		}
+
+		if (parts.indexOf("mtl") != -1) {
+			this.build(feats, startIndex);
+		}
+		else if (parts.indexOf("prop") != -1) {
+			feats.forEach(function (f) {
+				(f.objs || []).forEach(function (obj) {
+					obj.traverse(function (o) {
+						if (o.userData.properties !== undefined) o.userData.properties = f.prop;
+					});
+				});
+			});
+		}
+
+		if (this.properties.label !== undefined) this.buildLabels(feats);
+		this.requestRender();
+	}
+
 	get visible() {
 		return this.objectGroup.visible;
 		// return super.visible;
@@ -3470,6 +3783,10 @@ class Q3DPointLayer extends Q3DVectorLayer {
 			}
 			this.models.loadJSONObject(jsonObject.data.models);
 		}
+		else if (jsonObject.type == "block" && jsonObject.models !== undefined) {
+			// models newly used by features in this block
+			this.models.loadJSONObject(jsonObject.models);
+		}
 
 		super.loadJSONObject(jsonObject, scene);
 	}
@@ -4038,7 +4355,7 @@ class Q3DPolygonLayer extends Q3DVectorLayer {
 			return function (f) {
 				var geom = new THREE.BufferGeometry();
 				geom.setAttribute("position", new THREE.Float32BufferAttribute(f.geom.triangles.v, 3));
-				geom.setIndex(f.geom.triangles.f);
+				geom.setIndex(Q3D.Utils.indexAttribute(f.geom.triangles.f));
 				geom = new THREE.Geometry().fromBufferGeometry(geom); // Flat shading doesn't work with combination of
 																	// BufferGeometry and Lambert/Toon material.
 				return new THREE.Mesh(geom, materials.mtl(f.mtl.idx));
@@ -4118,7 +4435,7 @@ class Q3DPolygonLayer extends Q3DVectorLayer {
 			return function (f) {
 
 				var geom = new THREE.BufferGeometry();
-				geom.setIndex(f.geom.triangles.f);
+				geom.setIndex(Q3D.Utils.indexAttribute(f.geom.triangles.f));
 				geom.setAttribute("position", new THREE.Float32BufferAttribute(f.geom.triangles.v, 3));
 				geom.computeVertexNormals();
 
@@ -4376,6 +4693,113 @@ Q3D.Utils.flatArrayToVec2Array = function (vertices, itemSize) {
 	return pts;
 };
 
+// returns an index attribute. a typed array (from binary block) is wrapped in BufferAttribute.
+Q3D.Utils.indexAttribute = function (index) {
+	return (ArrayBuffer.isView(index)) ? new THREE.BufferAttribute(index, 1) : index;
+};
+
+// decode base64 encoded grid values (little-endian float32)
+Q3D.Utils.base64ToFloat32Array = function (str) {
+	var b = atob(str),
+		len = b.length,
+		bytes = new Uint8Array(len);
+
+	for (var i = 0; i < len; i++) {
+		bytes[i] = b.charCodeAt(i);
+	}
+	return new Float32Array(bytes.buffer, 0, len >> 2);
+};
+
+// decode a binary feature block (see core/build/vector/binary_block.py)
+Q3D.Utils.decodeBinaryBlock = function (buffer) {
+	var view = new DataView(buffer);
+	if (String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)) != "Q3DB") {
+		throw new Error("Not a binary block");
+	}
+
+	var version = view.getUint32(4, true),
+		headerLength = view.getUint32(8, true);
+	if (version != 2) throw new Error("Unsupported binary block version: " + version);
+
+	var block = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, headerLength)));
+
+	var offset = 12 + headerLength,
+		f32 = new Float32Array(buffer, offset, block.sections.f32),
+		u32 = new Uint32Array(buffer, offset + 4 * block.sections.f32, block.sections.u32);
+
+	// restores a nested array of coordinates from pos. returns the array and the next position.
+	// short arrays are plain arrays as in JSON block
+	var unflatten = function (shape, pos) {
+		if (typeof shape === "number") {
+			var a = f32.subarray(pos, pos + shape);
+			return [(shape < 16) ? Array.from(a) : a, pos + shape];
+		}
+
+		var arr = [], r, i, l;
+		if (Array.isArray(shape)) {
+			for (i = 0, l = shape.length; i < l; i++) {
+				r = unflatten(shape[i], pos);
+				arr.push(r[0]);
+				pos = r[1];
+			}
+		}
+		else {
+			for (i = 0; i < shape.n; i++) {
+				r = unflatten(shape.each, pos);
+				arr.push(r[0]);
+				pos = r[1];
+			}
+		}
+		return [arr, pos];
+	};
+
+	// base: offset of coordinate run of current feature
+	var resolve = function (obj, base) {
+		if (obj === null || typeof obj !== "object") return obj;
+
+		if (Array.isArray(obj)) {
+			for (var i = 0, l = obj.length; i < l; i++) {
+				obj[i] = resolve(obj[i], base);
+			}
+			return obj;
+		}
+
+		var ref = obj["@f32"];
+		if (ref !== undefined) return f32.subarray(ref[0], ref[0] + ref[1]);
+
+		ref = obj["@u32"];
+		if (ref !== undefined) return u32.subarray(ref[0], ref[0] + ref[1]);
+
+		ref = obj["@coords"];
+		if (ref !== undefined) return unflatten(ref[1], base + ref[0])[0];
+
+		for (var k in obj) {
+			obj[k] = resolve(obj[k], base);
+		}
+		return obj;
+	};
+
+	var offsets = resolve(block.coords);
+	block.features.forEach(function (f, i) {
+		resolve(f, offsets[2 * i]);
+	});
+	delete block.coords;
+
+	// attribute side table
+	var attrs = block.attrs;
+	if (attrs !== undefined) {
+		block.features.forEach(function (f, i) {
+			f.prop = attrs.map(function (values) {
+				return values[i];
+			});
+		});
+		delete block.attrs;
+	}
+	delete block.sections;
+
+	return block;
+};
+
 Q3D.Utils.setGeometryUVs = function (geom, base_width, base_height) {
 	var face, v, uvs = [];
 	for (var i = 0, l = geom.vertices.length; i < l; i++) {
@@ -235,6 +235,14 @@ function hideAllLayers(remove_obj) {
 	}
 }
 
+function translateLayer(layerId, dx, dy) {
+	var layer = app.scene.mapLayers[layerId];
+	if (layer !== undefined && layer.translate !== undefined) {
+		layer.translate(dx, dy);
+		app.render();
+	}
+}
+
 function loadStart(name, initialize) {
 	if (initialize) {
 		app.initLoadingManager();